@@ -1,3 +1,3 @@
 #!/usr/bin/bash
 source /app/.env
-/usr/local/bin/python /app/workers/price_updater.py
+exec /usr/local/bin/python /app/workers/price_updater.py "$@"
@@ -0,0 +1,186 @@
+"""
+A local stand-in for the Tesla Fleet API and the Amber API, for load tests.
+
+Serves the token exchange, products and time of use settings of Tesla, and the sites and
+current prices of Amber, with synthetic data. Latency, errors and rate limiting are set with:
+  - FAKE_LATENCY_MS: mean added latency per request, exponentially distributed (default 0)
+  - FAKE_ERROR_RATE: share of requests answered with 503 (default 0)
+  - FAKE_RATE_LIMIT_RATE: share of requests answered with 429 (default 0)
+  - FAKE_RETRY_AFTER_SECONDS: Retry-After of the 429 responses (default 1)
+  - FAKE_SPIKE_RATE: share of forecast intervals with a price spike (default 0.02)
+
+Point the updater at it with:
+    TESLA_API_BASE_URL=http://localhost:9191 TESLA_TOKEN_URL=http://localhost:9191/oauth2/v3/token
+    AMBER_API_BASE_URL=http://localhost:9191/v1
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask, jsonify, request
+
+app = Flask(__name__)
+
+LATENCY_MS = float(os.environ.get("FAKE_LATENCY_MS", 0))
+ERROR_RATE = float(os.environ.get("FAKE_ERROR_RATE", 0))
+RATE_LIMIT_RATE = float(os.environ.get("FAKE_RATE_LIMIT_RATE", 0))
+RETRY_AFTER_SECONDS = float(os.environ.get("FAKE_RETRY_AFTER_SECONDS", 1))
+SPIKE_RATE = float(os.environ.get("FAKE_SPIKE_RATE", 0.02))
+
+# Requests served per endpoint and status code, see /stats
+STATS = {}
+STATS_LOCK = threading.Lock()
+
+
+def site_number(value: str) -> int:
+    """Derives a stable number from a token or site ID, so every account has its own site."""
+    return int(hashlib.sha256(value.encode("utf-8")).hexdigest()[:8], 16)
+
+
+@app.before_request
+def simulate_conditions():
+    """Adds latency, and answers with 429 or 503 as configured."""
+    if LATENCY_MS:
+        time.sleep(random.expovariate(1000 / LATENCY_MS))
+    if request.path == "/stats":
+        return None
+    roll = random.random()
+    if roll < RATE_LIMIT_RATE:
+        return jsonify({"error": "Too Many Requests"}), 429, {"Retry-After": str(RETRY_AFTER_SECONDS)}
+    if roll < RATE_LIMIT_RATE + ERROR_RATE:
+        return jsonify({"error": "Service Unavailable"}), 503
+    return None
+
+
+@app.after_request
+def count_response(response):
+    key = f"{request.method} {request.url_rule.rule if request.url_rule else request.path} {response.status_code}"
+    with STATS_LOCK:
+        STATS[key] = STATS.get(key, 0) + 1
+    return response
+
+
+@app.route("/stats")
+def stats():
+    with STATS_LOCK:
+        return jsonify(STATS)
+
+
+@app.route("/oauth2/v3/token", methods=["POST"])
+def token_exchange():
+    refresh_token = request.form.get("refresh_token") or request.form.get("code")
+    if not refresh_token:
+        return jsonify({"error": "invalid_grant"}), 400
+    return jsonify(
+        {
+            # The access token names the account, so products can find its energy site
+            "access_token": f"access-{refresh_token}-{uuid.uuid4().hex[:8]}",
+            "refresh_token": refresh_token,
+            "expires_in": 28800,
+            "token_type": "Bearer",
+        }
+    )
+
+
+@app.route("/api/1/products")
+def products():
+    authorization = request.headers.get("Authorization", "")
+    if not authorization.startswith("Bearer access-"):
+        return jsonify({"error": "unauthorized"}), 401
+    account = authorization.removeprefix("Bearer access-").rsplit("-", 1)[0]
+    return jsonify(
+        {
+            "response": [
+                {"id": 1, "vin": "5YJ3E1EA0KF000000", "display_name": "Car"},
+                {
+                    "energy_site_id": site_number(account),
+                    "resource_type": "battery",
+                    "device_type": "energy",
+                    "site_name": account,
+                },
+            ],
+            "count": 2,
+        }
+    )
+
+
+@app.route("/api/1/energy_sites/<int:energy_site_id>/time_of_use_settings", methods=["POST"])
+def time_of_use_settings(energy_site_id: int):
+    settings = request.get_json(silent=True) or {}
+    if "tariff_content_v2" not in settings.get("tou_settings", {}):
+        return jsonify({"error": "missing tariff_content_v2"}), 400
+    return jsonify({"response": {"code": 201, "message": "Updated"}})
+
+
+@app.route("/v1/sites")
+def amber_sites():
+    site_id = f"SITE{site_number(request.headers.get('Authorization', '')) % 10**8:08d}"
+    return jsonify(
+        [
+            {
+                "id": site_id,
+                "nmi": f"{site_number(site_id) % 10**10:010d}",
+                "channels": [{"identifier": "E1", "type": "general", "tariff": "A100"}],
+                "network": "Ausgrid",
+                "status": "active",
+                "activeFrom": "2024-01-01",
+                "intervalLength": 5,
+            }
+        ]
+    )
+
+
+def make_interval(interval_type: str, start: datetime, duration: int, spot_per_kwh: float) -> dict:
+    end = start + timedelta(minutes=duration)
+    interval = {
+        "type": interval_type,
+        "date": start.date().isoformat(),
+        "duration": duration,
+        "startTime": (start + timedelta(seconds=1)).isoformat().replace("+00:00", "Z"),
+        "endTime": end.isoformat().replace("+00:00", "Z"),
+        "nemTime": end.isoformat().replace("+00:00", "Z"),
+        "perKwh": spot_per_kwh + 15.0,
+        "renewables": 30.0,
+        "spotPerKwh": spot_per_kwh,
+        "channelType": "general",
+        "spikeStatus": "spike" if spot_per_kwh > 100 else "none",
+        "descriptor": "spike" if spot_per_kwh > 100 else "neutral",
+    }
+    if interval_type == "CurrentInterval":
+        interval["estimate"] = True
+    return interval
+
+
+@app.route("/v1/sites/<site_id>/prices/current")
+def amber_current_prices(site_id: str):
+    next_intervals = int(request.args.get("next", 0))
+    previous_intervals = int(request.args.get("previous", 0))
+    duration = int(request.args.get("resolution", 5))
+    now = datetime.now(tz=timezone.utc)
+    current_start = now.replace(second=0, microsecond=0) - timedelta(minutes=now.minute % duration)
+    # Prices of an interval are random but the same for every request of the site
+    intervals = []
+    for offset in range(-previous_intervals, next_intervals + 1):
+        start = current_start + timedelta(minutes=duration * offset)
+        rng = random.Random(f"{site_id}-{start.isoformat()}")
+        spot_per_kwh = rng.uniform(5, 40)
+        if rng.random() < SPIKE_RATE:
+            spot_per_kwh = rng.uniform(150, 1500)
+        interval_type = (
+            "ActualInterval" if offset < 0 else "CurrentInterval" if offset == 0 else "ForecastInterval"
+        )
+        intervals.append(make_interval(interval_type, start, duration, spot_per_kwh))
+    return jsonify(intervals)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 9191)))
+    args = parser.parse_args()
+    app.run(host="127.0.0.1", port=args.port, threaded=True)
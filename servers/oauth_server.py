@@ -11,12 +11,24 @@ CACHE = {}
 CACHE_LIMMIT = 1000  # Limit the number of states in the cache
 
 AUTH_DIR = os.environ.get("AUTH_DIR", "/app/auth")
+# The price updater writes its metrics here as Prometheus textfiles (*.prom)
+METRICS_DIR = os.environ.get("METRICS_DIR", "/app/metrics")
 ## Get the current working directory of the file
 KEYS_DIR = f"{os.path.dirname(__file__)}/.keys"  # Assuming .keys is in the current working directory of the app
 
 AUDIENCE = "https://fleet-api.prd.na.vn.cloud.tesla.com"
 CALLBACK_URL = "https://pow.coldzee.win/oauth_redirect"
-TOKEN_EXCHANGE_URL = "https://fleet-auth.prd.vn.cloud.tesla.com/oauth2/v3/token"
+TOKEN_EXCHANGE_URL = os.environ.get(
+    "TESLA_TOKEN_URL", "https://fleet-auth.prd.vn.cloud.tesla.com/oauth2/v3/token"
+)
+# (connect, read) timeouts in seconds for the token exchange
+TOKEN_EXCHANGE_TIMEOUT = (
+    float(os.environ.get("HTTP_CONNECT_TIMEOUT_SECONDS", 5)),
+    float(os.environ.get("HTTP_READ_TIMEOUT_SECONDS", 15)),
+)
+
+# Keep-alive session shared by all requests to Tesla
+session = requests.Session()
 
 
 @app.route("/oauth_redirect")
@@ -53,6 +65,25 @@ def serve_public_key():
         return f"Error serving public key", 500
 
 
+@app.route("/metrics")
+def serve_metrics():
+    """Serves the metrics written by the price updater, in the Prometheus text format."""
+    chunks = []
+    try:
+        file_names = sorted(os.listdir(METRICS_DIR))
+    except FileNotFoundError:
+        file_names = []
+    for file_name in file_names:
+        if not file_name.endswith(".prom"):
+            continue
+        try:
+            chunks.append(read_file(os.path.join(METRICS_DIR, file_name)) + "\n")
+        except RuntimeError:
+            # The file may be replaced while it is listed, it is picked up on the next scrape
+            continue
+    return "".join(chunks), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
 @app.route("/")
 def home():
     client_id = os.environ.get("TESLA_CLIENT_ID")
@@ -107,7 +138,10 @@ def exchange_refresh_token(auth_code: str) -> tuple[str, str]:
     print(f"Exchanging code for tokens with data: {data} and headers: {headers}")
 
     try:
-        response = requests.post(TOKEN_EXCHANGE_URL, headers=headers, data=data)
+        # Never retried: an authorization code can only be exchanged once
+        response = session.post(
+            TOKEN_EXCHANGE_URL, headers=headers, data=data, timeout=TOKEN_EXCHANGE_TIMEOUT
+        )
         print(f"Exchanging code for tokens: {response.status_code} - {response.text}")
         response.raise_for_status()  # Raise an exception for HTTP errors
         token_data = response.json()
@@ -1,78 +1,251 @@
+from __future__ import annotations
+
+import json
+import math
 import os
+import sys
 from typing import List
-import amberelectric
-from amberelectric.rest import ApiException
 from datetime import datetime, timedelta
-from dateutil import tz
 from app_logger import logger
-from simple_price import PriceType, SimplePrice
-from amberelectric.models.interval import Interval
+from file_cache import FileCache
+from http_client import HttpClient, bounded_timeout, time_left
+from interval_store import IntervalStore
+import metrics
+from rate_limiter import parse_retry_after, shared_rate_limiter
+from simple_price import PRICE_TYPE_CODES, PriceSeries, PriceType
+from slot_grid import SlotGrid
+
+AMBER_API_URL = "https://api.amber.com.au/v1"
+# Intervals are always requested at 5 minutes, whatever RESOLUTION is: a 30 minute average
+# would hide a 5 minute spike from the spike decision
+INTERVAL_MINUTES = 5
+# (connect, read) timeouts in seconds of the Amber endpoints
+TIMEOUTS = {"amber_sites": (5, 20), "amber_prices": (5, 20)}
+
+
+def _is_api_exception(error: Exception) -> bool:
+    """Whether the error is an Amber ApiException, without importing the SDK to check."""
+    rest = sys.modules.get("amberelectric.rest")
+    return rest is not None and isinstance(error, rest.ApiException)
 
 
 class AmberClient:
-    def __init__(self):
-        """Initializes the Amber API client with the required configuration."""
-        self._configuration = amberelectric.Configuration(
-            access_token=os.environ.get("AMBER_API_TOKEN")
+    def __init__(
+        self,
+        site: str | None = None,
+        site_id: str | None = None,
+        api_token: str | None = None,
+        amber_api=None,
+    ):
+        """
+        Initializes the Amber API client with the required configuration.
+        :param site: Name of the site, keeps the state files of several sites apart.
+        :param site_id: Amber site to fetch, defaults to AMBER_SITE_ID or the first site.
+        :param api_token: Token of the site's Amber account, defaults to AMBER_API_TOKEN.
+        :param amber_api: Amber API to use instead of building the SDK's one.
+        """
+        # Overridable to point the client at a stand-in server, e.g. servers/fake_providers.py
+        self._host = os.environ.get("AMBER_API_BASE_URL") or None
+        self._api_token = api_token or os.environ.get("AMBER_API_TOKEN")
+        self._grid = SlotGrid.from_env()
+        # The SDK loads pydantic and hundreds of generated models, so the API client is only
+        # built when the site ID is looked up, and then keeps its connection pool alive
+        self._api_client = None
+        self._amber_api = amber_api
+        # Amber limits each token, so the sites of an account share one limiter
+        self._rate_limiter = shared_rate_limiter(self._api_token)
+        # Prices are fetched raw and parsed straight into arrays, bypassing the SDK's models
+        self._http = HttpClient(timeouts=TIMEOUTS, rate_limiter=self._rate_limiter)
+
+        auth_dir = os.environ.get("AUTH_DIR", "/app/auth")
+        state_suffix = f"_{site}" if site else ""
+        self._site_id_override = site_id or os.environ.get("AMBER_SITE_ID")
+        self._site_cache = FileCache(
+            os.path.join(auth_dir, f"amber_site{state_suffix}.json"),
+            ttl_seconds=float(os.environ.get("AMBER_SITE_CACHE_TTL_HOURS", 24)) * 3600,
+        )
+        # Number of forecast intervals requested after the current one, 24 hours of 5 minutes
+        self._forecast_intervals = int(
+            os.environ.get("AMBER_FORECAST_INTERVALS", 24 * 60 // INTERVAL_MINUTES)
         )
-        self._resolution = os.environ.get("RESLUTION", 5)
+        self._interval_store = IntervalStore(
+            os.path.join(auth_dir, f"amber_intervals{state_suffix}.json")
+        )
+        # Intervals after the current one fetched on every run, the next hour by default, as
+        # their forecast is revised the most. The rest is fetched again once they have elapsed
+        self._refresh_intervals = int(os.environ.get("AMBER_REFRESH_INTERVALS", 12))
+
+    @property
+    def _api(self):
+        """The Amber API, the SDK is imported and its client built on first use."""
+        if self._amber_api is None:
+            import amberelectric
+
+            configuration = amberelectric.Configuration(
+                host=self._host, access_token=self._api_token
+            )
+            self._api_client = amberelectric.ApiClient(configuration)
+            self._amber_api = amberelectric.AmberApi(self._api_client)
+        return self._amber_api
+
+    def close(self):
+        """Closes the underlying API client and its connection pool."""
+        if self._api_client is not None:
+            self._api_client.close()
+        self._http.close()
 
     def _get_site_id(self) -> str:
-        """Retrieves the site ID for the configured postcode."""
-        with amberelectric.ApiClient(self._configuration) as api_client:
-            api_instance = amberelectric.AmberApi(api_client)
-            sites = api_instance.get_sites()
-            if not sites:
-                raise ValueError(f"No site found for postcode {{self.postcode}}")
-            logger.info(f"Using site ID: {sites[0].id}")
-            return sites[0].id
-
-    def get_forecast(self) -> List[SimplePrice]:
-        """Fetches the electricity price forecast for the site."""
+        """Retrieves the site ID, from AMBER_SITE_ID or the on-disk cache when possible."""
+        if self._site_id_override:
+            return self._site_id_override
+
+        site_id = self._site_cache.get()
+        if site_id:
+            logger.debug("Using cached site ID: %s", site_id)
+            return site_id
+
+        self._rate_limiter.acquire("amber_sites", timeout=time_left())
+        sites = self._api.get_sites(_request_timeout=bounded_timeout(TIMEOUTS["amber_sites"]))
+        if not sites:
+            raise ValueError("No site found for the Amber account")
+        logger.info("Using site ID: %s", sites[0].id)
+        self._site_cache.set(sites[0].id)
+        return sites[0].id
+
+    def get_forecast(self) -> PriceSeries:
+        """
+        Fetches the electricity price forecast for the site.
+        Without an Amber API token the fetch is skipped, and only Globird prices are used.
+        """
+        if not self._api_token:
+            logger.warning("No Amber API token set, skipping the Amber forecast")
+            return PriceSeries.empty()
+        import requests
+
         try:
             site_id = self._get_site_id()
-            # Get the simple prices for the site, and filter out ActualInterval
-            simple_prices = self._get_simple_prices(site_id)
+            now = datetime.now(tz=self._grid.tzinfo)
+            with metrics.timed("amber_fetch"):
+                simple_prices = self._get_simple_prices(site_id, now)
             if not simple_prices:
                 logger.warning("No forecast data available for the site.")
-                return []
-            now = datetime.now(tz=tz.tzlocal())
-            # Filter out ActualInterval prices and forcasted prices further than 24 hours
-            forecasted_prices = [
-                price
-                for price in simple_prices
-                if price.price_type != PriceType.ACTUAL
-                and price.start_time < now + timedelta(days=1)
-            ]
-            return forecasted_prices
-        except ApiException as e:
-            print("Exception when calling AmberApi->get_forecast: %s\n" % e)
-            return []
+                return PriceSeries.empty()
+            return self._filter_forecast(simple_prices, now, self._grid)
         except ValueError as e:
-            print(f"Error: {e}")
-            return []
-
-    def _get_simple_prices(self, site_id: str) -> List[SimplePrice]:
-        """Fetches the forecast data for the given site ID."""
-        with amberelectric.ApiClient(self._configuration) as api_client:
-            api_instance = amberelectric.AmberApi(api_client)
-            start_date = datetime.now()
-            end_date = datetime.now() + timedelta(days=1)
-            prices: List[Interval] = api_instance.get_prices(
-                site_id, start_date=start_date, end_date=end_date, resolution=5
+            logger.error("Error: %s", e)
+            return PriceSeries.empty()
+        except requests.exceptions.RequestException as e:
+            metrics.api_errors_total.inc(api="amber")
+            logger.error("Error fetching Amber prices: %s", e)
+            return PriceSeries.empty()
+        except Exception as e:
+            if not _is_api_exception(e):
+                raise
+            metrics.api_errors_total.inc(api="amber")
+            if e.status == 429:
+                retry_after = parse_retry_after((e.headers or {}).get("Retry-After"), 60)
+                logger.warning("Amber rate limit reached, holding requests for %.0fs", retry_after)
+                self._rate_limiter.block("amber_prices", retry_after)
+                self._rate_limiter.block("amber_sites", retry_after)
+            logger.error("Exception when calling AmberApi->get_forecast: %s", e)
+            return PriceSeries.empty()
+
+    @staticmethod
+    def _filter_forecast(prices: PriceSeries, now: datetime, grid: SlotGrid) -> PriceSeries:
+        """
+        Filters out ActualInterval prices and forecasted prices further than a day.
+        Actual intervals are all in the past, so both filters reduce to slicing the series.
+        Entries are spaced in wall-clock time, so the horizon is counted in wall-clock time
+        too, on the days daylight saving time starts or ends as well.
+        """
+        actual_code = PRICE_TYPE_CODES[PriceType.ACTUAL]
+        start = 0
+        while start < len(prices) and prices.price_type_codes[start] == actual_code:
+            start += 1
+        horizon_entries = (
+            grid.wall_clock_seconds((now + timedelta(days=1)).timestamp())
+            - grid.wall_clock_seconds(prices.start_epoch)
+        ) / prices.period_seconds
+        end = min(len(prices), max(start, math.ceil(horizon_entries)))
+        return prices[start:end]
+
+    def _get_simple_prices(self, site_id: str, now: datetime) -> PriceSeries:
+        """
+        Fetches the current and forecast intervals of the site into the interval store.
+        Actual intervals are never requested. Most runs only fetch the current interval and
+        the next AMBER_REFRESH_INTERVALS, and merge them into the stored forecast. The whole
+        forecast is fetched again once that many intervals have elapsed since its last fetch,
+        looking as many intervals further ahead, so the stored forecast covers a day until the
+        next full fetch.
+        """
+        store = self._interval_store
+        store.prune(now)
+        refresh_seconds = self._refresh_intervals * INTERVAL_MINUTES * 60
+        full_fetch = (
+            store.site_id != site_id
+            or not store.intervals
+            or now.timestamp() - store.full_fetch_epoch >= refresh_seconds
+        )
+        # Rate limited, and retried after a 429, by the HTTP client
+        response = self._http.get(
+            "amber_prices",
+            f"{self._host or AMBER_API_URL}/sites/{site_id}/prices/current",
+            params={
+                "next": (
+                    self._forecast_intervals + self._refresh_intervals
+                    if full_fetch
+                    else self._refresh_intervals
+                ),
+                "previous": 0,
+                "resolution": INTERVAL_MINUTES,
+            },
+            headers={"Authorization": f"Bearer {self._api_token}", "Accept": "application/json"},
+        )
+        response.raise_for_status()
+        horizon_epoch = (now + timedelta(days=1)).timestamp() + refresh_seconds
+        store.merge(
+            site_id,
+            self._parse_intervals(response.content, horizon_epoch),
+            full_fetch_epoch=now.timestamp() if full_fetch else None,
+        )
+        store.save()
+        return store.to_price_series(self._grid.tzinfo)
+
+    @staticmethod
+    def _parse_intervals(content: bytes, horizon_epoch: float) -> List[tuple]:
+        """
+        Parses a raw prices response in a single pass, keeping only what the forecast needs.
+        Each interval object is reduced to a tuple as soon as the JSON decoder has read it.
+        Actual intervals, intervals starting after the horizon and channels other than general,
+        whose spot price is the same, are dropped on the way.
+        :param content: Body of the prices response, a JSON list of intervals.
+        :param horizon_epoch: Unix time from which intervals are dropped.
+        :return: (start Unix time, period seconds, buy per kWh, sell per kWh, PRICE_TYPE_CODES
+            code) of each interval kept.
+        """
+
+        def parse_interval(fields: dict):
+            interval_type = fields.get("type")
+            # Nested objects, e.g. tariffInformation, have no type and are dropped as well
+            if (
+                interval_type == PriceType.ACTUAL
+                or not PriceType.is_valid(interval_type)
+                or fields.get("channelType", "general") != "general"
+            ):
+                return None
+            start_epoch = round(datetime.fromisoformat(fields["startTime"]).timestamp())
+            if start_epoch >= horizon_epoch:
+                return None
+            return (
+                start_epoch,
+                fields["duration"] * 60,
+                fields["perKwh"] / 100.0,
+                fields["spotPerKwh"] / 100.0,
+                PRICE_TYPE_CODES[interval_type],
             )
-            simple_prices: List[SimplePrice] = []
-            for price in prices:
-                price_instance = price.actual_instance
-                simple_prices.append(
-                    SimplePrice(
-                        start_time=price_instance.start_time.astimezone(
-                            tz=tz.tzlocal()
-                        ),
-                        period=timedelta(minutes=price_instance.duration),
-                        buy_per_kwh=price_instance.per_kwh / 100.0,
-                        sell_per_kwh=price_instance.spot_per_kwh / 100.0,
-                        price_type=price_instance.type,
-                    )
-                )
-            return simple_prices
+
+        return [
+            interval
+            for interval in json.loads(content, object_hook=parse_interval)
+            if interval is not None
+        ]
@@ -1,16 +1,185 @@
+"""
+Logging of the application.
+
+Records are put on an in-process queue and written by a listener thread, so formatting them
+and writing them to disk never stalls a run. Messages are formatted with %-style arguments,
+by the listener and only once a record passed its level, so disabled levels cost nothing.
+Configured with:
+  - LOG_LEVEL: level of the root logger (default INFO)
+  - LOG_FORMAT: text, or json for one JSON object per line (default text)
+  - LOG_MAX_BYTES: size at which the log file is rotated (default 10 MiB)
+  - LOG_ROTATE_WHEN: rotates the log file on time instead, e.g. midnight (default unset)
+  - LOG_BACKUP_COUNT: number of gzip compressed rotated files kept (default 5)
+"""
+
+import atexit
+import copy
+import decimal
+import gzip
+import json
+import logging
+import logging.handlers
 import os
+import queue
+import shutil
 import sys
-import logging
+from datetime import date, datetime, time, timedelta
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# Attributes of every log record, the others were passed with extra= and are logged as fields
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class DecodedText:
+    """Bytes logged as UTF-8 text, e.g. a response body, decoded only if the record is formatted."""
+
+    __slots__ = ("content",)
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def __str__(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+
+# Arguments that cannot change after the call, so the listener thread can format them later
+_IMMUTABLE_TYPES = (
+    str,
+    bytes,
+    int,
+    float,
+    complex,
+    decimal.Decimal,
+    date,
+    time,
+    timedelta,
+    DecodedText,
+    type(None),
+)
+
+
+def _is_immutable(value) -> bool:
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_immutable(item) for item in value)
+    return isinstance(value, _IMMUTABLE_TYPES)
+
+
+class _LogDirMixin:
+    """Creates the log directory with the file, on the first record."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class _RotatingFileHandler(_LogDirMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class _TimedRotatingFileHandler(_LogDirMixin, logging.handlers.TimedRotatingFileHandler):
+    pass
+
+
+def _gzip_namer(name: str) -> str:
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source: str, dest: str):
+    """Compresses the rotated log file."""
+    with open(source, "rb") as source_file, gzip.open(dest, "wb") as dest_file:
+        shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, with the fields passed with extra=."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).astimezone().isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue for the listener thread to format, exception included. Only a
+    record with a mutable argument, e.g. a list, has its message merged when it is queued, so
+    that it is logged as it was at the call.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # A copy, as the other handlers of the record may still be running in this thread
+        record = copy.copy(record)
+        if record.args and not _is_immutable(record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def _file_handler(path: str) -> logging.Handler:
+    """Builds the rotating handler of the log file, rotated on time if LOG_ROTATE_WHEN is set."""
+    backup_count = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+    rotate_when = os.environ.get("LOG_ROTATE_WHEN")
+    if rotate_when:
+        handler = _TimedRotatingFileHandler(
+            path, when=rotate_when, backupCount=backup_count, delay=True
+        )
+    else:
+        handler = _RotatingFileHandler(
+            path,
+            maxBytes=int(os.environ.get("LOG_MAX_BYTES", 10 * 2**20)),
+            backupCount=backup_count,
+            delay=True,
+        )
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+def configure_logging(path: str) -> logging.handlers.QueueListener | None:
+    """
+    Sends the records of the root logger through a queue to the log file and stdout.
+    Does nothing if the root logger already has handlers, e.g. under pytest.
+    :param path: Path of the log file.
+    :return: The started listener, None if logging was already configured.
+    """
+    root = logging.getLogger()
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    if root.handlers:
+        return None
+
+    if os.environ.get("LOG_FORMAT", "text").lower() == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    handlers = [_file_handler(path), logging.StreamHandler(sys.stdout)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(_QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Flushes the records still queued on exit
+    atexit.register(listener.stop)
+    return listener
+
 
 # Configure logging for the application
 log_dir = os.path.join(os.path.dirname(__file__), "logs")
-os.makedirs(log_dir, exist_ok=True)
-
 log_file = os.path.join(log_dir, "price_updater.log")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler(log_file), logging.StreamHandler(sys.stdout)],
-)
+configure_logging(log_file)
 logger = logging.getLogger(__name__)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Backtest of the spike strategy over recorded Amber prices.
+
+Replays recorded Amber intervals through the same decision logic as PowerwallPriceUpdater
+(spike_strategy.apply_spike_strategy) for a sweep of sell thresholds, and reports for each
+threshold the spike slots, the energy exported during them and its estimated revenue, and
+the capture: the share of the revenue an oracle that knew every price of the day in advance
+would have made with the same battery.
+
+Intervals are read from files in the examples/amber_forecast.json format (later files win
+where they overlap) or from the history recorded by the updater:
+
+    python workers/backtest.py workers/examples/amber_forecast.json
+    python workers/backtest.py --history /app/auth/history.sqlite3 --start 2025-01-01 --end 2026-01-01
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List
+
+import numpy as np
+from dateutil import tz
+
+from globird_client import DEFAULT_TARIFF_FILE
+from history_store import AMBER_FORECAST, HistoryStore
+from spike_strategy import apply_spike_strategy
+from tariff_table import TariffTable
+
+# Duration of the slots of recorded Amber intervals
+SLOT_SECONDS = 300
+# Thresholds evaluated together as one (thresholds x slots) array
+THRESHOLDS_PER_TASK = 16
+
+# Market data of the worker processes, sent once per process by the pool initializer
+_worker_market: dict | None = None
+
+
+def load_forecast_files(paths: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Loads Amber intervals from files in the examples/amber_forecast.json format, onto a grid
+    of 5 minute slots. Only the general channel is loaded, like AmberClient does. 30 minute
+    intervals cover six slots, and 5 minute intervals replace the longer intervals they
+    overlap. Slots without an interval have a NaN price.
+    :param paths: Files ordered by age, later files win where they overlap.
+    :return: Tuple of (slot start Unix times, Amber sell price per kWh).
+    """
+    starts, spans, sells, priorities = [], [], [], []
+    for file_index, path in enumerate(paths):
+        with open(path, "r") as file:
+            raw_intervals = json.load(file)
+        for raw_interval in raw_intervals:
+            if raw_interval.get("channelType", "general") != "general":
+                continue
+            # Amber start times are one second past the slot boundary
+            start_epoch = datetime.datetime.fromisoformat(raw_interval["startTime"]).timestamp()
+            starts.append(int(start_epoch) // SLOT_SECONDS * SLOT_SECONDS)
+            spans.append(max(1, raw_interval["duration"] * 60 // SLOT_SECONDS))
+            sells.append(raw_interval["spotPerKwh"] / 100.0)
+            priorities.append((file_index, -raw_interval["duration"]))
+    if not starts:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    # Lowest priority first, so that the last write of each slot wins
+    order = sorted(range(len(starts)), key=priorities.__getitem__)
+    starts = np.array(starts, dtype=np.int64)[order]
+    spans = np.array(spans, dtype=np.int64)[order]
+    sells = np.array(sells)[order]
+
+    origin = starts.min()
+    slot_count = int((starts + spans * SLOT_SECONDS).max() - origin) // SLOT_SECONDS
+    slot_indexes = np.repeat((starts - origin) // SLOT_SECONDS, spans) + (
+        np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+    )
+    slot_sells = np.repeat(sells, spans)
+    # np.unique keeps the first occurrence, so search the reversed writes for the last one
+    unique_indexes, reversed_positions = np.unique(slot_indexes[::-1], return_index=True)
+    amber_sell = np.full(slot_count, np.nan)
+    amber_sell[unique_indexes] = slot_sells[::-1][reversed_positions]
+    return origin + np.arange(slot_count, dtype=np.int64) * SLOT_SECONDS, amber_sell
+
+
+def load_history(
+    path: str, site: str, start: datetime.datetime, end: datetime.datetime
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Loads the last recorded revision of the Amber intervals of a site from the history.
+    :return: Tuple of (slot start Unix times, Amber sell price per kWh).
+    """
+    history_store = HistoryStore(path)
+    try:
+        prices = history_store.get_prices(AMBER_FORECAST, site, start, end)
+    finally:
+        history_store.close()
+    return np.array(prices.start_epochs(), dtype=np.int64), np.array(prices.sell)
+
+
+def local_calendar(
+    start_epochs: np.ndarray, tzinfo: datetime.tzinfo
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Maps Unix times to local days and minutes of the day.
+    :return: Tuple of (local day number, local minute of the day).
+    """
+    # UTC offsets only change on hour boundaries, so they are looked up once per hour
+    hours, hour_indexes = np.unique(start_epochs // 3600, return_inverse=True)
+    offsets = np.array(
+        [
+            datetime.datetime.fromtimestamp(int(hour) * 3600, tz=tzinfo)
+            .utcoffset()
+            .total_seconds()
+            for hour in hours
+        ],
+        dtype=np.int64,
+    )
+    local_seconds = start_epochs + offsets[hour_indexes]
+    return local_seconds // 86400, local_seconds % 86400 // 60
+
+
+def build_market(
+    start_epochs: np.ndarray,
+    amber_sell: np.ndarray,
+    tariff: TariffTable,
+    tzinfo: datetime.tzinfo,
+    slot_seconds: int = SLOT_SECONDS,
+) -> dict:
+    """
+    Builds the arrays a simulation needs, for slots ordered by start time.
+    :return: Mapping of array name to array, one entry per slot.
+    """
+    days, minutes_of_day = local_calendar(start_epochs, tzinfo)
+    return {
+        "days": days,
+        "globird_buy": np.array(tariff.buy_prices)[minutes_of_day],
+        "globird_sell": np.array(tariff.sell_prices)[minutes_of_day],
+        "amber_sell": amber_sell,
+        "slot_hours": slot_seconds / 3600,
+    }
+
+
+def _day_starts(days: np.ndarray) -> np.ndarray:
+    """Returns the index of the first slot of every day, for slots ordered by time."""
+    return np.flatnonzero(np.diff(days, prepend=days[:1] - 1))
+
+
+def simulate(
+    market: dict, thresholds: np.ndarray, export_kw: float, battery_kwh: float
+) -> List[dict]:
+    """
+    Simulates the spike strategy for several thresholds at once. The battery exports at
+    export_kw during spike slots, at most battery_kwh per day, earning the Amber sell price.
+    :return: One result per threshold.
+    """
+    amber_sell = market["amber_sell"]
+    _, _, spikes = apply_spike_strategy(
+        market["globird_buy"], market["globird_sell"], amber_sell, thresholds[:, np.newaxis]
+    )
+    slot_kwh = export_kw * market["slot_hours"]
+    wanted_kwh = np.where(spikes, slot_kwh, 0.0)
+
+    # Energy already exported earlier on the same day, before each slot
+    day_starts = _day_starts(market["days"])
+    exported_before = np.cumsum(wanted_kwh, axis=1) - wanted_kwh
+    day_lengths = np.diff(np.append(day_starts, len(amber_sell)))
+    exported_before -= np.repeat(exported_before[:, day_starts], day_lengths, axis=1)
+    exported_kwh = np.clip(battery_kwh - exported_before, 0.0, wanted_kwh)
+    revenue = np.sum(exported_kwh * np.where(spikes, amber_sell, 0.0), axis=1)
+
+    return [
+        {
+            "threshold": float(threshold),
+            "spike_slots": int(spike_slots),
+            "exported_kwh": float(exported),
+            "revenue": float(threshold_revenue),
+        }
+        for threshold, spike_slots, exported, threshold_revenue in zip(
+            thresholds, spikes.sum(axis=1), exported_kwh.sum(axis=1), revenue
+        )
+    ]
+
+
+def oracle_revenue(market: dict, export_kw: float, battery_kwh: float) -> float:
+    """
+    Returns the revenue of exporting the battery in the best priced slots of every day,
+    knowing all the prices in advance.
+    """
+    amber_sell = np.nan_to_num(market["amber_sell"], nan=0.0)
+    days = market["days"]
+    slot_kwh = export_kw * market["slot_hours"]
+    # Slots sorted by day, then by descending price
+    order = np.lexsort((-amber_sell, days))
+    sorted_sell = amber_sell[order]
+    day_starts = _day_starts(days[order])
+    day_lengths = np.diff(np.append(day_starts, len(order)))
+    rank = np.arange(len(order)) - np.repeat(day_starts, day_lengths)
+    exported_kwh = np.clip(battery_kwh - rank * slot_kwh, 0.0, slot_kwh)
+    return float(np.sum(exported_kwh * np.clip(sorted_sell, 0.0, None)))
+
+
+def _init_worker(market: dict):
+    global _worker_market
+    _worker_market = market
+
+
+def _simulate_in_worker(
+    thresholds: np.ndarray, export_kw: float, battery_kwh: float
+) -> List[dict]:
+    return simulate(_worker_market, thresholds, export_kw, battery_kwh)
+
+
+def sweep(
+    market: dict,
+    thresholds: np.ndarray,
+    export_kw: float,
+    battery_kwh: float,
+    workers: int | None = None,
+) -> List[dict]:
+    """
+    Simulates every threshold, spread over a pool of worker processes.
+    :param workers: Number of processes, defaults to the number of CPUs, 1 runs in this process.
+    :return: One result per threshold, in the order of the thresholds, with its capture.
+    """
+    workers = workers or os.cpu_count() or 1
+    task_count = max(workers, math.ceil(len(thresholds) / THRESHOLDS_PER_TASK))
+    chunks = [chunk for chunk in np.array_split(thresholds, task_count) if len(chunk)]
+    if workers == 1:
+        results = [simulate(market, chunk, export_kw, battery_kwh) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(market,)
+        ) as pool:
+            results = list(
+                pool.map(
+                    _simulate_in_worker,
+                    chunks,
+                    [export_kw] * len(chunks),
+                    [battery_kwh] * len(chunks),
+                )
+            )
+
+    best_revenue = oracle_revenue(market, export_kw, battery_kwh)
+    flat_results = [result for chunk_results in results for result in chunk_results]
+    for result in flat_results:
+        result["capture"] = result["revenue"] / best_revenue if best_revenue > 0 else 0.0
+    return flat_results
+
+
+def parse_thresholds(value: str) -> np.ndarray:
+    """Parses thresholds given as start:stop:step (stop included) or as a comma separated list."""
+    if ":" in value:
+        start, stop, step = (float(part) for part in value.split(":"))
+        return np.round(np.arange(start, stop + step / 2, step), 6)
+    return np.array([float(part) for part in value.split(",")])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("files", nargs="*", help="Amber interval files, oldest first.")
+    parser.add_argument("--history", help="History database to read the Amber intervals from.")
+    parser.add_argument("--site", default="default", help="Site of the history, default 'default'.")
+    parser.add_argument(
+        "--start", type=datetime.date.fromisoformat, help="First day of the history."
+    )
+    parser.add_argument(
+        "--end", type=datetime.date.fromisoformat, help="Day after the last day of the history."
+    )
+    parser.add_argument(
+        "--thresholds",
+        type=parse_thresholds,
+        default="0.1:5.0:0.1",
+        help="Sell thresholds as start:stop:step or a comma separated list, default 0.1:5.0:0.1.",
+    )
+    parser.add_argument("--export-kw", type=float, default=5.0, help="Export power, default 5 kW.")
+    parser.add_argument(
+        "--battery-kwh", type=float, default=13.5, help="Energy exportable per day, default 13.5 kWh."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Worker processes, defaults to the CPU count."
+    )
+    parser.add_argument(
+        "--tariff",
+        default=os.environ.get("GLOBIRD_TARIFF_FILE", DEFAULT_TARIFF_FILE),
+        help="Globird tariff file, defaults to GLOBIRD_TARIFF_FILE.",
+    )
+    args = parser.parse_args()
+
+    tzinfo = tz.tzlocal()
+    if args.history:
+        first_day = args.start or datetime.date(2000, 1, 1)
+        end_day = args.end or datetime.date.today() + datetime.timedelta(days=1)
+        start = datetime.datetime.combine(first_day, datetime.time(tzinfo=tzinfo))
+        end = datetime.datetime.combine(end_day, datetime.time(tzinfo=tzinfo))
+        start_epochs, amber_sell = load_history(args.history, args.site, start, end)
+    elif args.files:
+        start_epochs, amber_sell = load_forecast_files(args.files)
+    else:
+        parser.error("Either interval files or --history is required.")
+    if not len(start_epochs):
+        parser.error("No Amber intervals found.")
+
+    slot_seconds = int(np.min(np.diff(start_epochs))) if len(start_epochs) > 1 else SLOT_SECONDS
+    market = build_market(
+        start_epochs, amber_sell, TariffTable.load(args.tariff), tzinfo, slot_seconds
+    )
+    results = sweep(market, args.thresholds, args.export_kw, args.battery_kwh, args.workers)
+
+    first_day = datetime.datetime.fromtimestamp(int(start_epochs[0]), tz=tzinfo).date()
+    last_day = datetime.datetime.fromtimestamp(int(start_epochs[-1]), tz=tzinfo).date()
+    print(f"{len(start_epochs)} slots from {first_day} to {last_day}")
+    print(f"{'threshold':>9} {'spikes':>7} {'exported':>10} {'revenue':>10} {'capture':>8}")
+    for result in results:
+        print(
+            f"{result['threshold']:>9.2f} {result['spike_slots']:>7} "
+            f"{result['exported_kwh']:>8.1f}kWh {result['revenue']:>10.2f} {result['capture']:>8.1%}"
+        )
+    best = max(results, key=lambda result: result["revenue"])
+    print(
+        f"Best threshold: {best['threshold']:.2f} "
+        f"({best['revenue']:.2f} revenue, {best['capture']:.1%} capture)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the price pipeline.
+
+Times each stage of the pipeline at RESOLUTION=5 and RESOLUTION=30, and compares the results
+with a baseline stored per machine in benchmarks/<machine tag>.json. Cases slower than the
+baseline by more than the threshold are reported as regressions and fail the command.
+
+    python workers/benchmark.py --save      # record the baseline of this machine
+    python workers/benchmark.py             # compare against it
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import timeit
+from typing import Callable
+from unittest.mock import Mock
+
+from amber_client import AmberClient
+from app_logger import logger
+from globird_client import GlobirdClient
+from price_updater import PowerwallPriceUpdater
+from simple_price import PriceSeries
+from tesla_tou_settings import TimeOfUseSettings
+import tou_serializer
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "examples")
+BASELINES_DIR = os.path.join(os.path.dirname(__file__), "benchmarks")
+RESOLUTIONS = (5, 30)
+
+
+def machine_tag() -> str:
+    """
+    Identifies the machine and interpreter the benchmarks ran on. The hostname is left out, as
+    it changes with every container, BENCHMARK_MACHINE names the host when several share a tag.
+    """
+    host = os.environ.get("BENCHMARK_MACHINE")
+    return "-".join(
+        part
+        for part in (
+            host,
+            platform.system(),
+            platform.machine(),
+            f"{platform.python_implementation()}{sys.version_info.major}{sys.version_info.minor}",
+        )
+        if part
+    ).lower()
+
+
+def load_example(file_name: str):
+    """Loads one of the JSON files of workers/examples."""
+    with open(os.path.join(EXAMPLES_DIR, file_name), "r") as file:
+        return json.load(file)
+
+
+def deserialize_amber_forecast(raw_content: bytes):
+    """Parses a raw Amber prices response the way AmberClient does, into a price series."""
+    return PriceSeries.from_intervals(AmberClient._parse_intervals(raw_content, math.inf))
+
+
+def build_cases(resolution_minutes: int) -> dict[str, Callable[[], object]]:
+    """
+    Builds the benchmark cases for a resolution.
+    :return: Mapping of case name to a callable running one iteration.
+    """
+    os.environ["RESOLUTION"] = str(resolution_minutes)
+    with open(os.path.join(EXAMPLES_DIR, "amber_forecast.json"), "rb") as file:
+        raw_amber_forecast = file.read()
+    raw_tesla_tou = load_example("tesla_tou.json")
+
+    # Actual intervals are dropped by the parsing
+    amber_forecast = deserialize_amber_forecast(raw_amber_forecast)
+
+    updater = PowerwallPriceUpdater(
+        globird_client=GlobirdClient(),
+        amber_client=Mock(get_forecast=Mock(return_value=amber_forecast)),
+        tesla_client=Mock(),
+    )
+    prices = updater._generate_prices()
+    time_of_use_settings = updater._build_time_of_use_settings(prices)
+
+    return {
+        # A new client each time, so the memoized prices are not reused
+        "globird_get_prices": lambda: GlobirdClient().get_prices(),
+        "generate_prices": updater._generate_prices,
+        "build_time_of_use_settings": lambda: updater._build_time_of_use_settings(prices),
+        "tou_to_dict": time_of_use_settings.to_dict,
+        "tou_fast_to_json_bytes": lambda: tou_serializer.to_json_bytes(time_of_use_settings),
+        "amber_forecast_deserialization": lambda: deserialize_amber_forecast(raw_amber_forecast),
+        "tesla_tou_deserialization": lambda: TimeOfUseSettings.from_dict(raw_tesla_tou),
+    }
+
+
+def time_case(case: Callable[[], object], repeat: int) -> float:
+    """
+    Times a case, taking the best of several repeats to reduce noise.
+    :return: Seconds per iteration.
+    """
+    timer = timeit.Timer(case)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run_benchmarks(repeat: int) -> dict[str, float]:
+    """
+    Runs all cases at every resolution.
+    :return: Mapping of "<case>@<resolution>" to seconds per iteration.
+    """
+    previous_resolution = os.environ.get("RESOLUTION")
+    results: dict[str, float] = {}
+    try:
+        for resolution_minutes in RESOLUTIONS:
+            for name, case in build_cases(resolution_minutes).items():
+                results[f"{name}@{resolution_minutes}"] = time_case(case, repeat)
+    finally:
+        if previous_resolution is None:
+            os.environ.pop("RESOLUTION", None)
+        else:
+            os.environ["RESOLUTION"] = previous_resolution
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    """
+    Compares results with a baseline.
+    :param threshold: Allowed slowdown as a fraction, e.g. 0.25 for 25%.
+    :return: Names of the cases that regressed.
+    """
+    regressions = []
+    for name, seconds in results.items():
+        baseline_seconds = baseline.get(name)
+        if baseline_seconds and seconds > baseline_seconds * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--save", action="store_true", help="Store the results as the baseline.")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="Allowed slowdown, default 0.25 (25%%)."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Repeats per case, default 5.")
+    parser.add_argument(
+        "--baseline", default=None, help="Baseline file, defaults to benchmarks/<machine tag>.json."
+    )
+    args = parser.parse_args()
+    # Per-run log lines would otherwise flood the output and skew the timings
+    logger.setLevel(logging.WARNING)
+
+    baseline_path = args.baseline or os.path.join(BASELINES_DIR, f"{machine_tag()}.json")
+    baseline: dict[str, float] = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, "r") as file:
+            baseline = json.load(file)["results"]
+
+    results = run_benchmarks(args.repeat)
+    regressions = compare(results, baseline, args.threshold)
+
+    print(f"{'case':<42} {'time':>12} {'baseline':>12} {'change':>8}")
+    for name, seconds in results.items():
+        baseline_seconds = baseline.get(name)
+        change = f"{(seconds / baseline_seconds - 1) * 100:+.1f}%" if baseline_seconds else ""
+        baseline_text = f"{baseline_seconds * 1e6:.1f}us" if baseline_seconds else "-"
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<42} {seconds * 1e6:>10.1f}us {baseline_text:>12} {change:>8}{flag}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w") as file:
+            json.dump({"machine": machine_tag(), "results": results}, file, indent=2)
+        print(f"Saved baseline to {baseline_path}")
+    elif regressions:
+        print(f"{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+import time
+from typing import Any
+
+from app_logger import logger
+
+
+def write_atomically(path: str, content: str):
+    """
+    Writes a file through a temporary file replacing it, so readers never see a partial write.
+    Every thread writes its own temporary file, so concurrent writers do not clash.
+    :raises OSError: If the file could not be written.
+    """
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+class FileCache:
+    """A single JSON value persisted to disk, which expires after a time-to-live."""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        """
+        :param path: Path of the JSON file backing the cache.
+        :param ttl_seconds: Age after which the cached value is ignored, 0 never expires.
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+
+    def get(self) -> Any:
+        """
+        Reads the cached value.
+        :return: The cached value, or None if it is missing, unreadable or expired.
+        """
+        try:
+            with open(self.path, "r") as file:
+                entry = json.load(file)
+        except (IOError, ValueError):
+            return None
+
+        age_seconds = time.time() - entry.get("stored_at", 0)
+        if self.ttl_seconds and age_seconds > self.ttl_seconds:
+            logger.debug("Cache %s expired %.0fs after it was stored", self.path, age_seconds)
+            return None
+        return entry.get("value")
+
+    def set(self, value: Any):
+        """
+        Stores a value, replacing the file atomically so readers never see a partial write.
+        :param value: JSON serializable value to store.
+        """
+        try:
+            write_atomically(self.path, json.dumps({"value": value, "stored_at": time.time()}))
+        except IOError as e:
+            logger.warning("Error writing cache %s: %s", self.path, e)
+
+    def invalidate(self):
+        """Removes the cached value."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
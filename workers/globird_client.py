@@ -1,16 +1,23 @@
 import datetime
 import os
-from datetime import timedelta
-from typing import List
-from dateutil import tz
+import threading
 
-from simple_price import SimplePrice, PriceType
+from app_logger import logger
+import metrics
+from simple_price import PRICE_TYPE_CODES, PriceSeries, PriceType
+from slot_grid import SlotGrid
+from tariff_table import TariffTable
+
+DEFAULT_TARIFF_FILE = os.path.join(
+    os.path.dirname(__file__), "tariffs", "globird_zerohero.json"
+)
 
 
 class GlobirdClient:
     """
     A dummy client for Globird Electricity prices.
-    Globird electricity prices are as follows:
+    The tariff schedule is read from the GLOBIRD_TARIFF_FILE (tariffs/globird_zerohero.json
+    by default), which for the ZEROHERO plan is as follows:
      - Buy prices:
         - From 6PM to 8PM: $AU1.50 per kWh
         - From 4PM to 11PM (outside of 6PM to 8PM): $AU0.46 per kWh
@@ -18,68 +25,65 @@ class GlobirdClient:
         - Other times: $AU0.31 per kWh
      - Sell prices:
         - From 6PM to 8PM: $AU0.15 per kWh
-        - From 4PM to 9PM (outside of 6PM to 8PM): $AU0.9 per kWh
+        - From 4PM to 9PM (outside of 6PM to 8PM): $AU0.09 per kWh
         - From 11AM to 2PM: $AU0.0 per kWh
+        - From 10AM to 3PM (outside of 11AM to 2PM): $AU0.01 per kWh
         - Other times: $AU0.05 per kWh
      - Resolution: 30 minutes
     """
 
     def __init__(self):
-        pass
-
-    def _get_buy_price(self, time: datetime.time) -> float:
-        if datetime.time(18, 0) <= time < datetime.time(20, 0):
-            return 1.50
-        elif datetime.time(16, 0) <= time < datetime.time(23, 0):
-            return 0.46
-        elif datetime.time(11, 0) <= time < datetime.time(14, 0):
-            return 0.0
-        else:
-            return 0.31
+        self._tariff_file = os.environ.get("GLOBIRD_TARIFF_FILE", DEFAULT_TARIFF_FILE)
+        self._tariff_mtime: float | None = None
+        self._tariff: TariffTable | None = None
+        # Generated prices per (date, resolution), dropped when the tariff file changes
+        self._prices_cache: dict[tuple[datetime.date, int], PriceSeries] = {}
+        # One client is shared by the updaters of all sites, which fetch prices concurrently
+        self._lock = threading.Lock()
 
-    def _get_sell_price(self, time: datetime.time) -> float:
-        if datetime.time(18, 0) <= time < datetime.time(20, 0):
-            return 0.15
-        elif datetime.time(16, 0) <= time < datetime.time(21, 0):
-            return 0.09
-        elif datetime.time(11, 0) <= time < datetime.time(14, 0):
-            return 0.0
-        elif datetime.time(10, 0) <= time < datetime.time(15, 0):
-            return 0.01
-        else:
-            return 0.05
+    def _get_tariff(self) -> TariffTable:
+        """Returns the compiled tariff, reloading it when the tariff file has changed."""
+        mtime = os.stat(self._tariff_file).st_mtime
+        if self._tariff is None or mtime != self._tariff_mtime:
+            logger.info("Loading Globird tariff from %s", self._tariff_file)
+            self._tariff = TariffTable.load(self._tariff_file)
+            self._tariff_mtime = mtime
+            self._prices_cache.clear()
+        return self._tariff
 
-    def get_prices(self) -> List[SimplePrice]:
+    def get_prices(self) -> PriceSeries:
         """
         Simulates prices from the Globird for the specified time range.
         This method generates prices for a full day (00:00 to 23:55) based on the
         Globird pricing rules, with a resolution determined by the RESOLUTION
         environment variable (defaulting to 5 minutes).
         """
-        prices: List[SimplePrice] = []
         today = datetime.date.today()
+        grid = SlotGrid.from_env()
 
-        resolution_minutes = int(os.environ.get("RESOLUTION", 5))
-        if resolution_minutes not in [5, 30]:
-            raise ValueError("RESOLUTION must be 5 or 30 minutes.")
+        with self._lock:
+            tariff = self._get_tariff()
+            cache_key = (today, grid.resolution_minutes)
+            if cache_key not in self._prices_cache:
+                # Only today's prices are ever requested again, drop previous days
+                self._prices_cache = {
+                    key: prices for key, prices in self._prices_cache.items() if key[0] == today
+                }
+                with metrics.timed("globird_generation"):
+                    self._prices_cache[cache_key] = self._generate_prices(tariff, today, grid)
+            # The series is shared between calls and sites, callers must not modify it
+            return self._prices_cache[cache_key]
 
-        current_time = datetime.datetime.combine(
-            today, datetime.time(0, 0, tzinfo=tz.tzlocal())
+    def _generate_prices(
+        self, tariff: TariffTable, day: datetime.date, grid: SlotGrid
+    ) -> PriceSeries:
+        """Generates the prices of every slot of the given day from the compiled tariff."""
+        start_minutes = grid.start_minutes()
+        return PriceSeries(
+            start_epoch=grid.midnight(day).timestamp(),
+            period_seconds=grid.period_seconds,
+            buy=[tariff.buy_price(minute_of_day) for minute_of_day in start_minutes],
+            sell=[tariff.sell_price(minute_of_day) for minute_of_day in start_minutes],
+            price_type_codes=[PRICE_TYPE_CODES[PriceType.ACTUAL]] * grid.slot_count,
+            tzinfo=grid.tzinfo,
         )
-        end_time = datetime.datetime.combine(today, datetime.time(23, 55, tzinfo=tz.tzlocal()))
-
-        while current_time <= end_time:
-            buy_price = self._get_buy_price(current_time.time())
-            sell_price = self._get_sell_price(current_time.time())
-            prices.append(
-                SimplePrice(
-                    start_time=current_time,
-                    period=timedelta(minutes=resolution_minutes),
-                    buy_per_kwh=buy_price,
-                    sell_per_kwh=sell_price,
-                    price_type=PriceType.ACTUAL,
-                )
-            )
-            current_time += timedelta(minutes=resolution_minutes)
-
-        return prices
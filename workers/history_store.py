@@ -0,0 +1,206 @@
+import datetime
+import sqlite3
+import threading
+import time
+from typing import List
+
+from app_logger import logger
+from simple_price import MISSING_PRICE_TYPE_CODE, PRICE_TYPES, PriceSeries, SimplePrice
+
+# Kinds of price series recorded by every run
+AMBER_FORECAST = "amber_forecast"
+DECISION = "decision"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    kind TEXT NOT NULL,
+    site TEXT NOT NULL,
+    start_ts INTEGER NOT NULL,
+    recorded_ts INTEGER NOT NULL,
+    period INTEGER NOT NULL,
+    buy REAL NOT NULL,
+    sell REAL NOT NULL,
+    price_type INTEGER NOT NULL,
+    PRIMARY KEY (kind, site, start_ts, recorded_ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tariffs (
+    site TEXT NOT NULL,
+    recorded_ts INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    pushed INTEGER NOT NULL,
+    PRIMARY KEY (site, recorded_ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tariff_contents (
+    hash TEXT PRIMARY KEY,
+    content BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class HistoryStore:
+    """
+    Local history of the fetched forecasts, merged prices and pushed tariffs, in SQLite.
+
+    Prices are keyed by (kind, site, interval start, recording time), so every revision of a
+    forecast is kept and range queries by site and time are served by the primary key.
+    Tariff contents are stored once per distinct hash.
+    """
+
+    def __init__(self, path: str, retention_days: float = 400, compact_after_days: float = 7):
+        """
+        :param path: Path of the SQLite database.
+        :param retention_days: Age after which recorded intervals are deleted, 0 keeps them forever.
+        :param compact_after_days: Age after which only the last revision of each interval is kept.
+        """
+        self.path = path
+        self.retention_days = retention_days
+        self.compact_after_days = compact_after_days
+        # The connection is shared by the threads of the updater, one statement at a time
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            # WAL keeps readers (e.g. a backtest) from blocking the writes of a run
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        """Closes the database."""
+        with self._lock:
+            self._connection.close()
+
+    def record_prices(self, kind: str, site: str, prices: PriceSeries, recorded_at: float | None = None):
+        """
+        Records a price series in a single transaction. Entries without a price are skipped.
+        :param kind: AMBER_FORECAST or DECISION.
+        :param site: Site the prices belong to.
+        :param prices: Prices to record.
+        :param recorded_at: Unix time of the recording, defaults to now.
+        """
+        recorded_ts = round(recorded_at if recorded_at is not None else time.time())
+        rows = [
+            (kind, site, round(start_epoch), recorded_ts, prices.period_seconds, buy, sell, code)
+            for start_epoch, buy, sell, code in zip(
+                prices.start_epochs(), prices.buy, prices.sell, prices.price_type_codes
+            )
+            if code != MISSING_PRICE_TYPE_CODE
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def record_tariff(
+        self, site: str, tariff_hash: str, content: bytes, pushed: bool, recorded_at: float | None = None
+    ):
+        """
+        Records a tariff built by a run.
+        :param site: Site the tariff was built for.
+        :param tariff_hash: Content hash of the tariff, see TeslaClient.tariff_hash().
+        :param content: Serialized tariff, only stored the first time its hash is seen.
+        :param pushed: Whether the tariff was pushed to Tesla.
+        :param recorded_at: Unix time of the recording, defaults to now.
+        """
+        recorded_ts = round(recorded_at if recorded_at is not None else time.time())
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO tariff_contents VALUES (?, ?)", (tariff_hash, content)
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO tariffs VALUES (?, ?, ?, ?)",
+                (site, recorded_ts, tariff_hash, int(pushed)),
+            )
+
+    def get_prices(
+        self, kind: str, site: str, start: datetime.datetime, end: datetime.datetime
+    ) -> PriceSeries:
+        """
+        Returns the last recorded revision of every interval starting in a time range.
+        :param kind: AMBER_FORECAST or DECISION.
+        :param site: Site the prices belong to.
+        :param start: Start of the range, inclusive.
+        :param end: End of the range, exclusive.
+        """
+        with self._lock:
+            # With MAX(), SQLite takes the other columns from the row holding the maximum
+            rows = self._connection.execute(
+                "SELECT start_ts, period, buy, sell, price_type, MAX(recorded_ts) FROM prices "
+                "WHERE kind = ? AND site = ? AND start_ts >= ? AND start_ts < ? "
+                "GROUP BY start_ts ORDER BY start_ts",
+                (kind, site, start.timestamp(), end.timestamp()),
+            ).fetchall()
+        return PriceSeries.from_prices(
+            SimplePrice(
+                start_time=datetime.datetime.fromtimestamp(start_ts, tz=start.tzinfo),
+                period=datetime.timedelta(seconds=period),
+                buy_per_kwh=buy,
+                sell_per_kwh=sell,
+                price_type=PRICE_TYPES[price_type],
+            )
+            for start_ts, period, buy, sell, price_type, _ in rows
+        )
+
+    def get_tariffs(
+        self, site: str, start: datetime.datetime, end: datetime.datetime, pushed_only: bool = False
+    ) -> List[tuple]:
+        """
+        Returns the tariffs recorded in a time range.
+        :param site: Site the tariffs were built for.
+        :param start: Start of the range, inclusive.
+        :param end: End of the range, exclusive.
+        :param pushed_only: Only return the tariffs that were pushed to Tesla.
+        :return: List of (recorded Unix time, hash, pushed, serialized tariff), oldest first.
+        """
+        with self._lock:
+            return [
+                (recorded_ts, tariff_hash, bool(pushed), content)
+                for recorded_ts, tariff_hash, pushed, content in self._connection.execute(
+                    "SELECT t.recorded_ts, t.hash, t.pushed, c.content FROM tariffs t "
+                    "JOIN tariff_contents c ON c.hash = t.hash "
+                    "WHERE t.site = ? AND t.recorded_ts >= ? AND t.recorded_ts < ? "
+                    "AND t.pushed >= ? ORDER BY t.recorded_ts",
+                    (site, start.timestamp(), end.timestamp(), int(pushed_only)),
+                )
+            ]
+
+    def compact(self, now: float | None = None):
+        """
+        Deletes the data older than the retention, and keeps only the last revision of the
+        intervals older than compact_after_days.
+        :param now: Current Unix time, defaults to now.
+        """
+        now = now if now is not None else time.time()
+        compact_before = now - self.compact_after_days * 86400
+        with self._lock, self._connection:
+            if self.retention_days:
+                retain_after = now - self.retention_days * 86400
+                self._connection.execute("DELETE FROM prices WHERE start_ts < ?", (retain_after,))
+                self._connection.execute("DELETE FROM tariffs WHERE recorded_ts < ?", (retain_after,))
+                self._connection.execute(
+                    "DELETE FROM tariff_contents WHERE hash NOT IN (SELECT hash FROM tariffs)"
+                )
+            self._connection.execute(
+                "DELETE FROM prices WHERE start_ts < ? AND recorded_ts < ("
+                "SELECT MAX(latest.recorded_ts) FROM prices latest WHERE latest.kind = prices.kind "
+                "AND latest.site = prices.site AND latest.start_ts = prices.start_ts)",
+                (compact_before,),
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('compacted_at', ?)", (now,)
+            )
+        with self._lock:
+            self._connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def compact_if_due(self, interval_seconds: float = 86400):
+        """Compacts the history when it was last compacted more than an interval ago."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM meta WHERE key = 'compacted_at'"
+            ).fetchone()
+        if row is None or time.time() - row[0] >= interval_seconds:
+            logger.info("Compacting history %s", self.path)
+            self.compact()
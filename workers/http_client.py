@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import contextvars
+import math
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from app_logger import logger
+import metrics
+from rate_limiter import RateLimiter, parse_retry_after
+
+if TYPE_CHECKING:
+    import requests
+
+# Status codes worth retrying, the request may succeed if sent again
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+# Monotonic time at which the requests of the current thread give up, see deadline()
+_deadline = contextvars.ContextVar("http_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Gives up the requests made within the block, in the current thread, once the seconds have
+    passed. Their timeouts are shortened to the time left and they are not retried past it, so
+    a caller that stopped waiting does not leave a thread blocked on the request.
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> float:
+    """Returns the seconds left before the deadline of the current thread, inf without one."""
+    expires_at = _deadline.get()
+    return math.inf if expires_at is None else expires_at - time.monotonic()
+
+
+def bounded_timeout(timeout: tuple[float, float]) -> tuple[float, float]:
+    """
+    Shortens (connect, read) timeouts to the time left before the deadline of the current thread.
+    :raises requests.exceptions.Timeout: If the deadline has passed.
+    """
+    remaining = time_left()
+    if remaining <= 0:
+        import requests
+
+        raise requests.exceptions.Timeout("The deadline of the request has passed")
+    return tuple(min(seconds, remaining) for seconds in timeout)
+
+
+class HttpClient:
+    """
+    A pooled keep-alive HTTP session with per-endpoint timeouts and bounded retries.
+
+    Endpoints are short names (e.g. "token", "products") used to pick the timeouts, the rate
+    limits and to group the recorded latencies. Only requests flagged as idempotent are retried,
+    after errors and after a 429 once the provider allows it. Requests made within deadline()
+    give up when it passes.
+    """
+
+    def __init__(
+        self,
+        timeouts: dict[str, tuple[float, float]] | None = None,
+        max_retries: int | None = None,
+        backoff_seconds: float | None = None,
+        pool_maxsize: int = 10,
+        rate_limiter: RateLimiter | None = None,
+    ):
+        """
+        :param timeouts: (connect, read) timeouts in seconds per endpoint.
+        :param max_retries: Retries of idempotent requests, defaults to HTTP_MAX_RETRIES or 3.
+        :param backoff_seconds: Base of the exponential backoff, defaults to HTTP_BACKOFF_SECONDS or 0.5.
+        :param pool_maxsize: Connections kept alive per host.
+        :param rate_limiter: Limiter every request waits for, None to not limit the requests.
+        """
+        default_timeout = (
+            float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", 5)),
+            float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", 30)),
+        )
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_retries = (
+            max_retries if max_retries is not None else int(os.getenv("HTTP_MAX_RETRIES", 3))
+        )
+        self.backoff_seconds = (
+            backoff_seconds
+            if backoff_seconds is not None
+            else float(os.getenv("HTTP_BACKOFF_SECONDS", 0.5))
+        )
+        self.latencies: dict[str, deque] = {}
+        self.rate_limiter = rate_limiter
+        self._pool_maxsize = pool_maxsize
+        self._session: requests.Session | None = None
+
+    @property
+    def session(self) -> requests.Session:
+        """The keep-alive session, requests is imported when the first request is sent."""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self._session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4, pool_maxsize=self._pool_maxsize, max_retries=0
+            )
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+        return self._session
+
+    def request(
+        self, endpoint: str, method: str, url: str, idempotent: bool = False, **kwargs
+    ) -> requests.Response:
+        """
+        Sends a request, retrying idempotent ones on connection errors and 5xx responses, and
+        after the Retry-After of a 429.
+        :param endpoint: Short endpoint name used for timeouts and latency records.
+        :param method: HTTP method.
+        :param url: URL to request.
+        :param idempotent: Whether the request can safely be sent more than once.
+        :return: The last response received.
+        :raises requests.exceptions.RequestException: If the request ultimately fails.
+        """
+        import requests
+
+        timeout = kwargs.pop("timeout", self.timeouts.get(endpoint, self.default_timeout))
+        attempts = 1 + self.max_retries
+
+        for attempt in range(1, attempts + 1):
+            if self.rate_limiter is not None:
+                try:
+                    self.rate_limiter.acquire(endpoint, timeout=time_left())
+                except TimeoutError as e:
+                    raise requests.exceptions.Timeout(str(e)) from e
+            started = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method, url, timeout=bounded_timeout(timeout), **kwargs
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.record_latency(endpoint, time.perf_counter() - started)
+                if not idempotent or attempt == attempts:
+                    raise
+                logger.warning("%s request failed (%s), retrying", endpoint, e)
+                delay = self._backoff_delay(attempt)
+            else:
+                self.record_latency(endpoint, time.perf_counter() - started)
+                if response.status_code == 429:
+                    metrics.rate_limited_total.inc(endpoint=endpoint)
+                    delay = parse_retry_after(
+                        response.headers.get("Retry-After"), self._backoff_delay(attempt)
+                    )
+                    if self.rate_limiter is not None:
+                        # Holds back every request to the endpoint, this one included
+                        self.rate_limiter.block(endpoint, delay)
+                    # A proxy may answer 429 after the request was processed, e.g. after a
+                    # refresh token was rotated, so only idempotent requests are sent again
+                    if not idempotent or attempt == attempts:
+                        return response
+                    logger.warning(
+                        "%s request was rate limited, retrying in %.1fs", endpoint, delay
+                    )
+                    if self.rate_limiter is not None:
+                        delay = 0
+                elif (
+                    idempotent
+                    and response.status_code in RETRY_STATUS_CODES
+                    and attempt < attempts
+                ):
+                    logger.warning("%s request returned %s, retrying", endpoint, response.status_code)
+                    delay = self._backoff_delay(attempt)
+                else:
+                    return response
+            if delay:
+                # Past the deadline, the next attempt raises a Timeout instead of being sent
+                time.sleep(max(0.0, min(delay, time_left())))
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Returns an exponential backoff with full jitter, in seconds."""
+        return random.uniform(0, self.backoff_seconds * 2 ** (attempt - 1))
+
+    def get(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """Sends a GET request, which is always retried as it is idempotent."""
+        return self.request(endpoint, "GET", url, idempotent=True, **kwargs)
+
+    def post(self, endpoint: str, url: str, idempotent: bool = False, **kwargs) -> requests.Response:
+        """Sends a POST request, only retried when flagged as idempotent."""
+        return self.request(endpoint, "POST", url, idempotent=idempotent, **kwargs)
+
+    def record_latency(self, endpoint: str, seconds: float):
+        """
+        Records the latency of one request.
+        :param endpoint: Short endpoint name.
+        :param seconds: Duration of the request.
+        """
+        self.latencies.setdefault(endpoint, deque(maxlen=100)).append(seconds)
+        metrics.http_request_duration_seconds.observe(seconds, endpoint=endpoint)
+        logger.debug("%s request took %.0fms", endpoint, seconds * 1000)
+
+    def close(self):
+        """Closes the pooled connections."""
+        if self._session is not None:
+            self._session.close()
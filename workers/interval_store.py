@@ -0,0 +1,111 @@
+import datetime
+import json
+from typing import Iterable
+
+from app_logger import logger
+from file_cache import write_atomically
+from simple_price import PriceSeries
+
+
+class IntervalStore:
+    """
+    Price intervals of one site keyed by their start time, persisted to a JSON file.
+
+    Fetched intervals are merged in, replacing the stored intervals they overlap, so a fetch
+    only needs the intervals that are new or still being revised. The time of the last full
+    fetch is kept with them, so that the client knows when the whole forecast is due again.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the JSON file backing the store.
+        """
+        self.path = path
+        self.site_id: str | None = None
+        # Unix time of the last fetch of the whole forecast, 0 if there was none
+        self.full_fetch_epoch = 0.0
+        # Start Unix time -> (period seconds, buy per kWh, sell per kWh, PRICE_TYPE_CODES code)
+        self.intervals: dict[int, tuple[int, float, float, int]] = {}
+        self._load()
+
+    def _load(self):
+        """Reads the stored intervals, starting empty if the file is missing or unreadable."""
+        try:
+            with open(self.path, "r") as file:
+                content = json.load(file)
+            self.site_id = content["site_id"]
+            self.full_fetch_epoch = float(content["full_fetch_epoch"])
+            self.intervals = {
+                int(start_epoch): tuple(interval)
+                for start_epoch, interval in content["intervals"].items()
+            }
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring unreadable interval store %s: %s", self.path, e)
+            self.site_id = None
+            self.full_fetch_epoch = 0.0
+            self.intervals = {}
+
+    def save(self):
+        """Writes the intervals, replacing the file atomically."""
+        content = {
+            "site_id": self.site_id,
+            "full_fetch_epoch": self.full_fetch_epoch,
+            "intervals": self.intervals,
+        }
+        try:
+            write_atomically(self.path, json.dumps(content))
+        except OSError as e:
+            logger.warning("Error writing interval store %s: %s", self.path, e)
+
+    def merge(
+        self, site_id: str, intervals: Iterable[tuple], full_fetch_epoch: float | None = None
+    ):
+        """
+        Merges fetched intervals in. They cover a contiguous time range, and replace every
+        stored interval overlapping it, e.g. a 30 minute interval now forecast as 5 minute ones.
+        Intervals stored for another site are dropped first.
+        :param site_id: Site the intervals belong to.
+        :param intervals: (start Unix time, period seconds, buy per kWh, sell per kWh,
+            PRICE_TYPE_CODES code) of each interval, as parsed by AmberClient.
+        :param full_fetch_epoch: Unix time of the fetch if it covered the whole forecast.
+        """
+        intervals = list(intervals)
+        if site_id != self.site_id:
+            self.site_id = site_id
+            self.full_fetch_epoch = 0.0
+            self.intervals = {}
+        if full_fetch_epoch is not None:
+            self.full_fetch_epoch = full_fetch_epoch
+        if not intervals:
+            return
+
+        fetched_start = min(interval[0] for interval in intervals)
+        fetched_end = max(interval[0] + interval[1] for interval in intervals)
+        self.intervals = {
+            start_epoch: interval
+            for start_epoch, interval in self.intervals.items()
+            if start_epoch >= fetched_end or start_epoch + interval[0] <= fetched_start
+        }
+        for start_epoch, *interval in intervals:
+            self.intervals[start_epoch] = tuple(interval)
+
+    def prune(self, now: datetime.datetime):
+        """Drops the intervals that ended before now, which can no longer be revised."""
+        now_epoch = now.timestamp()
+        self.intervals = {
+            start_epoch: interval
+            for start_epoch, interval in self.intervals.items()
+            if start_epoch + interval[0] > now_epoch
+        }
+
+    def to_price_series(self, tzinfo: datetime.tzinfo) -> PriceSeries:
+        """
+        Returns the stored intervals as a price series.
+        :param tzinfo: Timezone of the start times of the series.
+        """
+        return PriceSeries.from_intervals(
+            ((start_epoch, *interval) for start_epoch, interval in sorted(self.intervals.items())),
+            tzinfo,
+        )
@@ -0,0 +1,36 @@
+"""
+The JSON methods of dataclasses_json, with dataclasses_json imported on their first call.
+
+The @dataclass_json decorator imports dataclasses_json, and with it marshmallow, as soon as
+a class is defined. Runs serializing with tou_serializer never call these methods, so
+subclassing LazyDataClassJsonMixin instead keeps that import off the worker's cold start.
+"""
+
+
+def _api():
+    """Imports dataclasses_json on first use."""
+    from dataclasses_json import api
+
+    return api
+
+
+class LazyDataClassJsonMixin:
+    """to_dict(), to_json(), from_dict(), from_json() and schema() as in dataclasses_json."""
+
+    def to_dict(self, encode_json=False) -> dict:
+        return _api().DataClassJsonMixin.to_dict(self, encode_json=encode_json)
+
+    def to_json(self, **kwargs) -> str:
+        return _api().DataClassJsonMixin.to_json(self, **kwargs)
+
+    @classmethod
+    def from_dict(cls, kvs: dict, *, infer_missing=False):
+        return _api().DataClassJsonMixin.from_dict.__func__(cls, kvs, infer_missing=infer_missing)
+
+    @classmethod
+    def from_json(cls, s, **kwargs):
+        return _api().DataClassJsonMixin.from_json.__func__(cls, s, **kwargs)
+
+    @classmethod
+    def schema(cls, **kwargs):
+        return _api().DataClassJsonMixin.schema.__func__(cls, **kwargs)
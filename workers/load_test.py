@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Load test of the price updater against the stand-in providers of servers/fake_providers.py.
+
+Starts the fake Tesla and Amber server, builds a roster of N synthetic sites and runs the
+multi-site updater against it for a number of rounds. Reports the throughput of site updates,
+the latency percentiles of the site updates and of every endpoint, and the memory used.
+
+    python workers/load_test.py --sites 50 --rounds 5 --latency-ms 50 --rate-limit-rate 0.01
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from typing import Callable, List
+
+from app_logger import logger
+
+FAKE_SERVER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, "servers", "fake_providers.py"
+)
+# Far above the production limits, so that the updater itself is measured
+LOAD_TEST_RATE_LIMITS = ",".join(
+    f"{endpoint}=60000/100"
+    for endpoint in ("token", "products", "time_of_use_settings", "amber_sites", "amber_prices")
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_server(port: int, args) -> subprocess.Popen:
+    """Starts servers/fake_providers.py and waits until it answers."""
+    env = dict(
+        os.environ,
+        FAKE_LATENCY_MS=str(args.latency_ms),
+        FAKE_ERROR_RATE=str(args.error_rate),
+        FAKE_RATE_LIMIT_RATE=str(args.rate_limit_rate),
+        FAKE_RETRY_AFTER_SECONDS=str(args.retry_after),
+    )
+    process = subprocess.Popen(
+        [sys.executable, FAKE_SERVER, "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=1)
+            return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("The fake providers server did not start")
+
+
+def write_roster(work_dir: str, site_count: int) -> str:
+    """
+    Writes a roster of synthetic sites, each with its own Tesla and Amber account.
+    :return: Path of the roster file.
+    """
+    sites = []
+    for index in range(site_count):
+        name = f"site{index:04d}"
+        token_file = os.path.join(work_dir, f"{name}_refresh_token.txt")
+        with open(token_file, "w") as file:
+            file.write(f"refresh-{name}")
+        sites.append(
+            {
+                "name": name,
+                "tesla_refresh_token_file": token_file,
+                "amber_api_token": f"amber-{name}",
+            }
+        )
+    roster_path = os.path.join(work_dir, "sites.json")
+    with open(roster_path, "w") as file:
+        json.dump(sites, file)
+    return roster_path
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Returns the nearest-rank percentile of the values, e.g. 0.99 for p99."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def timed_run(
+    run: Callable[[], None], durations: List[float], failures: List[BaseException]
+) -> Callable[[], None]:
+    """Wraps the run of a site to record how long each run took and whether it failed."""
+
+    def wrapper():
+        started = time.perf_counter()
+        try:
+            run()
+        except Exception as e:
+            failures.append(e)
+            raise
+        finally:
+            durations.append(time.perf_counter() - started)
+
+    return wrapper
+
+
+def format_latencies(name: str, seconds: List[float]) -> str:
+    return (
+        f"{name:<24} {len(seconds):>7} "
+        + " ".join(
+            f"{percentile(seconds, fraction) * 1000:>8.1f}" for fraction in (0.5, 0.9, 0.99, 1.0)
+        )
+    )
+
+
+def run_load_test(args, work_dir: str):
+    """
+    Runs the load test with the state of the sites in the work directory.
+    :param args: Parsed command line arguments, see main().
+    """
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        port = free_port()
+        server = start_fake_server(port, args)
+        base_url = f"http://127.0.0.1:{port}"
+
+    os.environ.update(
+        {
+            "TESLA_API_BASE_URL": base_url,
+            "TESLA_TOKEN_URL": f"{base_url}/oauth2/v3/token",
+            "AMBER_API_BASE_URL": f"{base_url}/v1",
+            "TESLA_CLIENT_ID": "load-test",
+            "TESLA_CLIENT_SECRET": "load-test",
+            "AUTH_DIR": work_dir,
+            "METRICS_DIR": os.path.join(work_dir, "metrics"),
+            "SITES_FILE": write_roster(work_dir, args.sites),
+            "MAX_SITE_WORKERS": str(args.workers),
+            "RATE_LIMITS": args.rate_limits,
+            "HTTP_BACKOFF_SECONDS": "0.1",
+        }
+    )
+    # Imported once the environment points at the fake server
+    from price_updater import build_updater
+
+    try:
+        if args.tracemalloc:
+            tracemalloc.start()
+        updater = build_updater(None)
+        durations: List[float] = []
+        failures: List[BaseException] = []
+        for site_updater in updater.updaters:
+            site_updater.run = timed_run(site_updater.run, durations, failures)
+
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            if args.force_push:
+                for state_file in glob.glob(os.path.join(work_dir, "tesla_tariff_state_*.json")):
+                    os.remove(state_file)
+            try:
+                updater.run()
+            except RuntimeError:
+                # Failed sites are counted by timed_run
+                pass
+        elapsed = time.perf_counter() - started
+
+        site_runs = args.sites * args.rounds
+        print(
+            f"{site_runs} site updates ({args.sites} sites x {args.rounds} rounds, "
+            f"{args.workers} workers) in {elapsed:.2f}s: {site_runs / elapsed:.1f} updates/s, "
+            f"{len(failures)} failed"
+        )
+        print(f"{'latency (ms)':<24} {'count':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+        print(format_latencies("site update", durations))
+        endpoint_latencies: dict[str, List[float]] = {}
+        for site_updater in updater.updaters:
+            for client in (site_updater.tesla_client, site_updater.amber_client):
+                for endpoint, latencies in client._http.latencies.items():
+                    endpoint_latencies.setdefault(endpoint, []).extend(latencies)
+        for endpoint, latencies in sorted(endpoint_latencies.items()):
+            print(format_latencies(endpoint, latencies))
+
+        # ru_maxrss is in KiB on Linux
+        print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}MiB")
+        if args.tracemalloc:
+            _, peak = tracemalloc.get_traced_memory()
+            print(f"Peak Python allocations: {peak / 2**20:.1f}MiB")
+        with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as response:
+            print("Fake server responses:")
+            for key, count in sorted(json.load(response).items()):
+                print(f"  {key}: {count}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sites", type=int, default=20, help="Number of sites, default 20.")
+    parser.add_argument("--rounds", type=int, default=3, help="Update rounds, default 3.")
+    parser.add_argument("--workers", type=int, default=4, help="MAX_SITE_WORKERS, default 4.")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Mean fake latency, default 20ms.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 503 responses.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of 429 responses.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of 429s, default 1s.")
+    parser.add_argument(
+        "--rate-limits",
+        default=LOAD_TEST_RATE_LIMITS,
+        help="RATE_LIMITS of the updater, defaults to limits too high to be reached.",
+    )
+    parser.add_argument(
+        "--force-push", action="store_true", help="Push the tariff of every site on every round."
+    )
+    parser.add_argument(
+        "--tracemalloc", action="store_true", help="Also trace the peak of Python allocations."
+    )
+    parser.add_argument("--url", help="Use an already running fake server instead of starting one.")
+    args = parser.parse_args()
+    logger.setLevel(logging.WARNING)
+
+    # Holds the roster, tokens and state files of the sites, removed once the test is done
+    with tempfile.TemporaryDirectory(prefix="load-test-") as work_dir:
+        run_load_test(args, work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Minimal in-process metrics, exported in the Prometheus text format.
+
+The worker runs in its own process, so the metrics are written to a textfile in METRICS_DIR
+after every run, from where the OAuth server serves them on /metrics.
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from app_logger import logger
+from file_cache import write_atomically
+
+# Default histogram buckets in seconds, from fast local stages up to slow API calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(label_names: tuple, label_values: tuple, extra: str = "") -> str:
+    labels = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    """A monotonically increasing count, per combination of label values."""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        """Increments the count of the given label values."""
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """Returns the count of the given label values."""
+        return self._values.get(tuple(str(labels[name]) for name in self.label_names), 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """A distribution of observed values in cumulative buckets, per combination of label values."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label values: [bucket counts..., sum, count]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        """Records one observation for the given label values."""
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels) -> int:
+        """Returns the number of observations of the given label values."""
+        state = self._values.get(tuple(str(labels[name]) for name in self.label_names))
+        return state[-1] if state else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for upper_bound, bucket_count in zip(self.buckets, state):
+                    bound = "+Inf" if upper_bound == math.inf else repr(upper_bound)
+                    labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {state[-2]}")
+                lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+stage_duration_seconds = Histogram(
+    "price_updater_stage_duration_seconds",
+    "Duration of each stage of a price update run.",
+    label_names=("stage",),
+)
+http_request_duration_seconds = Histogram(
+    "price_updater_http_request_duration_seconds",
+    "Duration of HTTP requests to the provider APIs, per endpoint.",
+    label_names=("endpoint",),
+)
+spikes_detected_total = Counter(
+    "price_updater_spikes_detected_total",
+    "Slots where the Amber sell price exceeded the sell threshold.",
+)
+pushes_skipped_total = Counter(
+    "price_updater_pushes_skipped_total",
+    "Tesla updates skipped because the tariff was unchanged.",
+)
+api_errors_total = Counter(
+    "price_updater_api_errors_total",
+    "Errors returned by, or raised while calling, the provider APIs.",
+    label_names=("api",),
+)
+rate_limited_total = Counter(
+    "price_updater_rate_limited_total",
+    "Requests rejected by the provider APIs with 429, per endpoint.",
+    label_names=("endpoint",),
+)
+runs_total = Counter(
+    "price_updater_runs_total",
+    "Price update runs, by outcome.",
+    label_names=("outcome",),
+)
+watch_polls_total = Counter(
+    "price_updater_watch_polls_total",
+    "Amber forecast polls of the watch mode.",
+)
+watch_rebuilds_total = Counter(
+    "price_updater_watch_rebuilds_total",
+    "Tariff rebuilds triggered by the watch mode, by reason.",
+    label_names=("reason",),
+)
+
+REGISTRY = (
+    stage_duration_seconds,
+    http_request_duration_seconds,
+    spikes_detected_total,
+    pushes_skipped_total,
+    api_errors_total,
+    rate_limited_total,
+    runs_total,
+    watch_polls_total,
+    watch_rebuilds_total,
+)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Times the enclosed block into the stage duration histogram.
+    :param stage: Name of the stage, e.g. "amber_fetch".
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration_seconds.observe(time.perf_counter() - started, stage=stage)
+
+
+def render() -> str:
+    """Renders all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str | None = None):
+    """
+    Writes all metrics to a textfile, replacing it atomically.
+    :param path: Defaults to METRICS_DIR/price_updater.prom.
+    """
+    if path is None:
+        metrics_dir = os.environ.get("METRICS_DIR", "/app/metrics")
+        path = os.path.join(metrics_dir, "price_updater.prom")
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Sites run concurrently, each writing through its own temporary file
+        write_atomically(path, render())
+    except OSError as e:
+        logger.warning("Error writing metrics to %s: %s", path, e)
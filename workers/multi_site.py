@@ -0,0 +1,81 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List
+
+from app_logger import logger
+
+
+@dataclass
+class SiteConfig:
+    """One Powerwall site of the roster, with its own Amber site and Tesla account."""
+
+    name: str
+    tesla_refresh_token_file: str
+    amber_site_id: str | None = None
+    amber_api_token: str | None = None
+    tesla_energy_site_id: str | None = None
+    sell_threshold: float | None = None
+
+
+def load_sites(path: str) -> List[SiteConfig]:
+    """
+    Loads the site roster from a JSON file holding a list of sites, e.g.
+        [{"name": "home", "tesla_refresh_token_file": "/app/auth/home_token.txt",
+          "amber_site_id": "01ABC", "sell_threshold": 1.5}]
+    :param path: Path of the roster file.
+    :raises ValueError: If the roster is empty, a site is invalid or names are repeated.
+    """
+    with open(path, "r") as file:
+        raw_sites = json.load(file)
+    if not isinstance(raw_sites, list) or not raw_sites:
+        raise ValueError(f"Site roster {path} must be a non-empty list of sites.")
+
+    sites = []
+    for raw_site in raw_sites:
+        try:
+            sites.append(SiteConfig(**raw_site))
+        except TypeError as e:
+            raise ValueError(f"Invalid site {raw_site.get('name')!r} in {path}: {e}")
+    names = [site.name for site in sites]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Site names must be unique in {path}.")
+    return sites
+
+
+class MultiSiteUpdater:
+    """
+    Runs the updaters of several sites concurrently, in a bounded pool of threads.
+    A failing site is logged and never stops the other sites.
+    """
+
+    def __init__(self, updaters: list, max_workers: int = 4):
+        """
+        :param updaters: One PowerwallPriceUpdater per site.
+        :param max_workers: Sites updated at the same time.
+        """
+        self.updaters = updaters
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="site"
+        )
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """The pool of the sites, which the spike watcher polls the sites in as well."""
+        return self._executor
+
+    def run(self):
+        """
+        Runs every site once and waits for all of them.
+        :raises RuntimeError: If any site failed, once all sites have run.
+        """
+        futures = {updater.site: self._executor.submit(updater.run) for updater in self.updaters}
+        failed_sites = []
+        for site, future in futures.items():
+            try:
+                future.result()
+            except Exception:
+                logger.exception("Error updating site %s", site)
+                failed_sites.append(site)
+        if failed_sites:
+            raise RuntimeError(f"Updating sites failed: {', '.join(failed_sites)}")
@@ -1,19 +1,29 @@
 #!/usr/bin/env python3
 """
-TSLA Price Updater - A cron job to update electricity prices every 5 minutes for Tesla Powerwall.
+TSLA Price Updater - A job to update electricity prices every 5 minutes for Tesla Powerwall.
 
 This script fetches electricity prices from Globird and Amber Electric, and updates the Tesla Powerwall
-with the latest prices. It is designed to run as a cron job, updating prices every 5 minutes.
+with the latest prices. It can run once per invocation (e.g. from cron), or with --daemon as a
+long-running process that keeps its clients warm and runs the job on an aligned 5 minute schedule.
 """
 
+import argparse
+from array import array
 import os
-from datetime import datetime, timedelta, date, time
+import sqlite3
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import date
 from typing import List
-from dateutil import tz
+import numpy as np
 from amber_client import AmberClient
 from app_logger import logger
 from globird_client import GlobirdClient
-from simple_price import SimplePrice
+from history_store import AMBER_FORECAST, DECISION, HistoryStore
+import http_client
+import metrics
+from simple_price import PriceSeries, SimplePrice
+from slot_grid import MINUTES_PER_DAY, SlotGrid
 from tesla_tou_settings import (
     TouPeriod,
     TouPeriodContainer,
@@ -25,21 +35,112 @@ from tesla_tou_settings import (
     DemandChargesSeason,
 )
 from tesla_client import TeslaClient
+import tou_serializer
+from multi_site import MultiSiteUpdater, load_sites
+import rate_limiter
+from scheduler import AlignedScheduler
+from spike_strategy import apply_spike_strategy
+from spike_watcher import SpikeWatcher
 
 
 class PowerwallPriceUpdater:
-    def __init__(self, globird_client, amber_client, tesla_client):
+    def __init__(
+        self,
+        globird_client,
+        amber_client,
+        tesla_client,
+        history_store: HistoryStore | None = None,
+        site: str = "default",
+        sell_threshold: float | None = None,
+        executor: ThreadPoolExecutor | None = None,
+    ):
+        """
+        :param history_store: Where every run records its prices and tariff, None to not record.
+        :param site: Name of the site the runs are recorded under.
+        :param sell_threshold: Amber sell price of a spike, defaults to SELL_THRESHOLD or 1.5.
+        :param executor: Pool fetching the price sources, may be shared by the sites.
+        """
         self.globird_client = globird_client
         self.amber_client = amber_client
         self.tesla_client = tesla_client
+        self.history_store = history_store
+        self.site = site
+        self.sell_threshold = sell_threshold
+        # Price sources are independent, so they are fetched concurrently
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="price-source"
+        )
+
+    def _fetch_prices(self, sources: dict) -> dict[str, PriceSeries]:
+        """
+        Fetches prices from all sources concurrently.
+        A source that fails or does not answer within its timeout yields no prices, so a slow
+        or unavailable source degrades the run instead of stalling it. The timeout of a source
+        is <NAME>_TIMEOUT_SECONDS, e.g. AMBER_TIMEOUT_SECONDS, or SOURCE_TIMEOUT_SECONDS.
+        :param sources: Mapping of source name to a callable returning its prices.
+        :return: Mapping of source name to its prices.
+        """
+        default_timeout = float(os.environ.get("SOURCE_TIMEOUT_SECONDS", 30))
+        timeouts = {
+            name: float(os.environ.get(f"{name.upper()}_TIMEOUT_SECONDS", default_timeout))
+            for name in sources
+        }
+        started = time_module.monotonic()
+        futures = {
+            name: self._executor.submit(self._fetch_source, fetch, started + timeouts[name])
+            for name, fetch in sources.items()
+        }
+
+        prices: dict[str, PriceSeries] = {}
+        for name, future in futures.items():
+            try:
+                prices[name] = future.result(
+                    timeout=max(0.0, started + timeouts[name] - time_module.monotonic())
+                )
+            except TimeoutError:
+                logger.warning("No prices received from %s within %ss", name, timeouts[name])
+                # Drops a fetch still queued, a running one gives up at its deadline
+                future.cancel()
+                prices[name] = PriceSeries.empty()
+            except Exception:
+                logger.exception("Error fetching prices from %s", name)
+                prices[name] = PriceSeries.empty()
+        return prices
 
-    def _generate_prices(self):
-        """Generates electricity prices from both Globird and Amber clients."""
-        globird_prices: List[SimplePrice] = self.globird_client.get_prices()
-        amber_prices: List[SimplePrice] = self.amber_client.get_forecast()
+    @staticmethod
+    def _fetch_source(fetch, expires_at: float) -> PriceSeries:
+        """
+        Fetches the prices of a source in a pool worker, with the source's deadline set on its
+        requests, so that a source that timed out frees its worker instead of holding it.
+        :param fetch: Callable returning the prices of the source.
+        :param expires_at: Monotonic time at which the source times out.
+        """
+        with http_client.deadline(expires_at - time_module.monotonic()):
+            return fetch()
+
+    def _fetch_sources(self) -> dict[str, PriceSeries]:
+        """Fetches the prices of both Globird and Amber clients, see _fetch_prices()."""
+        return self._fetch_prices(
+            {
+                "Globird": self.globird_client.get_prices,
+                "Amber": self.amber_client.get_forecast,
+            }
+        )
+
+    def _generate_prices(self, fetched_prices: dict[str, PriceSeries] | None = None):
+        """
+        Generates electricity prices from both Globird and Amber clients.
+        :param fetched_prices: Prices already fetched by _fetch_sources(), fetched when None.
+        """
+        if fetched_prices is None:
+            fetched_prices = self._fetch_sources()
+        globird_prices: PriceSeries = fetched_prices["Globird"]
+        amber_prices: PriceSeries = fetched_prices["Amber"]
 
         logger.info(
-            f"Globird prices: {len(globird_prices)} entries, Amber prices: {len(amber_prices)} entries"
+            "Globird prices: %s entries, Amber prices: %s entries",
+            len(globird_prices),
+            len(amber_prices),
         )
 
         if not globird_prices:
@@ -47,68 +148,154 @@ class PowerwallPriceUpdater:
         if not amber_prices:
             logger.warning("No prices returned from Amber client.")
 
-        globird_prices_map: dict[str, SimplePrice] = {
-            p.start_time_time().strftime("%H%M"): p for p in globird_prices
-        }
-        amber_prices_map: dict[str, SimplePrice] = {
-            p.start_time_time().strftime("%H%M"): p for p in amber_prices
-        }
-        logger.debug(
-            f"---\nGlobird prices: {globird_prices_map}\n---\nAmber prices: {amber_prices_map}\n---"
+        grid = SlotGrid.from_env()
+
+        with metrics.timed("merge"):
+            return self._merge_prices(
+                globird_prices, amber_prices, grid, self._get_sell_threshold()
+            )
+
+    def _get_sell_threshold(self) -> float:
+        """Returns the Amber sell price of a spike, of the site or from SELL_THRESHOLD."""
+        if self.sell_threshold is not None:
+            return self.sell_threshold
+        return float(os.environ.get("SELL_THRESHOLD", 1.5))
+
+    def _push_priority(self, amber_prices: PriceSeries) -> int:
+        """Returns the rate limit priority of the push, spikes go ahead of routine refreshes."""
+        with np.errstate(invalid="ignore"):
+            has_spike = bool(np.any(np.asarray(amber_prices.sell) > self._get_sell_threshold()))
+        return rate_limiter.PRIORITY_SPIKE if has_spike else rate_limiter.PRIORITY_ROUTINE
+
+    @staticmethod
+    def _slot_arrays(prices: PriceSeries | List[SimplePrice], grid: SlotGrid):
+        """
+        Aligns prices into dense NumPy arrays indexed by the slot of the day they start in.
+        :return: Tuple of (buy prices, sell prices, price type codes), see PriceSeries.align_to_slots().
+        """
+        if not isinstance(prices, PriceSeries):
+            prices = PriceSeries.from_prices(prices)
+        buy, sell, price_type_codes = prices.align_to_slots(grid)
+        # Zero-copy views over the contiguous arrays
+        return (
+            np.frombuffer(buy, dtype=np.float64),
+            np.frombuffer(sell, dtype=np.float64),
+            np.frombuffer(price_type_codes, dtype=np.int8),
         )
 
-        prices: List[SimplePrice] = []
-        today = date.today()
-        current_time = time(0, 0, tzinfo=tz.tzlocal())
-        resolution_minutes = int(os.environ.get("RESOLUTION", 5))
-        if resolution_minutes not in [5, 30]:
-            raise ValueError("RESOLUTION must be 5 or 30 minutes.")
-        sell_threshold = float(os.environ.get("SELL_THRESHOLD", 1.5))
-
-        for _ in range(int(24 * 60 / resolution_minutes)):
-            globird_price = globird_prices_map.get(current_time.strftime("%H%M"))
-            amber_price = amber_prices_map.get(current_time.strftime("%H%M"))
-
-            if not globird_price:
-                raise RuntimeError(
-                    f"Globird price not found for time {current_time.isoformat()}"
-                )
+    def _merge_prices(
+        self,
+        globird_prices: PriceSeries | List[SimplePrice],
+        amber_prices: PriceSeries | List[SimplePrice],
+        grid: SlotGrid,
+        sell_threshold: float,
+    ) -> PriceSeries:
+        """
+        Merges Globird prices with Amber spikes, slot by slot, as vector operations.
+        See spike_strategy.apply_spike_strategy(), spike slots take Amber's price type.
+        :return: One price per slot of today, starting at midnight.
+        """
+        globird_buy, globird_sell, globird_types = self._slot_arrays(globird_prices, grid)
+        _, amber_sell, amber_types = self._slot_arrays(amber_prices, grid)
 
-            # Default to Globird sell price
-            final_buy_price = globird_price.buy_per_kwh
-            final_sell_price = globird_price.sell_per_kwh
-
-            if amber_price and amber_price.sell_per_kwh > sell_threshold:
-                final_sell_price = 1
-                final_buy_price += 1
-                # Use Amber's price type if its sell price is used
-                price_type = amber_price.price_type
-                logger.info(
-                    f"Price spike detected at {current_time.strftime("%H%M")}: "
-                )
-            else:
-                # Otherwise use Globird's price type
-                price_type = globird_price.price_type
-
-            prices.append(
-                SimplePrice(
-                    start_time=current_time,
-                    period=timedelta(minutes=resolution_minutes),
-                    buy_per_kwh=final_buy_price,
-                    sell_per_kwh=final_sell_price,
-                    price_type=price_type,
-                )
+        missing_slots = np.flatnonzero(np.isnan(globird_buy))
+        if missing_slots.size:
+            missing_time = grid.to_time(int(missing_slots[0]) * grid.resolution_minutes)
+            raise RuntimeError(f"Globird price not found for time {missing_time.isoformat()}")
+
+        final_buy, final_sell, spikes = apply_spike_strategy(
+            globird_buy, globird_sell, amber_sell, sell_threshold
+        )
+        metrics.spikes_detected_total.inc(int(np.count_nonzero(spikes)))
+        price_types = np.where(spikes, amber_types, globird_types)
+
+        for slot in np.flatnonzero(spikes):
+            logger.info(
+                "Price spike detected at %s",
+                grid.period_name(int(slot) * grid.resolution_minutes),
             )
 
-            current_time = (
-                datetime.combine(today, current_time)
-                + timedelta(minutes=resolution_minutes)
-            ).time()
+        return PriceSeries(
+            start_epoch=grid.midnight(date.today()).timestamp(),
+            period_seconds=grid.period_seconds,
+            buy=array("d", final_buy.tobytes()),
+            sell=array("d", final_sell.tobytes()),
+            price_type_codes=array("b", price_types.astype(np.int8).tobytes()),
+            tzinfo=grid.tzinfo,
+        )
 
-        return prices
+    @staticmethod
+    def _compact_prices(prices: PriceSeries, grid: SlotGrid) -> List[tuple]:
+        """
+        Merges runs of consecutive slots with equal buy and sell prices into single periods.
+        :param prices: Consecutive slot prices.
+        :param grid: Slots the prices are made of.
+        :return: List of (start minute, end minute, buy price, sell price) per merged period,
+            with minutes of the day, where midnight ends a period as 0.
+        """
+        periods: List[list] = []
+        for minute_of_day, buy_per_kwh, sell_per_kwh in zip(
+            prices.minutes_of_day(grid), prices.buy, prices.sell
+        ):
+            end_minute = (minute_of_day + grid.resolution_minutes) % MINUTES_PER_DAY
+            last_period = periods[-1] if periods else None
+            if (
+                last_period
+                and last_period[2] == buy_per_kwh
+                and last_period[3] == sell_per_kwh
+                and last_period[1] == minute_of_day
+            ):
+                last_period[1] = end_minute
+            else:
+                periods.append([minute_of_day, end_minute, buy_per_kwh, sell_per_kwh])
+        return [tuple(period) for period in periods]
+
+    @staticmethod
+    def _expand_rates(
+        tou_periods: dict[str, TouPeriodContainer],
+        rates: dict[str, float],
+        grid: SlotGrid,
+    ) -> dict[int, float]:
+        """
+        Expands merged periods back into one rate per slot, keyed by the slot's minute of the day.
+        :param tou_periods: Periods keyed by name.
+        :param rates: Rates keyed by period name.
+        :param grid: Slots the periods are made of.
+        """
+        expanded_rates: dict[int, float] = {}
+        for name, container in tou_periods.items():
+            for period in container.periods:
+                start = period.fromHour * 60 + period.fromMinute
+                end = period.toHour * 60 + period.toMinute or MINUTES_PER_DAY
+                for minute_of_day in range(start, end, grid.resolution_minutes):
+                    expanded_rates[minute_of_day] = rates[name]
+        return expanded_rates
+
+    def _check_round_trip(
+        self,
+        prices: PriceSeries,
+        tou_periods: dict[str, TouPeriodContainer],
+        buy_rates: dict[str, float],
+        sell_rates: dict[str, float],
+        grid: SlotGrid,
+    ):
+        """
+        Checks that the merged periods expand back to exactly the slot prices they came from.
+        :raises RuntimeError: If merging the periods lost or changed any slot price.
+        """
+        if not len(prices):
+            return
+        minutes_of_day = prices.minutes_of_day(grid)
+        expected_buy_rates = dict(zip(minutes_of_day, prices.buy))
+        expected_sell_rates = dict(zip(minutes_of_day, prices.sell))
+        if (
+            self._expand_rates(tou_periods, buy_rates, grid) != expected_buy_rates
+            or self._expand_rates(tou_periods, sell_rates, grid) != expected_sell_rates
+        ):
+            raise RuntimeError("Merged time of use periods do not match the slot prices")
 
     def _build_time_of_use_settings(
-        self, prices: List[SimplePrice]
+        self, prices: PriceSeries | List[SimplePrice]
     ) -> TimeOfUseSettings:
         """
         Builds the time-of-use settings for the Tesla Powerwall.
@@ -121,41 +308,43 @@ class PowerwallPriceUpdater:
           - seasons: ALL (all year round)
             - fromDay 1 to 31 (all days of the month)
             - tou_periods: from 00:00 to 23:55 use the RESOLUTION environment variable
-              - Use the name format HHMM for each period
+              - Consecutive slots with the same buy and sell prices are merged into one period
+              - Use the name format HHMM (start of the period) for each period
               - All weekdays (0 to 6)
               - fromHour and toHour correspond to the start and end of the period
           - energy_charges: Extract from SimplePrice objects (use buy price) for all the periods above
           - sell_tariffs: Extract from SimplePrice objects (use sell price) for all the periods above
         """
-        resolution_minutes = int(os.environ.get("RESOLUTION", 5))
-        if resolution_minutes not in [5, 30]:
-            raise ValueError("RESOLUTION must be 5 or 30 minutes.")
+        grid = SlotGrid.from_env()
 
-        tou_periods: dict[str, List[TouPeriod]] = {}
-        tou_periods_list: List[TouPeriod] = []
+        if not isinstance(prices, PriceSeries):
+            prices = PriceSeries.from_prices(prices)
+        if len(prices) and prices.period_seconds != grid.period_seconds:
+            raise ValueError("Prices must have the period of the RESOLUTION slots.")
+
+        tou_periods: dict[str, TouPeriodContainer] = {}
         buy_rates_dict: dict[str, float] = {}
         sell_rates_dict: dict[str, float] = {}
 
-        today = datetime.now()
-
-        for price in prices:
-            start_time_str = price.start_time.strftime("%H%M")
-            end_time = (datetime.combine(today, price.start_time) + price.period).time()
-
-            tou_periods[start_time_str] = TouPeriodContainer(
+        for start_minute, end_minute, buy_per_kwh, sell_per_kwh in self._compact_prices(prices, grid):
+            # Periods are only named here, where the tariff takes Tesla's format
+            period_name = SlotGrid.period_name(start_minute)
+            tou_periods[period_name] = TouPeriodContainer(
                 periods=[
                     TouPeriod(
                         fromDayOfWeek=0,  # All weekdays
-                        toHour=end_time.hour,
+                        toHour=end_minute // 60,
                         toDayOfWeek=6,  # All weekdays
-                        fromHour=price.start_time.hour,
-                        fromMinute=price.start_time.minute,
-                        toMinute=end_time.minute,
+                        fromHour=start_minute // 60,
+                        fromMinute=start_minute % 60,
+                        toMinute=end_minute % 60,
                     )
                 ]
             )
-            buy_rates_dict[start_time_str] = price.buy_per_kwh
-            sell_rates_dict[start_time_str] = price.sell_per_kwh
+            buy_rates_dict[period_name] = buy_per_kwh
+            sell_rates_dict[period_name] = sell_per_kwh
+
+        self._check_round_trip(prices, tou_periods, buy_rates_dict, sell_rates_dict, grid)
 
         main_season = Season(
             fromMonth=1,
@@ -211,29 +400,189 @@ class PowerwallPriceUpdater:
             sell_tariff=sell_tariff,
         )
 
-    def run(self):
-        """Main execution method for the cron job."""
-        logger.info("Starting electricity price update job")
-
-        prices = self._generate_prices()
-        logger.info(f"Generated {len(prices)} prices")
-        logger.debug(f"Prices: {prices}")
+    def spike_slots(self, amber_prices: PriceSeries) -> frozenset[int]:
+        """
+        Returns the slots of the day the spike strategy turns into spikes, given the Amber
+        forecast. The tariff only changes with this set, apart from the Globird prices.
+        :param amber_prices: Amber forecast, see AmberClient.get_forecast().
+        """
+        _, amber_sell, _ = self._slot_arrays(amber_prices, SlotGrid.from_env())
+        # Only the spike mask is needed, so the Globird prices do not matter here
+        _, _, spikes = apply_spike_strategy(0.0, 0.0, amber_sell, self._get_sell_threshold())
+        return frozenset(np.flatnonzero(spikes).tolist())
 
-        time_of_use_settings = self._build_time_of_use_settings(prices)
-        logger.info("Built TimeOfUseSettings")
-        logger.debug(f"TimeOfUseSettings: {time_of_use_settings}")
+    def run(self, fetched_prices: dict[str, PriceSeries] | None = None):
+        """
+        Main execution method for the cron job.
+        Stage timings and counters are written to the METRICS_DIR textfile after every run.
+        :param fetched_prices: Prices already fetched by _fetch_sources(), fetched when None.
+        """
+        logger.info("Starting electricity price update job for site %s", self.site)
+        outcome = "failure"
+        try:
+            with metrics.timed("run"):
+                if fetched_prices is None:
+                    fetched_prices = self._fetch_sources()
+                prices = self._generate_prices(fetched_prices)
+                logger.info("Generated %s prices", len(prices))
+                logger.debug("Prices: %s", prices)
+
+                with metrics.timed("tou_build"):
+                    time_of_use_settings = self._build_time_of_use_settings(prices)
+                logger.info("Built TimeOfUseSettings")
+                logger.debug("TimeOfUseSettings: %s", time_of_use_settings)
+
+                with rate_limiter.priority(self._push_priority(fetched_prices["Amber"])):
+                    updated_response = self.tesla_client.update(
+                        time_of_use_settings=time_of_use_settings
+                    )
+                self._record_history(
+                    fetched_prices["Amber"],
+                    prices,
+                    time_of_use_settings,
+                    pushed=updated_response is not None,
+                )
+            outcome = "success"
+        finally:
+            metrics.runs_total.inc(outcome=outcome)
+            metrics.write_textfile()
+
+    def _record_history(
+        self,
+        amber_prices: PriceSeries,
+        prices: PriceSeries,
+        time_of_use_settings: TimeOfUseSettings,
+        pushed: bool,
+    ):
+        """
+        Records the Amber forecast, the merged prices and the tariff of a run in the history.
+        A failure to record is logged and never fails the run.
+        """
+        if self.history_store is None:
+            return
+        try:
+            with metrics.timed("history_write"):
+                recorded_at = time_module.time()
+                self.history_store.record_prices(AMBER_FORECAST, self.site, amber_prices, recorded_at)
+                self.history_store.record_prices(DECISION, self.site, prices, recorded_at)
+                self.history_store.record_tariff(
+                    self.site,
+                    TeslaClient.tariff_hash(time_of_use_settings),
+                    tou_serializer.to_json_bytes(time_of_use_settings, sort_keys=True),
+                    pushed,
+                    recorded_at,
+                )
+            self.history_store.compact_if_due()
+        except sqlite3.Error:
+            logger.exception("Error recording the run in the history")
+
+
+def build_updater(history_store: HistoryStore | None):
+    """
+    Builds the updater of the site configured by environment variables, or of every site of
+    the SITES_FILE roster. The Globird prices, which are the same for every site, are shared.
+    """
+    globird_client = GlobirdClient()
+    sites_file = os.environ.get("SITES_FILE")
+    if not sites_file:
+        return PowerwallPriceUpdater(
+            globird_client=globird_client,
+            amber_client=AmberClient(),
+            tesla_client=TeslaClient(),
+            history_store=history_store,
+            site=os.environ.get("AMBER_SITE_ID") or "default",
+        )
 
-        self.tesla_client.update(time_of_use_settings=time_of_use_settings)
+    sites = load_sites(sites_file)
+    max_workers = int(os.environ.get("MAX_SITE_WORKERS", 4))
+    logger.info("Updating %s sites, %s at a time", len(sites), max_workers)
+    # Each site fetches two sources, one pool serves the sources of every running site
+    source_executor = ThreadPoolExecutor(
+        max_workers=2 * max_workers, thread_name_prefix="price-source"
+    )
+    return MultiSiteUpdater(
+        [
+            PowerwallPriceUpdater(
+                globird_client=globird_client,
+                amber_client=AmberClient(
+                    site=site.name, site_id=site.amber_site_id, api_token=site.amber_api_token
+                ),
+                tesla_client=TeslaClient(
+                    site=site.name,
+                    refresh_token_file=site.tesla_refresh_token_file,
+                    energy_site_id=site.tesla_energy_site_id,
+                ),
+                history_store=history_store,
+                site=site.name,
+                sell_threshold=site.sell_threshold,
+                executor=source_executor,
+            )
+            for site in sites
+        ],
+        max_workers=max_workers,
+    )
 
 
 def main():
     """Entry point for the script."""
-    updater = PowerwallPriceUpdater(
-        globird_client=GlobirdClient(),
-        amber_client=AmberClient(),
-        tesla_client=TeslaClient(),
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and update prices on an aligned UPDATE_INTERVAL_MINUTES schedule.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running, poll the Amber forecast every WATCH_POLL_MINUTES and only push "
+        "when the spike slots change.",
+    )
+    args = parser.parse_args()
+
+    # An empty HISTORY_DB disables the history
+    history_path = os.environ.get(
+        "HISTORY_DB", os.path.join(os.environ.get("AUTH_DIR", "/app/auth"), "history.sqlite3")
     )
-    updater.run()
+    history_store = (
+        HistoryStore(
+            history_path,
+            retention_days=float(os.environ.get("HISTORY_RETENTION_DAYS", 400)),
+            compact_after_days=float(os.environ.get("HISTORY_COMPACT_AFTER_DAYS", 7)),
+        )
+        if history_path
+        else None
+    )
+
+    # Clients are built once so that sessions and caches survive between daemon ticks
+    updater = build_updater(history_store)
+
+    if args.watch:
+        if isinstance(updater, MultiSiteUpdater):
+            updaters, executor = updater.updaters, updater.executor
+        else:
+            updaters, executor = [updater], None
+        watcher = SpikeWatcher(
+            updaters,
+            debounce_seconds=float(os.environ.get("WATCH_DEBOUNCE_SECONDS", 10)),
+            refresh_minutes=float(os.environ.get("WATCH_REFRESH_MINUTES", 60)),
+            executor=executor,
+        )
+        poll_minutes = int(os.environ.get("WATCH_POLL_MINUTES", 1))
+        logger.info("Watching the Amber forecast every %s minute(s)", poll_minutes)
+        scheduler = AlignedScheduler(watcher.poll_once, interval_minutes=poll_minutes)
+        scheduler.install_signal_handlers()
+        scheduler.run_forever()
+        return
+
+    if not args.daemon:
+        updater.run()
+        return
+
+    interval_minutes = int(os.environ.get("UPDATE_INTERVAL_MINUTES", 5))
+    logger.info("Starting price updater daemon with a %s minute interval", interval_minutes)
+    scheduler = AlignedScheduler(updater.run, interval_minutes=interval_minutes)
+    scheduler.install_signal_handlers()
+    scheduler.run_forever()
 
 
 if __name__ == "__main__":
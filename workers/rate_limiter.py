@@ -0,0 +1,210 @@
+import contextvars
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable
+
+from app_logger import logger
+
+# Priorities of the requests waiting for a token, lower values are served first
+PRIORITY_SPIKE = 0
+PRIORITY_ROUTINE = 10
+
+# Default (requests per minute, burst) per endpoint, within the Fleet API and Amber limits
+DEFAULT_LIMITS = {
+    "token": (20, 5),
+    "products": (30, 5),
+    "time_of_use_settings": (30, 5),
+    "amber_sites": (10, 2),
+    "amber_prices": (10, 5),
+}
+
+_current_priority = contextvars.ContextVar("rate_limit_priority", default=PRIORITY_ROUTINE)
+
+
+class TokenBucket:
+    """Tokens refilled at a steady rate up to a burst capacity, one token per request."""
+
+    def __init__(self, rate_per_second: float, capacity: float, now: float):
+        """
+        :param rate_per_second: Tokens added per second.
+        :param capacity: Maximum number of tokens, i.e. the largest burst of requests.
+        :param now: Current time of the limiter's clock.
+        """
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+        # Set when the provider asked to back off with Retry-After
+        self.blocked_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """Returns how long to wait for a token, 0 if one is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate_per_second
+
+    def take(self):
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """
+    Per-endpoint token buckets, shared by every client and site the limits apply to.
+
+    Requests waiting for the same endpoint are served by priority, then in arrival order,
+    so spike-driven pushes go ahead of routine refreshes. Endpoints without a bucket are
+    not limited.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, tuple[float, float]],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param limits: (requests per minute, burst) per endpoint.
+        :param clock: Monotonic clock in seconds, overridable for tests.
+        """
+        self._clock = clock
+        now = clock()
+        self._buckets = {
+            endpoint: TokenBucket(per_minute / 60, burst, now)
+            for endpoint, (per_minute, burst) in limits.items()
+        }
+        self._waiters: dict[str, list] = {endpoint: [] for endpoint in limits}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(
+        self, endpoint: str, priority: int | None = None, timeout: float | None = None
+    ) -> float:
+        """
+        Waits for a token of an endpoint.
+        :param endpoint: Short endpoint name.
+        :param priority: Priority of the request, defaults to the one set with priority().
+        :param timeout: Longest wait in seconds, None or inf to wait as long as it takes.
+        :return: Seconds waited.
+        :raises TimeoutError: If no token was available within the timeout.
+        """
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            return 0.0
+        if priority is None:
+            priority = _current_priority.get()
+
+        started = self._clock()
+        expires_at = None if timeout is None or math.isinf(timeout) else started + timeout
+        waiters = self._waiters[endpoint]
+        entry = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(waiters, entry)
+            try:
+                while True:
+                    now = self._clock()
+                    if expires_at is not None and now >= expires_at:
+                        raise TimeoutError(f"No {endpoint} rate limit token within {timeout:.1f}s")
+                    wait_seconds = None
+                    if waiters[0] == entry:
+                        wait_seconds = bucket.delay(now)
+                        if wait_seconds <= 0:
+                            bucket.take()
+                            break
+                    if expires_at is not None:
+                        wait_seconds = min(wait_seconds or math.inf, expires_at - now)
+                    # Woken up when the head of the queue changes, or when a token is due
+                    self._condition.wait(wait_seconds)
+            finally:
+                waiters.remove(entry)
+                heapq.heapify(waiters)
+                self._condition.notify_all()
+
+        waited = self._clock() - started
+        if waited > 0.1:
+            logger.info("Waited %.1fs for the %s rate limit", waited, endpoint)
+        return waited
+
+    def block(self, endpoint: str, seconds: float):
+        """
+        Holds back the requests of an endpoint, e.g. for the Retry-After of a 429 response.
+        :param endpoint: Short endpoint name.
+        :param seconds: How long to hold the requests back.
+        """
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            return
+        with self._condition:
+            bucket.blocked_until = max(bucket.blocked_until, self._clock() + seconds)
+            self._condition.notify_all()
+
+
+@contextmanager
+def priority(value: int):
+    """Sets the priority of the requests made within the block, in the current thread."""
+    token = _current_priority.set(value)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def parse_retry_after(value, default: float) -> float:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+    :param value: Header value, None when missing.
+    :param default: Seconds returned when the header is missing or invalid.
+    """
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_limits(value: str) -> dict[str, tuple[float, float]]:
+    """
+    Parses limits given as "endpoint=per_minute[/burst],...", e.g. "products=60/10,token=20".
+    The burst defaults to 1.
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        endpoint, _, limit = item.partition("=")
+        per_minute, _, burst = limit.partition("/")
+        limits[endpoint.strip()] = (float(per_minute), float(burst or 1))
+    return limits
+
+
+# Limiters by hashed account credential, None for the limiter of the whole process
+_shared_rate_limiters: dict[str | None, RateLimiter] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_rate_limiter(credential: str | None = None) -> RateLimiter:
+    """
+    Returns the limiter shared by every client of an account, with DEFAULT_LIMITS updated by
+    RATE_LIMITS. Providers such as Amber limit each API token separately, so sites with
+    their own tokens are not throttled by each other.
+    :param credential: API token of the account, None for the limiter of the whole process.
+    """
+    key = hashlib.sha256(credential.encode()).hexdigest() if credential else None
+    with _shared_lock:
+        if key not in _shared_rate_limiters:
+            limits = dict(DEFAULT_LIMITS)
+            limits.update(parse_limits(os.environ.get("RATE_LIMITS", "")))
+            _shared_rate_limiters[key] = RateLimiter(limits)
+        return _shared_rate_limiters[key]
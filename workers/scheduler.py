@@ -0,0 +1,88 @@
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from app_logger import logger
+
+
+class AlignedScheduler:
+    """
+    Runs a job on wall-clock aligned intervals (e.g. every 5 minutes at :00, :05, :10...).
+
+    Jobs run sequentially in the calling thread, so a slow run can never overlap the next
+    one. Ticks that were missed while a run overran are skipped rather than queued up.
+    """
+
+    def __init__(
+        self,
+        job: Callable[[], None],
+        interval_minutes: int = 5,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param job: Callable to run on every tick.
+        :param interval_minutes: Interval between ticks, must divide a day evenly.
+        :param clock: Source of the current Unix time, overridable for tests.
+        """
+        if interval_minutes <= 0 or (24 * 60) % interval_minutes != 0:
+            raise ValueError("interval_minutes must evenly divide a day.")
+        self._job = job
+        self._interval = interval_minutes * 60
+        self._clock = clock
+        self._stop_event = threading.Event()
+
+    def next_tick(self, now: float) -> float:
+        """
+        Returns the first aligned tick strictly after the given Unix time.
+        :param now: Current Unix time.
+        """
+        # Align on local wall-clock time so ticks land on :00, :05... in any timezone
+        utc_offset = datetime.fromtimestamp(now).astimezone().utcoffset() or timedelta()
+        local_now = now + utc_offset.total_seconds()
+        return (local_now // self._interval + 1) * self._interval - utc_offset.total_seconds()
+
+    def run_once(self):
+        """Runs the job, logging instead of propagating failures so the daemon survives."""
+        started = self._clock()
+        try:
+            self._job()
+        except Exception:
+            logger.exception("Scheduled job failed")
+        elapsed = self._clock() - started
+        if elapsed > self._interval:
+            skipped = int(elapsed // self._interval)
+            logger.warning(
+                "Job took %.1fs, longer than the %ss interval; skipping %s missed tick(s)",
+                elapsed,
+                self._interval,
+                skipped,
+            )
+
+    def run_forever(self, run_immediately: bool = True):
+        """
+        Runs the job on every aligned tick until stop() is called.
+        :param run_immediately: Whether to run the job once before waiting for the first tick.
+        """
+        if run_immediately:
+            self.run_once()
+        while not self._stop_event.is_set():
+            next_tick = self.next_tick(self._clock())
+            logger.debug("Next run at %s", datetime.fromtimestamp(next_tick).isoformat())
+            if self._stop_event.wait(max(0.0, next_tick - self._clock())):
+                break
+            self.run_once()
+        logger.info("Scheduler stopped")
+
+    def stop(self):
+        """Stops the scheduler after the current run, if any, finishes."""
+        self._stop_event.set()
+
+    def install_signal_handlers(self, signals: Optional[tuple] = None):
+        """
+        Stops the scheduler gracefully on SIGTERM/SIGINT, as sent by supervisord.
+        :param signals: Signals to handle, defaults to SIGTERM and SIGINT.
+        """
+        for sig in signals or (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: self.stop())
@@ -1,11 +1,15 @@
+from array import array
 from dataclasses import dataclass
 import datetime
+from typing import Iterable, Iterator, List
 
-from dataclasses_json import dataclass_json
+from dateutil import tz
+
+from lazy_json import LazyDataClassJsonMixin
+from slot_grid import SlotGrid
 
-@dataclass_json
 @dataclass
-class PriceType:
+class PriceType(LazyDataClassJsonMixin):
     ACTUAL = "ActualInterval"
     CURRENT = "CurrentInterval"
     FORECAST = "ForecastInterval"
@@ -14,9 +18,14 @@ class PriceType:
     def is_valid(cls, value):
         return value in (cls.ACTUAL, cls.CURRENT, cls.FORECAST)
 
-@dataclass_json
+# Small integer codes used to store price types compactly, indexed by code
+PRICE_TYPES = (PriceType.ACTUAL, PriceType.CURRENT, PriceType.FORECAST)
+PRICE_TYPE_CODES = {price_type: code for code, price_type in enumerate(PRICE_TYPES)}
+# Code of entries and slots without a price
+MISSING_PRICE_TYPE_CODE = -1
+
 @dataclass
-class SimplePrice:
+class SimplePrice(LazyDataClassJsonMixin):
     """A simple representation of a price with a start time and per kWh cost."""
     start_time: datetime.datetime
     period: datetime.timedelta
@@ -27,3 +36,256 @@ class SimplePrice:
     def start_time_time(self) -> datetime.time:
         """Returns the start time as a Unix timestamp."""
         return self.start_time.time()
+
+
+class PriceSeries:
+    """
+    A compact series of consecutive prices of a fixed period, stored as contiguous arrays.
+
+    Entry i starts at start_time + i * period, in the wall-clock time of the series' timezone.
+    Indexing and iterating yield SimplePrice views created on demand, so a series can be used
+    wherever a List[SimplePrice] was expected.
+    """
+
+    __slots__ = ("start_epoch", "period_seconds", "buy", "sell", "price_type_codes", "tzinfo")
+
+    def __init__(
+        self,
+        start_epoch: float,
+        period_seconds: int,
+        buy: Iterable[float],
+        sell: Iterable[float],
+        price_type_codes: Iterable[int],
+        tzinfo: datetime.tzinfo | None = None,
+    ):
+        """
+        :param start_epoch: Unix time at which the first entry starts.
+        :param period_seconds: Duration of every entry.
+        :param buy: Buy price per kWh of each entry.
+        :param sell: Sell price per kWh of each entry.
+        :param price_type_codes: PRICE_TYPE_CODES code of each entry.
+        :param tzinfo: Timezone of the start times, defaults to the local timezone.
+        """
+        self.start_epoch = start_epoch
+        self.period_seconds = period_seconds
+        self.buy = buy if isinstance(buy, array) else array("d", buy)
+        self.sell = sell if isinstance(sell, array) else array("d", sell)
+        self.price_type_codes = (
+            price_type_codes
+            if isinstance(price_type_codes, array)
+            else array("b", price_type_codes)
+        )
+        self.tzinfo = tzinfo or tz.tzlocal()
+        if not len(self.buy) == len(self.sell) == len(self.price_type_codes):
+            raise ValueError("PriceSeries arrays must have the same length.")
+
+    @classmethod
+    def empty(cls, period_seconds: int = 300) -> "PriceSeries":
+        """Returns a series without any entries."""
+        return cls(0.0, period_seconds, [], [], [])
+
+    @classmethod
+    def from_prices(cls, prices: Iterable[SimplePrice]) -> "PriceSeries":
+        """
+        Builds a series from prices with timezone aware datetime start times.
+        Prices may have different periods (Amber forecasts switch from 5 to 30 minute
+        intervals), as long as they are multiples of the shortest one: longer prices are
+        repeated over every entry they cover. Where prices overlap the last one wins, and
+        gaps are left as NaN prices with MISSING_PRICE_TYPE_CODE.
+        :param prices: Prices ordered by start time.
+        """
+        prices = list(prices)
+        if not prices:
+            return cls.empty()
+        period_seconds = min(int(price.period.total_seconds()) for price in prices)
+        if period_seconds <= 0 or any(
+            int(price.period.total_seconds()) % period_seconds for price in prices
+        ):
+            raise ValueError("Price periods must be multiples of the shortest period.")
+
+        first = min(prices, key=lambda price: price.start_time)
+        # Offsets are taken in wall-clock time, which is how entries of a series are spaced
+        origin = first.start_time.replace(tzinfo=None)
+        placements = []
+        for price in prices:
+            offset = round(
+                (price.start_time.replace(tzinfo=None) - origin).total_seconds() / period_seconds
+            )
+            placements.append(
+                (
+                    offset,
+                    int(price.period.total_seconds()) // period_seconds,
+                    price.buy_per_kwh,
+                    price.sell_per_kwh,
+                    PRICE_TYPE_CODES[price.price_type],
+                )
+            )
+        return cls._from_placements(
+            placements, first.start_time.timestamp(), period_seconds, first.start_time.tzinfo
+        )
+
+    @classmethod
+    def from_intervals(
+        cls, intervals: Iterable[tuple], tzinfo: datetime.tzinfo | None = None
+    ) -> "PriceSeries":
+        """
+        Builds a series from raw intervals, following the rules of from_prices() without
+        creating any SimplePrice.
+        :param intervals: (start Unix time, period seconds, buy per kWh, sell per kWh,
+            PRICE_TYPE_CODES code) of each interval, ordered by start time.
+        :param tzinfo: Timezone of the start times, defaults to the local timezone.
+        """
+        intervals = list(intervals)
+        if not intervals:
+            return cls.empty()
+        tzinfo = tzinfo or tz.tzlocal()
+        period_seconds = min(interval[1] for interval in intervals)
+        if period_seconds <= 0 or any(interval[1] % period_seconds for interval in intervals):
+            raise ValueError("Price periods must be multiples of the shortest period.")
+
+        first_epoch = min(interval[0] for interval in intervals)
+        last_epoch = max(interval[0] for interval in intervals)
+        origin = datetime.datetime.fromtimestamp(first_epoch, tz=tzinfo)
+        if origin.utcoffset() == datetime.datetime.fromtimestamp(last_epoch, tz=tzinfo).utcoffset():
+            # Without a UTC offset change, wall-clock and Unix time spacing are the same
+            offsets = [(interval[0] - first_epoch) / period_seconds for interval in intervals]
+        else:
+            wall_origin = origin.replace(tzinfo=None)
+            offsets = [
+                (
+                    datetime.datetime.fromtimestamp(interval[0], tz=tzinfo).replace(tzinfo=None)
+                    - wall_origin
+                ).total_seconds()
+                / period_seconds
+                for interval in intervals
+            ]
+        placements = [
+            (round(offset), period // period_seconds, buy_per_kwh, sell_per_kwh, code)
+            for offset, (_, period, buy_per_kwh, sell_per_kwh, code) in zip(offsets, intervals)
+        ]
+        return cls._from_placements(placements, first_epoch, period_seconds, tzinfo)
+
+    @classmethod
+    def _from_placements(
+        cls,
+        placements: List[tuple],
+        start_epoch: float,
+        period_seconds: int,
+        tzinfo: datetime.tzinfo,
+    ) -> "PriceSeries":
+        """
+        Fills the arrays of a series, leaving the entries no price covers as NaN.
+        :param placements: (first entry, entry count, buy per kWh, sell per kWh, code) of
+            each price, where the last one wins.
+        """
+        entry_count = max(offset + span for offset, span, *_ in placements)
+        buy = array("d", [float("nan")]) * entry_count
+        sell = array("d", [float("nan")]) * entry_count
+        price_type_codes = array("b", [MISSING_PRICE_TYPE_CODE]) * entry_count
+        for offset, span, buy_per_kwh, sell_per_kwh, code in placements:
+            for index in range(offset, offset + span):
+                buy[index] = buy_per_kwh
+                sell[index] = sell_per_kwh
+                price_type_codes[index] = code
+        return cls(
+            start_epoch=start_epoch,
+            period_seconds=period_seconds,
+            buy=buy,
+            sell=sell,
+            price_type_codes=price_type_codes,
+            tzinfo=tzinfo,
+        )
+
+    @property
+    def start_time(self) -> datetime.datetime:
+        """Start time of the first entry."""
+        return datetime.datetime.fromtimestamp(self.start_epoch, tz=self.tzinfo)
+
+    @property
+    def period(self) -> datetime.timedelta:
+        """Duration of every entry."""
+        return datetime.timedelta(seconds=self.period_seconds)
+
+    def __len__(self) -> int:
+        return len(self.buy)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("PriceSeries slices must be contiguous.")
+            return PriceSeries(
+                start_epoch=(self.start_time + self.period * start).timestamp(),
+                period_seconds=self.period_seconds,
+                buy=self.buy[start:stop],
+                sell=self.sell[start:stop],
+                price_type_codes=self.price_type_codes[start:stop],
+                tzinfo=self.tzinfo,
+            )
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PriceSeries index out of range")
+        return SimplePrice(
+            start_time=self.start_time + self.period * index,
+            period=self.period,
+            buy_per_kwh=self.buy[index],
+            sell_per_kwh=self.sell[index],
+            price_type=self._price_type(self.price_type_codes[index]),
+        )
+
+    @staticmethod
+    def _price_type(code: int) -> PriceType | None:
+        """Returns the price type of a code, None for entries without a price."""
+        return PRICE_TYPES[code] if code != MISSING_PRICE_TYPE_CODE else None
+
+    def __iter__(self) -> Iterator[SimplePrice]:
+        return (self[index] for index in range(len(self)))
+
+    def __repr__(self) -> str:
+        return (
+            f"PriceSeries(start_time={self.start_time.isoformat()}, "
+            f"period={self.period}, entries={len(self)})"
+        )
+
+    def to_prices(self) -> List[SimplePrice]:
+        """Expands the series into SimplePrice objects."""
+        return list(self)
+
+    def start_epochs(self) -> List[float]:
+        """Returns the Unix time at which each entry starts."""
+        start_time = self.start_time
+        if start_time.utcoffset() == (start_time + self.period * len(self)).utcoffset():
+            # Without a UTC offset change, wall-clock and Unix time spacing are the same
+            return [self.start_epoch + self.period_seconds * index for index in range(len(self))]
+        return [(start_time + self.period * index).timestamp() for index in range(len(self))]
+
+    def minutes_of_day(self, grid: SlotGrid) -> List[int]:
+        """
+        Returns the wall-clock minute of the day at which each entry starts.
+        :param grid: Slots of the day, whose timezone gives the wall-clock time.
+        """
+        return grid.entry_minutes(self.start_epoch, self.period_seconds, len(self))
+
+    def align_to_slots(self, grid: SlotGrid) -> tuple[array, array, array]:
+        """
+        Aligns the entries into dense arrays indexed by the slot of the day they start in.
+        Entries that do not start on a slot boundary are ignored, and when several entries
+        start at the same time of day (e.g. today's and tomorrow's) the last one wins.
+        :param grid: Slots of the day.
+        :return: Tuple of (buy, sell, price type code) arrays, NaN and
+            MISSING_PRICE_TYPE_CODE for slots without an entry.
+        """
+        resolution_minutes = grid.resolution_minutes
+        slot_count = grid.slot_count
+        buy = array("d", [float("nan")]) * slot_count
+        sell = array("d", [float("nan")]) * slot_count
+        price_type_codes = array("b", [MISSING_PRICE_TYPE_CODE]) * slot_count
+        for index, minute_of_day in enumerate(self.minutes_of_day(grid)):
+            if minute_of_day % resolution_minutes:
+                continue
+            slot = minute_of_day // resolution_minutes
+            buy[slot] = self.buy[index]
+            sell[slot] = self.sell[index]
+            price_type_codes[slot] = self.price_type_codes[index]
+        return buy, sell, price_type_codes
@@ -0,0 +1,96 @@
+import datetime
+import os
+from typing import List
+
+from dateutil import tz
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class SlotGrid:
+    """
+    The slots of a day at a fixed resolution, numbered from 0 at midnight.
+
+    Slot i starts at the wall-clock minute i * resolution_minutes of the day, in the grid's
+    timezone, so a slot keeps its index on every day even when daylight saving time changes
+    the UTC offset (in Australia/Sydney the 2AM to 3AM hour is skipped in October and repeated
+    in April). Slots and minutes of the day are plain integers throughout the pipeline, period
+    names such as "1830" are only built when a tariff is serialized.
+    """
+
+    __slots__ = ("resolution_minutes", "tzinfo")
+
+    def __init__(self, resolution_minutes: int, tzinfo: datetime.tzinfo | None = None):
+        """
+        :param resolution_minutes: Length of a slot, must divide a day evenly.
+        :param tzinfo: Timezone of the wall-clock times, defaults to the local timezone.
+        """
+        if resolution_minutes <= 0 or MINUTES_PER_DAY % resolution_minutes:
+            raise ValueError("resolution_minutes must evenly divide a day.")
+        self.resolution_minutes = resolution_minutes
+        self.tzinfo = tzinfo or tz.tzlocal()
+
+    @classmethod
+    def from_env(cls, tzinfo: datetime.tzinfo | None = None) -> "SlotGrid":
+        """Returns the grid of the RESOLUTION environment variable, 5 or 30 minutes."""
+        resolution_minutes = int(os.environ.get("RESOLUTION", 5))
+        if resolution_minutes not in [5, 30]:
+            raise ValueError("RESOLUTION must be 5 or 30 minutes.")
+        return cls(resolution_minutes, tzinfo)
+
+    def __repr__(self) -> str:
+        return f"SlotGrid(resolution_minutes={self.resolution_minutes}, tzinfo={self.tzinfo!r})"
+
+    @property
+    def slot_count(self) -> int:
+        """Number of slots of a day."""
+        return MINUTES_PER_DAY // self.resolution_minutes
+
+    @property
+    def period_seconds(self) -> int:
+        """Duration of a slot."""
+        return self.resolution_minutes * 60
+
+    def start_minutes(self) -> range:
+        """Returns the minute of the day at which each slot starts."""
+        return range(0, MINUTES_PER_DAY, self.resolution_minutes)
+
+    def wall_clock_seconds(self, epoch: float) -> float:
+        """
+        Returns a Unix time shifted by its UTC offset, so that the difference of two results is
+        in wall-clock time, which is how the entries of a PriceSeries are spaced.
+        """
+        utc_offset = datetime.datetime.fromtimestamp(epoch, tz=self.tzinfo).utcoffset()
+        return epoch + utc_offset.total_seconds()
+
+    def minute_of_day(self, epoch: float) -> int:
+        """Returns the wall-clock minute of the day of a Unix time."""
+        return int(self.wall_clock_seconds(epoch) // 60 % MINUTES_PER_DAY)
+
+    def entry_minutes(self, start_epoch: float, period_seconds: int, count: int) -> List[int]:
+        """
+        Returns the wall-clock minute of the day at which each entry of a series starts.
+        :param start_epoch: Unix time at which the first entry starts.
+        :param period_seconds: Duration of every entry, entries are spaced in wall-clock time.
+        :param count: Number of entries.
+        """
+        start_minute = self.minute_of_day(start_epoch)
+        period_minutes = period_seconds // 60
+        return [
+            (start_minute + index * period_minutes) % MINUTES_PER_DAY for index in range(count)
+        ]
+
+    def midnight(self, day: datetime.date) -> datetime.datetime:
+        """Returns the start of the first slot of a day."""
+        return datetime.datetime.combine(day, datetime.time(0, 0), tzinfo=self.tzinfo)
+
+    @staticmethod
+    def period_name(minute_of_day: int) -> str:
+        """Returns the HHMM name of the tariff period starting at a minute of the day."""
+        return f"{minute_of_day // 60:02d}{minute_of_day % 60:02d}"
+
+    @staticmethod
+    def to_time(minute_of_day: int) -> datetime.time:
+        """Returns the wall-clock time of a minute of the day, midnight for the end of the day."""
+        minute_of_day %= MINUTES_PER_DAY
+        return datetime.time(minute_of_day // 60, minute_of_day % 60)
@@ -0,0 +1,39 @@
+"""
+The spike strategy shared by PowerwallPriceUpdater and the backtest.
+
+Globird prices are used by default. When Amber's sell price exceeds the sell threshold, the slot
+sells at SPIKE_SELL_PRICE and buys at the Globird price + SPIKE_BUY_UPLIFT, which makes the
+Powerwall export rather than import during the spike.
+"""
+
+import numpy as np
+
+# Sell price of spike slots, per kWh
+SPIKE_SELL_PRICE = 1.0
+# Added to the Globird buy price of spike slots, per kWh
+SPIKE_BUY_UPLIFT = 1.0
+
+
+def apply_spike_strategy(
+    globird_buy: np.ndarray,
+    globird_sell: np.ndarray,
+    amber_sell: np.ndarray,
+    sell_threshold,
+    buy_uplift: float = SPIKE_BUY_UPLIFT,
+    spike_sell_price: float = SPIKE_SELL_PRICE,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decides the buy and sell price of every slot. All arguments broadcast, so a column of
+    thresholds, e.g. of shape (n, 1), evaluates n thresholds over the slots at once.
+    :param globird_buy: Globird buy price per slot.
+    :param globird_sell: Globird sell price per slot.
+    :param amber_sell: Amber sell price per slot, NaN where there is no forecast.
+    :param sell_threshold: Amber sell price above which a slot is a spike.
+    :return: Tuple of (buy prices, sell prices, spike mask).
+    """
+    # NaN compares as False, so slots without an Amber price keep the Globird price
+    with np.errstate(invalid="ignore"):
+        spikes = amber_sell > sell_threshold
+    buy = np.where(spikes, globird_buy + buy_uplift, globird_buy)
+    sell = np.where(spikes, spike_sell_price, globird_sell)
+    return buy, sell, spikes
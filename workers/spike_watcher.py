@@ -0,0 +1,162 @@
+import time
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import Callable, List
+
+from app_logger import logger
+import metrics
+
+# Reasons for rebuilding the tariff of a site
+REBUILD_START = "start"
+REBUILD_SPIKES = "spikes"
+REBUILD_REFRESH = "refresh"
+
+
+class SpikeWatcher:
+    """
+    Polls the Amber forecast of every site and rebuilds and pushes its tariff only when the set
+    of spike slots changes, rather than on every tick.
+
+    A change is confirmed by polling again after the debounce delay: changes seen meanwhile are
+    coalesced into a single push, and a change that reverted is not pushed at all. Tariffs are
+    also rebuilt every refresh interval and when the day changes, to follow the Globird prices.
+    Sites are polled and rebuilt concurrently, so a slow site never delays the others.
+    """
+
+    def __init__(
+        self,
+        updaters: list,
+        debounce_seconds: float = 10,
+        refresh_minutes: float = 60,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+        executor: Executor | None = None,
+    ):
+        """
+        :param updaters: One PowerwallPriceUpdater per site.
+        :param debounce_seconds: Delay before a change of the spike slots is confirmed.
+        :param refresh_minutes: Interval of the rebuilds when the spike slots do not change.
+        :param clock: Source of the current Unix time, overridable for tests.
+        :param sleep: Waits for the debounce delay, overridable for tests.
+        :param executor: Pool polling and rebuilding the sites, e.g. MultiSiteUpdater.executor,
+            None to handle the sites one after another.
+        """
+        self.updaters = updaters
+        self.debounce_seconds = debounce_seconds
+        self.refresh_seconds = refresh_minutes * 60
+        self._clock = clock
+        self._sleep = sleep
+        self._executor = executor
+        # Spike slots and time of the last rebuild of every site
+        self._pushed_spikes: dict[str, frozenset] = {}
+        self._rebuilt_at: dict[str, float] = {}
+
+    def _map(self, function: Callable, *iterables) -> list:
+        """Calls the function for every site, in the pool if there is one."""
+        if self._executor is None:
+            return list(map(function, *iterables))
+        return list(self._executor.map(function, *iterables))
+
+    def _rebuild_reason(self, site: str, spikes: frozenset, now: float) -> str | None:
+        """Returns why the tariff of a site must be rebuilt, None if it is up to date."""
+        if site not in self._pushed_spikes:
+            return REBUILD_START
+        rebuilt_at = self._rebuilt_at[site]
+        if (
+            now - rebuilt_at >= self.refresh_seconds
+            or datetime.fromtimestamp(now).date() != datetime.fromtimestamp(rebuilt_at).date()
+        ):
+            return REBUILD_REFRESH
+        if spikes != self._pushed_spikes[site]:
+            return REBUILD_SPIKES
+        return None
+
+    def _poll(self, updater):
+        """
+        Fetches the prices of a site.
+        :return: Tuple of (fetched prices, spike slots), or None if there is no Amber forecast.
+        """
+        metrics.watch_polls_total.inc()
+        try:
+            fetched_prices = updater._fetch_sources()
+        except Exception:
+            logger.exception("Error polling site %s", updater.site)
+            return None
+        if not fetched_prices["Amber"]:
+            # A failed fetch says nothing about the spikes, so it never triggers a push
+            logger.warning("No Amber forecast for site %s, keeping its tariff", updater.site)
+            return None
+        return fetched_prices, updater.spike_slots(fetched_prices["Amber"])
+
+    def _rebuild(self, updater, fetched_prices: dict, spikes: frozenset, reason: str) -> bool:
+        """
+        Rebuilds and pushes the tariff of a site, a failure is retried on the next poll.
+        :return: Whether the rebuild succeeded.
+        """
+        logger.info(
+            "Rebuilding the tariff of site %s (%s), %s spike slot(s)",
+            updater.site,
+            reason,
+            len(spikes),
+        )
+        metrics.watch_rebuilds_total.inc(reason=reason)
+        try:
+            updater.run(fetched_prices=fetched_prices)
+        except Exception:
+            logger.exception("Error updating site %s", updater.site)
+            return False
+        self._pushed_spikes[updater.site] = spikes
+        self._rebuilt_at[updater.site] = self._clock()
+        return True
+
+    def _rebuild_all(self, rebuilds: List[tuple]) -> List[str]:
+        """
+        Rebuilds the tariffs of several sites, see _rebuild().
+        :param rebuilds: (updater, fetched prices, spike slots, reason) of each site.
+        :return: Names of the sites whose tariff was rebuilt.
+        """
+        if not rebuilds:
+            return []
+        succeeded = self._map(self._rebuild, *zip(*rebuilds))
+        return [rebuild[0].site for rebuild, success in zip(rebuilds, succeeded) if success]
+
+    def poll_once(self) -> List[str]:
+        """
+        Polls every site once, and rebuilds the tariffs that need it.
+        :return: Names of the sites whose tariff was rebuilt.
+        """
+        polls = self._map(self._poll, self.updaters)
+        now = self._clock()
+        rebuilds = []
+        changed_updaters = []
+        for updater, polled in zip(self.updaters, polls):
+            if polled is None:
+                continue
+            fetched_prices, spikes = polled
+            reason = self._rebuild_reason(updater.site, spikes, now)
+            if reason == REBUILD_SPIKES:
+                changed_updaters.append(updater)
+            elif reason is not None:
+                rebuilds.append((updater, fetched_prices, spikes, reason))
+        rebuilt_sites = self._rebuild_all(rebuilds)
+
+        if changed_updaters:
+            logger.info(
+                "Spike slots changed for %s site(s), confirming in %.0fs",
+                len(changed_updaters),
+                self.debounce_seconds,
+            )
+            self._sleep(self.debounce_seconds)
+        confirmed = []
+        for updater, polled in zip(changed_updaters, self._map(self._poll, changed_updaters)):
+            if polled is None:
+                continue
+            fetched_prices, spikes = polled
+            if spikes == self._pushed_spikes[updater.site]:
+                logger.info("Spike slots of site %s reverted, nothing to push", updater.site)
+                continue
+            confirmed.append((updater, fetched_prices, spikes, REBUILD_SPIKES))
+        rebuilt_sites += self._rebuild_all(confirmed)
+
+        metrics.write_textfile()
+        return rebuilt_sites
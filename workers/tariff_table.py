@@ -0,0 +1,82 @@
+import json
+import tomllib
+from typing import List
+
+from slot_grid import MINUTES_PER_DAY
+
+
+class TariffTable:
+    """
+    A time-of-day tariff compiled into dense per-minute buy and sell price tables.
+
+    Tariff files (JSON or TOML) describe a default price and a list of time bands for
+    each of "buy" and "sell". Bands are listed by priority: when bands overlap, the first
+    matching band wins. A band runs from its "from" time up to, but excluding, its "to" time.
+
+        {
+          "name": "Globird ZEROHERO",
+          "buy": {
+            "default": 0.31,
+            "bands": [{"from": "18:00", "to": "20:00", "price": 1.50}, ...]
+          },
+          "sell": {...}
+        }
+    """
+
+    def __init__(self, name: str, buy_prices: List[float], sell_prices: List[float]):
+        """
+        :param name: Name of the tariff.
+        :param buy_prices: Buy price for every minute of the day.
+        :param sell_prices: Sell price for every minute of the day.
+        """
+        self.name = name
+        self.buy_prices = buy_prices
+        self.sell_prices = sell_prices
+
+    @classmethod
+    def load(cls, path: str) -> "TariffTable":
+        """
+        Loads and compiles a tariff file.
+        :param path: Path to a .json or .toml tariff file.
+        """
+        if path.endswith(".toml"):
+            with open(path, "rb") as file:
+                config = tomllib.load(file)
+        else:
+            with open(path, "r") as file:
+                config = json.load(file)
+        return cls(
+            name=config.get("name", ""),
+            buy_prices=cls._compile(config["buy"]),
+            sell_prices=cls._compile(config["sell"]),
+        )
+
+    @staticmethod
+    def _parse_minute(value: str) -> int:
+        """Parses an HH:MM time into a minute of the day, "24:00" being the end of the day."""
+        hours, minutes = value.split(":")
+        minute_of_day = int(hours) * 60 + int(minutes)
+        if not 0 <= minute_of_day <= MINUTES_PER_DAY:
+            raise ValueError(f"Invalid tariff time: {value}")
+        return minute_of_day
+
+    @classmethod
+    def _compile(cls, schedule: dict) -> List[float]:
+        """Compiles a default price and prioritized bands into a per-minute price table."""
+        prices = [float(schedule["default"])] * MINUTES_PER_DAY
+        # Paint the lowest priority bands first so that earlier bands overwrite them
+        for band in reversed(schedule.get("bands", [])):
+            start = cls._parse_minute(band["from"])
+            end = cls._parse_minute(band["to"])
+            if end <= start:
+                raise ValueError(f"Tariff band must end after it starts: {band}")
+            prices[start:end] = [float(band["price"])] * (end - start)
+        return prices
+
+    def buy_price(self, minute_of_day: int) -> float:
+        """Returns the buy price at the given minute of the day."""
+        return self.buy_prices[minute_of_day]
+
+    def sell_price(self, minute_of_day: int) -> float:
+        """Returns the sell price at the given minute of the day."""
+        return self.sell_prices[minute_of_day]
@@ -1,20 +1,48 @@
-import requests
+import hashlib
+import json
 import os
+import time
 
 from tesla_tou_settings import TimeOfUseSettings
-from app_logger import logger
+from app_logger import DecodedText, logger
+from file_cache import FileCache
+from http_client import HttpClient
+import metrics
+from rate_limiter import shared_rate_limiter
+import tou_serializer
 
 AUDIENCE = "https://fleet-api.prd.na.vn.cloud.tesla.com"
 CALLBACK_URL = "https://pow.coldzee.win/oauth_redirect"
 TOKEN_EXCHANGE_URL = "https://fleet-auth.prd.vn.cloud.tesla.com/oauth2/v3/token"
+# Access tokens are refreshed this many seconds before they actually expire
+ACCESS_TOKEN_EXPIRY_MARGIN_SECONDS = 300
+# (connect, read) timeouts in seconds for each Fleet API endpoint
+TIMEOUTS = {
+    "token": (5, 15),
+    "products": (5, 20),
+    "time_of_use_settings": (5, 30),
+}
+
+
+class EnergySiteNotFoundError(RuntimeError):
+    """Raised when Tesla rejects a request for an energy site with 403 or 404."""
 
 
 class TeslaClient:
 
-    def __init__(self):
+    def __init__(
+        self,
+        site: str | None = None,
+        refresh_token_file: str | None = None,
+        energy_site_id: str | None = None,
+    ):
         """
         Initializes the TeslaClient instance.
         Reads TESLA_CLIENT_ID and TESLA_CLIENT_SECRET from environment variables.
+        :param site: Name of the site, keeps the state files of several sites apart.
+        :param refresh_token_file: Refresh token of the site's Tesla account,
+            defaults to AUTH_DIR/tesla_refresh_token.txt.
+        :param energy_site_id: Energy site to update, defaults to the first one of the account.
         """
         self.client_id = os.getenv("TESLA_CLIENT_ID")
         self.client_secret = os.getenv("TESLA_CLIENT_SECRET")
@@ -23,7 +51,32 @@ class TeslaClient:
                 "TESLA_CLIENT_ID and TESLA_CLIENT_SECRET must be set in environment variables."
             )
 
+        # Overridable to point the client at a stand-in server, e.g. servers/fake_providers.py
+        self.api_base_url = os.getenv("TESLA_API_BASE_URL", AUDIENCE).rstrip("/")
+        self.token_url = os.getenv("TESLA_TOKEN_URL", TOKEN_EXCHANGE_URL)
+
         self.auth_dir = os.getenv("AUTH_DIR", "/app/auth")
+        state_suffix = f"_{site}" if site else ""
+        self.refresh_token_file = refresh_token_file or os.path.join(
+            self.auth_dir, "tesla_refresh_token.txt"
+        )
+        self.tariff_state_file = os.path.join(
+            self.auth_dir, f"tesla_tariff_state{state_suffix}.json"
+        )
+        self.energy_site_id = energy_site_id
+        # Re-push an unchanged tariff after this many minutes, 0 never forces a re-push
+        self.force_push_minutes = int(os.getenv("TESLA_FORCE_PUSH_MINUTES", 0))
+
+        # The limiter is shared, so that all sites together stay within the Fleet API limits
+        self._http = HttpClient(timeouts=TIMEOUTS, rate_limiter=shared_rate_limiter())
+        self._access_token: str | None = None
+        self._access_token_expires_at = 0.0
+
+        # The energy site ID never changes, so it is only rediscovered after the TTL or a 403/404
+        self._site_cache = FileCache(
+            os.path.join(self.auth_dir, f"tesla_energy_site{state_suffix}.json"),
+            ttl_seconds=float(os.getenv("TESLA_SITE_CACHE_TTL_HOURS", 24)) * 3600,
+        )
 
     def read_file(self, file_path: str) -> str:
         """
@@ -55,50 +108,135 @@ class TeslaClient:
         """
         Updates the time of use settings for Tesla's energy site.
         :param time_of_use_settings: TimeOfUseSettings object containing the settings to update.
-        :return: Response from the API or None if an error occurs.
+        :return: Response from the API, or None if the update was skipped or failed.
+        """
+        tariff_hash = self.tariff_hash(time_of_use_settings)
+        if not self.should_push(tariff_hash):
+            logger.info("Time of use settings unchanged (%s), skipping update", tariff_hash[:12])
+            metrics.pushes_skipped_total.inc()
+            return None
+
+        energy_site_id = self.get_energy_site_id()
+        logger.debug("Energy site ID: %s", energy_site_id)
+        if not energy_site_id:
+            logger.error("No energy site found, skipping update")
+            return
+
+        try:
+            updated_response = self.post_time_of_use_settings(
+                time_of_use_settings, energy_site_id
+            )
+        except EnergySiteNotFoundError as e:
+            # The cached site may have been removed or transferred, rediscover it once
+            logger.warning("%s, refreshing the energy site ID", e)
+            energy_site_id = self.get_energy_site_id(refresh=True)
+            if not energy_site_id:
+                logger.error("No energy site found, skipping update")
+                return
+            try:
+                updated_response = self.post_time_of_use_settings(
+                    time_of_use_settings, energy_site_id
+                )
+            except EnergySiteNotFoundError as e:
+                logger.error("Error posting time of use settings: %s", e)
+                updated_response = None
+        logger.info("Updated time of use settings: %s", updated_response)
+        if updated_response is not None:
+            self.save_pushed_tariff(tariff_hash)
+        return updated_response
+
+    @staticmethod
+    def tariff_hash(time_of_use_settings: TimeOfUseSettings) -> str:
+        """
+        Computes a canonical content hash of the tariff_content_v2 payload.
+        :param time_of_use_settings: TimeOfUseSettings object to hash.
+        :return: Hex encoded SHA-256 digest.
         """
+        canonical_json = tou_serializer.to_json_bytes(time_of_use_settings, sort_keys=True)
+        return hashlib.sha256(canonical_json).hexdigest()
 
-        products = self.get_products()
-        logger.debug(f"Products: {products}")
+    def should_push(self, tariff_hash: str) -> bool:
+        """
+        Checks whether the tariff differs from the last one pushed, or is due a forced re-push.
+        :param tariff_hash: Hash of the tariff about to be pushed.
+        """
+        try:
+            state = json.loads(self.read_file(self.tariff_state_file))
+        except (RuntimeError, ValueError):
+            return True
 
-        energy_site_id = self.find_energy_site_id(products)
-        logger.debug(f"Energy site ID: {energy_site_id}")
+        if state.get("hash") != tariff_hash:
+            return True
+        if self.force_push_minutes > 0:
+            age_seconds = time.time() - state.get("pushed_at", 0)
+            return age_seconds >= self.force_push_minutes * 60
+        return False
 
-        updated_response = self.post_time_of_use_settings(
-            time_of_use_settings, energy_site_id
+    def save_pushed_tariff(self, tariff_hash: str):
+        """
+        Records the hash of the tariff that was successfully pushed.
+        :param tariff_hash: Hash of the pushed tariff.
+        """
+        self.write_file(
+            self.tariff_state_file,
+            json.dumps({"hash": tariff_hash, "pushed_at": time.time()}),
         )
-        logger.info(f"Updated time of use settings: {updated_response}")
 
-    def find_energy_site_id(self, products: list) -> str:
-        for product in products:
-            if product.get("device_type") == "energy":
-                energy_site_id = product.get("energy_site_id")
-                if energy_site_id:
-                    logger.debug(f"Found energy site ID: {energy_site_id}")
-                    return energy_site_id
+    def get_energy_site_id(self, refresh: bool = False) -> str | None:
+        """
+        Returns the energy site ID, from the on-disk cache when possible.
+        :param refresh: Ignore the cache and look the site up from the products again.
+        :return: The configured energy site ID, else the first one of the account, or None
+            if there is none.
+        """
+        if self.energy_site_id:
+            return self.energy_site_id
+        energy_site_ids = None if refresh else self._site_cache.get()
+        if not energy_site_ids:
+            products = self.get_products()
+            logger.debug("Products: %s", products)
+            energy_site_ids = self.find_energy_site_ids(products or [])
+            if energy_site_ids:
+                self._site_cache.set(energy_site_ids)
+            else:
+                self._site_cache.invalidate()
+        return energy_site_ids[0] if energy_site_ids else None
+
+    def find_energy_site_ids(self, products: list) -> list:
+        """
+        Finds the IDs of all energy products in the account.
+        :param products: List of products returned by get_products().
+        """
+        energy_site_ids = [
+            product.get("energy_site_id")
+            for product in products
+            if product.get("device_type") == "energy" and product.get("energy_site_id")
+        ]
+        logger.debug("Found energy site IDs: %s", energy_site_ids)
+        return energy_site_ids
 
     def get_products(self):
         """
         Retrieves products from Tesla's API.
         :return: List of products or None if an error occurs.
         """
-        access_token = self.exchange_tokens()
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        }
-        url = f"{AUDIENCE}/api/1/products"
+        # Imported on use, so that runs skipping the push never load requests
+        import requests
+
+        url = f"{self.api_base_url}/api/1/products"
 
         try:
-            response = requests.get(url, headers=headers)
+            with metrics.timed("product_lookup"):
+                response = self._authorized_request("products", "GET", url, idempotent=True)
             logger.debug(
-                f"Retrieved products: {response.status_code} - {response.text}"
+                "Retrieved products: %s - %s", response.status_code, DecodedText(response.content)
             )
 
             response.raise_for_status()  # Raise an exception for HTTP errors
             return response.json()["response"]
         except requests.exceptions.RequestException as e:
-            print(f"Error retrieving products: {e}")
+            metrics.api_errors_total.inc(api="tesla")
+            logger.error("Error retrieving products: %s", e)
             return None
 
     def post_time_of_use_settings(
@@ -110,56 +248,108 @@ class TeslaClient:
         Posts time of use settings to Tesla's API.
         :param time_of_use_settings: Dictionary containing time of use settings.
         :return: Response from the API.
+        :raises EnergySiteNotFoundError: If Tesla rejects the energy site with 403 or 404.
         """
-        access_token = self.exchange_tokens()
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        }
-        url = f"{AUDIENCE}/api/1/energy_sites/{energy_site_id}/time_of_use_settings"
+        import requests
 
-        tou_settings_json = {
-            "tou_settings": {"tariff_content_v2": time_of_use_settings.to_dict()}
-        }
-        logger.debug(f"Posting time of use settings: {tou_settings_json}")
+        url = f"{self.api_base_url}/api/1/energy_sites/{energy_site_id}/time_of_use_settings"
+
+        with metrics.timed("serialization"):
+            tou_settings_json = tou_serializer.dumps(
+                {"tou_settings": {"tariff_content_v2": tou_serializer.to_dict(time_of_use_settings)}}
+            )
+        logger.debug("Posting time of use settings: %s", DecodedText(tou_settings_json))
 
         try:
-            response = requests.post(url, headers=headers, json=tou_settings_json)
+            # Posting the same settings twice is harmless, so the POST may be retried
+            with metrics.timed("tou_post"):
+                response = self._authorized_request(
+                    "time_of_use_settings",
+                    "POST",
+                    url,
+                    idempotent=True,
+                    data=tou_settings_json,
+                )
             logger.debug(
-                f"Posted time of use settings: {response.status_code} - {response.text}"
+                "Posted time of use settings: %s - %s",
+                response.status_code,
+                DecodedText(response.content),
             )
+            if response.status_code in (403, 404):
+                metrics.api_errors_total.inc(api="tesla")
+                self._site_cache.invalidate()
+                raise EnergySiteNotFoundError(
+                    f"Energy site {energy_site_id} rejected with {response.status_code}"
+                )
             response.raise_for_status()  # Raise an exception for HTTP errors
 
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Error posting time of use settings: {e}")
+            metrics.api_errors_total.inc(api="tesla")
+            logger.error("Error posting time of use settings: %s", e)
             return None
 
-    def exchange_tokens(self) -> tuple[str, str]:
+    def _authorized_request(self, endpoint: str, method: str, url: str, **kwargs):
         """
-        Exchanges the authorization code for access and refresh tokens.
-        Reads the authorization code from /app/auth/tesla_refresh_token.txt
-        and makes a POST request to Tesla's OAuth2 token endpoint.
-        Extracts access_token and refresh_token from the response.
+        Sends a Fleet API request with the access token. A 401 means the cached token was
+        revoked or rotated before its expiry, so it is dropped and the request is sent once
+        more with a freshly exchanged token.
+        :param endpoint: Short endpoint name, see HttpClient.request().
+        :return: The last response received.
         """
+
+        def send():
+            headers = {
+                "Authorization": f"Bearer {self.exchange_tokens()}",
+                "Content-Type": "application/json",
+            }
+            return self._http.request(endpoint, method, url, headers=headers, **kwargs)
+
+        response = send()
+        if response.status_code == 401:
+            logger.warning(
+                "%s request was rejected with 401, refreshing the access token", endpoint
+            )
+            self.invalidate_access_token()
+            response = send()
+        return response
+
+    def invalidate_access_token(self):
+        """Drops the cached access token, so the next request exchanges a new one."""
+        self._access_token = None
+        self._access_token_expires_at = 0.0
+
+    def exchange_tokens(self) -> str:
+        """
+        Returns a valid access token, refreshing it only when the cached one is about to expire.
+        On refresh, reads the refresh token from /app/auth/tesla_refresh_token.txt, makes a POST
+        request to Tesla's OAuth2 token endpoint and stores the rotated refresh token.
+        """
+        if self._access_token and time.time() < self._access_token_expires_at:
+            logger.debug("Using cached access token")
+            return self._access_token
+
         logger.debug("Exchanging tokens")
-        auth_code = self.read_file(
-            os.path.join(self.auth_dir, "tesla_refresh_token.txt")
-        )
-        access_token, refresh_token = self.exchange_refresh_token(auth_code)
+        token_file = self.refresh_token_file
+        auth_code = self.read_file(token_file)
+        access_token, refresh_token, expires_in = self.exchange_refresh_token(auth_code)
 
-        self.write_file(
-            os.path.join(self.auth_dir, "tesla_refresh_token.txt"), refresh_token
+        self._access_token = access_token
+        # Refresh slightly before the expiry so a token never expires mid-request
+        self._access_token_expires_at = (
+            time.time() + max(0, expires_in - ACCESS_TOKEN_EXPIRY_MARGIN_SECONDS)
         )
+        if refresh_token and refresh_token != auth_code:
+            self.write_file(token_file, refresh_token)
         return access_token
 
-    def exchange_refresh_token(self, refresh_token: str) -> tuple[str, str]:
+    def exchange_refresh_token(self, refresh_token: str) -> tuple[str, str, int]:
         """
-        Exchanges the authorization code for access and refresh tokens.
-        Reads the authorization code from /app/auth/tesla_refresh_token.txt
-        and makes a POST request to Tesla's OAuth2 token endpoint.
-        Extracts access_token and refresh_token from the response.
+        Exchanges the refresh token for access and refresh tokens.
+        Makes a POST request to Tesla's OAuth2 token endpoint.
+        Extracts access_token, refresh_token and expires_in from the response.
         """
+        import requests
 
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         data = {
@@ -167,17 +357,28 @@ class TeslaClient:
             "client_id": self.client_id,
             "refresh_token": refresh_token,
         }
-        logger.debug(f"Exchanging for tokens with data: {data} and headers: {headers}")
+        logger.debug("Exchanging for tokens with data: %s and headers: %s", data, headers)
 
         try:
-            response = requests.post(TOKEN_EXCHANGE_URL, headers=headers, data=data)
-            logger.debug(f"Exchanged tokens: {response.status_code} - {response.text}")
+            # Never retried: a refresh token is single use once Tesla has accepted it
+            with metrics.timed("token_exchange"):
+                response = self._http.post(
+                    "token", self.token_url, headers=headers, data=data
+                )
+            logger.debug(
+                "Exchanged tokens: %s - %s", response.status_code, DecodedText(response.content)
+            )
             response.raise_for_status()  # Raise an exception for HTTP errors
             token_data = response.json()
 
-            print("Successfully exchanged code for tokens.")
-            return token_data.get("access_token"), token_data.get("refresh_token")
+            logger.info("Successfully exchanged code for tokens.")
+            return (
+                token_data.get("access_token"),
+                token_data.get("refresh_token"),
+                int(token_data.get("expires_in", 0)),
+            )
         except requests.exceptions.RequestException as e:
+            metrics.api_errors_total.inc(api="tesla")
             raise RuntimeError(
                 f"Error during token exchange: {e} - {e.response.text if e.response else ''}"
             )
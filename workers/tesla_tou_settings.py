@@ -1,11 +1,10 @@
 from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional
-from dataclasses_json import dataclass_json
+from lazy_json import LazyDataClassJsonMixin
 
 
-@dataclass_json
 @dataclass
-class TouPeriod:
+class TouPeriod(LazyDataClassJsonMixin):
     fromDayOfWeek: int
     fromHour: int
     fromMinute: int
@@ -14,15 +13,13 @@ class TouPeriod:
     toMinute: int
 
 
-@dataclass_json
 @dataclass
-class TouPeriodContainer:
+class TouPeriodContainer(LazyDataClassJsonMixin):
     periods: List[TouPeriod]
 
 
-@dataclass_json
 @dataclass
-class Season:
+class Season(LazyDataClassJsonMixin):
     fromMonth: int
     fromDay: int
     toMonth: int
@@ -30,28 +27,24 @@ class Season:
     tou_periods: Dict[str, TouPeriodContainer]
 
 
-@dataclass_json
 @dataclass
-class EnergyChargesSeason:
+class EnergyChargesSeason(LazyDataClassJsonMixin):
     rates: Dict[str, float]
 
 
-@dataclass_json
 @dataclass
-class DailyCharge:
+class DailyCharge(LazyDataClassJsonMixin):
     name: str
     amount: float
 
 
-@dataclass_json
 @dataclass
-class DemandChargesSeason:
+class DemandChargesSeason(LazyDataClassJsonMixin):
     rates: Dict[str, Any]
 
 
-@dataclass_json
 @dataclass
-class SellTariff:
+class SellTariff(LazyDataClassJsonMixin):
     min_applicable_demand: float
     monthly_minimum_bill: float
     monthly_charges: float
@@ -67,9 +60,8 @@ class SellTariff:
     name: str
 
 
-@dataclass_json
 @dataclass
-class TimeOfUseSettings:
+class TimeOfUseSettings(LazyDataClassJsonMixin):
     version: int
     monthly_minimum_bill: float
     min_applicable_demand: float
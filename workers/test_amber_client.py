@@ -0,0 +1,240 @@
+import json
+import math
+import os
+from datetime import date, datetime, time, timedelta
+from unittest.mock import Mock
+
+from dateutil import tz
+
+from amber_client import AmberClient
+from simple_price import PRICE_TYPE_CODES, PriceSeries, PriceType, SimplePrice
+from slot_grid import SlotGrid
+import pytest
+
+
+@pytest.fixture
+def amber_client(tmp_path, monkeypatch):
+    monkeypatch.setenv("AUTH_DIR", str(tmp_path))
+    monkeypatch.delenv("AMBER_SITE_ID", raising=False)
+    monkeypatch.setenv("AMBER_API_TOKEN", "token")
+    amber_api = Mock()
+    amber_api.get_sites.return_value = [Mock(id="site-1")]
+    return AmberClient(amber_api=amber_api)
+
+
+def test_site_id_is_cached_on_disk(amber_client, tmp_path):
+    assert amber_client._get_site_id() == "site-1"
+    assert amber_client._get_site_id() == "site-1"
+
+    # A new client, as after a restart, reuses the persisted site ID
+    restarted_client = AmberClient(amber_api=Mock())
+    assert restarted_client._get_site_id() == "site-1"
+
+    assert amber_client._api.get_sites.call_count == 1
+    restarted_client._api.get_sites.assert_not_called()
+
+
+def test_site_id_override_skips_lookup(amber_client, monkeypatch):
+    monkeypatch.setenv("AMBER_SITE_ID", "site-override")
+    client = AmberClient(amber_api=Mock())
+
+    assert client._get_site_id() == "site-override"
+    client._api.get_sites.assert_not_called()
+
+
+def test_filter_forecast_drops_actuals_and_prices_beyond_a_day():
+    start = datetime(2025, 6, 28, 0, 0, tzinfo=tz.tzlocal())
+    prices = PriceSeries.from_prices(
+        SimplePrice(
+            start_time=start + timedelta(minutes=5 * index),
+            period=timedelta(minutes=5),
+            buy_per_kwh=0.3,
+            sell_per_kwh=0.1,
+            price_type=PriceType.ACTUAL if index < 120 else PriceType.FORECAST,
+        )
+        for index in range(600)
+    )
+    now = start + timedelta(minutes=600)
+
+    forecast = AmberClient._filter_forecast(prices, now, SlotGrid(5))
+
+    assert forecast.start_time == now
+    assert len(forecast) == 288
+    assert all(price.price_type == PriceType.FORECAST for price in forecast)
+
+
+@pytest.mark.parametrize("day", [date(2025, 4, 5), date(2025, 10, 4)])
+def test_filter_forecast_keeps_a_wall_clock_day_across_daylight_saving(day):
+    # Daylight saving time ends in Sydney on 2025-04-06 and starts on 2025-10-05
+    sydney = tz.gettz("Australia/Sydney")
+    now = datetime.combine(day, time(12, 0), tzinfo=sydney)
+    # Two days of 5 minute forecast intervals
+    forecast_code = PRICE_TYPE_CODES[PriceType.FORECAST]
+    prices = PriceSeries.from_intervals(
+        [(now.timestamp() + 300 * index, 300, 0.3, 0.1, forecast_code) for index in range(576)],
+        sydney,
+    )
+
+    forecast = AmberClient._filter_forecast(prices, now, SlotGrid(5, sydney))
+
+    # Noon to noon the next day, whether that lasts 23, 24 or 25 hours
+    assert len(forecast) == 288
+    assert forecast[-1].start_time == now + timedelta(days=1) - timedelta(minutes=5)
+
+
+def make_interval(
+    start: datetime, duration: int, price_type: str, spot_per_kwh: float, channel="general"
+) -> dict:
+    return {
+        "type": price_type,
+        "date": start.date().isoformat(),
+        "duration": duration,
+        "startTime": start.isoformat(),
+        "endTime": (start + timedelta(minutes=duration)).isoformat(),
+        "nemTime": (start + timedelta(minutes=duration)).isoformat(),
+        "perKwh": 30.0,
+        "renewables": 10.0,
+        "spotPerKwh": spot_per_kwh,
+        "channelType": channel,
+        "spikeStatus": "none",
+        "descriptor": "neutral",
+        "estimate": True,
+    }
+
+
+def respond_with(amber_client, intervals: list):
+    amber_client._http.get.return_value = Mock(content=json.dumps(intervals).encode())
+
+
+def test_only_current_and_forecast_intervals_are_fetched(amber_client):
+    amber_client._http = Mock()
+    now = datetime.now(tz=tz.tzlocal()).replace(second=0, microsecond=0)
+    current = now - timedelta(minutes=now.minute % 5)
+    respond_with(
+        amber_client,
+        [
+            make_interval(current, 5, PriceType.CURRENT, 10.0),
+            make_interval(current + timedelta(minutes=5), 5, PriceType.FORECAST, 20.0),
+            make_interval(current + timedelta(minutes=10), 5, PriceType.FORECAST, 30.0),
+        ],
+    )
+    amber_client.get_forecast()
+
+    # The first fetch covers the day and the refresh window after it
+    params = amber_client._http.get.call_args.kwargs["params"]
+    assert params["previous"] == 0
+    assert params["next"] == 288 + 12
+
+    # The next fetch only revises the intervals of the refresh window
+    respond_with(
+        amber_client,
+        [
+            make_interval(current, 5, PriceType.CURRENT, 10.0),
+            make_interval(current + timedelta(minutes=5), 5, PriceType.FORECAST, 25.0),
+        ],
+    )
+    forecast = amber_client.get_forecast()
+
+    assert amber_client._http.get.call_args.kwargs["params"]["next"] == 12
+    assert forecast.start_time == current
+    assert list(forecast.sell) == [0.1, 0.25, 0.3]
+
+
+def test_whole_forecast_is_fetched_again_after_the_refresh_window(tmp_path, monkeypatch):
+    monkeypatch.setenv("AUTH_DIR", str(tmp_path))
+    monkeypatch.setenv("AMBER_SITE_ID", "site-1")
+    monkeypatch.setenv("AMBER_API_TOKEN", "token")
+    amber_client = AmberClient()
+    amber_client._http = Mock()
+    now = datetime.now(tz=tz.tzlocal())
+    current = now.replace(second=0, microsecond=0) - timedelta(minutes=now.minute % 5)
+    respond_with(amber_client, [make_interval(current, 5, PriceType.CURRENT, 10.0)])
+    amber_client.get_forecast()
+
+    # The store is persisted, so a restarted client keeps fetching only the refresh window
+    restarted_client = AmberClient()
+    restarted_client._http = Mock()
+    respond_with(restarted_client, [make_interval(current, 5, PriceType.CURRENT, 10.0)])
+    restarted_client.get_forecast()
+    assert restarted_client._http.get.call_args.kwargs["params"]["next"] == 12
+
+    restarted_client._interval_store.full_fetch_epoch -= 3600
+    restarted_client.get_forecast()
+    assert restarted_client._http.get.call_args.kwargs["params"]["next"] == 288 + 12
+
+
+@pytest.mark.parametrize("resolution_minutes", [5, 30])
+def test_intervals_are_fetched_at_5_minutes(tmp_path, monkeypatch, resolution_minutes):
+    monkeypatch.setenv("AUTH_DIR", str(tmp_path))
+    monkeypatch.setenv("AMBER_SITE_ID", "site-1")
+    monkeypatch.setenv("AMBER_API_TOKEN", "token")
+    monkeypatch.delenv("AMBER_FORECAST_INTERVALS", raising=False)
+    monkeypatch.setenv("RESOLUTION", str(resolution_minutes))
+    client = AmberClient()
+    client._http = Mock()
+    respond_with(client, [])
+
+    client.get_forecast()
+
+    # Half hour averages would hide 5 minute spikes, so the slot resolution is not used
+    params = client._http.get.call_args.kwargs["params"]
+    assert params["resolution"] == 5
+    assert params["next"] == 288 + 12
+
+
+def test_parse_intervals_keeps_general_forecasts_within_the_horizon():
+    start = datetime(2025, 6, 28, 12, 0, tzinfo=tz.tzutc())
+    content = json.dumps(
+        [
+            make_interval(start - timedelta(minutes=5), 5, PriceType.ACTUAL, 5.0),
+            make_interval(start, 5, PriceType.CURRENT, 10.0),
+            make_interval(start, 5, PriceType.CURRENT, 10.0, channel="feedIn"),
+            make_interval(start + timedelta(minutes=5), 30, PriceType.FORECAST, 20.0),
+            make_interval(start + timedelta(minutes=35), 30, PriceType.FORECAST, 30.0),
+        ]
+    ).encode()
+
+    intervals = AmberClient._parse_intervals(content, (start + timedelta(minutes=35)).timestamp())
+
+    assert intervals == [
+        (round(start.timestamp()), 300, 0.3, 0.1, 1),
+        (round(start.timestamp()) + 300, 1800, 0.3, 0.2, 2),
+    ]
+
+
+def test_parse_intervals_matches_the_example_forecast():
+    example_path = os.path.join(os.path.dirname(__file__), "examples", "amber_forecast.json")
+    with open(example_path, "rb") as file:
+        content = file.read()
+    raw_intervals = [
+        raw_interval
+        for raw_interval in json.loads(content)
+        if raw_interval["channelType"] == "general" and raw_interval["type"] != PriceType.ACTUAL
+    ]
+
+    prices = PriceSeries.from_intervals(AmberClient._parse_intervals(content, math.inf))
+
+    assert prices.start_time == datetime.fromisoformat(raw_intervals[0]["startTime"])
+    assert sum(raw_interval["duration"] for raw_interval in raw_intervals) == len(prices) * 5
+    assert prices.sell[0] == raw_intervals[0]["spotPerKwh"] / 100.0
+    assert prices.sell[-1] == raw_intervals[-1]["spotPerKwh"] / 100.0
+
+
+def test_forecast_is_skipped_without_api_token(tmp_path, monkeypatch):
+    monkeypatch.setenv("AUTH_DIR", str(tmp_path))
+    monkeypatch.delenv("AMBER_API_TOKEN", raising=False)
+    client = AmberClient()
+
+    assert not client.get_forecast()
+    # The SDK client is only built by the first fetch
+    assert client._amber_api is None
+
+
+def test_sites_share_the_rate_limiter_of_their_amber_token(tmp_path, monkeypatch):
+    monkeypatch.setenv("AUTH_DIR", str(tmp_path))
+    home = AmberClient(site="home", api_token="token-a")
+    office = AmberClient(site="office", api_token="token-a")
+    other_account = AmberClient(site="shed", api_token="token-b")
+
+    assert home._rate_limiter is office._rate_limiter
+    assert home._rate_limiter is not other_account._rate_limiter
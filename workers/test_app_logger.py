@@ -0,0 +1,114 @@
+import gzip
+import json
+import logging
+import queue
+import sys
+from unittest.mock import MagicMock
+
+from app_logger import DecodedText, JsonFormatter, _QueueHandler, _file_handler
+
+
+def make_record(msg, *args, level=logging.INFO, **extra):
+    record = logging.makeLogRecord(
+        {"name": "test", "levelno": level, "levelname": logging.getLevelName(level)}
+    )
+    record.msg = msg
+    record.args = args
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_logs_message_and_extra_fields():
+    record = make_record("Pushed tariff of site %s", "home", site="home", spikes=3)
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["message"] == "Pushed tariff of site home"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "test"
+    assert entry["site"] == "home"
+    assert entry["spikes"] == 3
+    assert "exception" not in entry
+
+
+def test_json_formatter_logs_exception():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord(
+            "test", logging.ERROR, __file__, 1, "Failed", None, sys.exc_info()
+        )
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_queue_handler_merges_arguments_when_the_record_is_queued():
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    prices = [1, 2]
+
+    handler.handle(make_record("Prices: %s", prices))
+    prices.append(3)
+
+    queued = log_queue.get_nowait()
+    assert queued.msg == "Prices: [1, 2]"
+    assert queued.args is None
+
+
+def test_queue_handler_leaves_formatting_to_the_listener():
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = make_record("Pushed %s slots in %.1fs", 12, 0.25, level=logging.ERROR)
+        record.exc_info = sys.exc_info()
+
+    handler.handle(record)
+
+    queued = log_queue.get_nowait()
+    assert queued is not record
+    assert queued.msg == "Pushed %s slots in %.1fs"
+    assert queued.args == (12, 0.25)
+    assert queued.exc_text is None
+    assert queued.getMessage() == "Pushed 12 slots in 0.2s"
+
+
+def test_decoded_text_logs_bytes_as_text():
+    record = make_record("Response: %s", DecodedText(b'{"response": "ok"}'))
+
+    assert record.getMessage() == 'Response: {"response": "ok"}'
+
+
+def test_disabled_level_never_formats_arguments():
+    logger = logging.getLogger("test_app_logger.disabled")
+    logger.setLevel(logging.INFO)
+    handler = _QueueHandler(queue.SimpleQueue())
+    logger.addHandler(handler)
+    argument = MagicMock()
+    try:
+        logger.debug("Prices: %s", argument)
+    finally:
+        logger.removeHandler(handler)
+
+    argument.__str__.assert_not_called()
+
+
+def test_rotated_log_files_are_compressed(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_MAX_BYTES", "100")
+    monkeypatch.setenv("LOG_BACKUP_COUNT", "2")
+    monkeypatch.delenv("LOG_ROTATE_WHEN", raising=False)
+    path = tmp_path / "logs" / "price_updater.log"
+    handler = _file_handler(str(path))
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    try:
+        for index in range(10):
+            handler.handle(make_record("line %s %s", index, "x" * 40))
+    finally:
+        handler.close()
+
+    rotated = sorted(path.parent.glob("price_updater.log.*.gz"))
+    assert [file.name for file in rotated] == ["price_updater.log.1.gz", "price_updater.log.2.gz"]
+    assert gzip.decompress(rotated[0].read_bytes()).decode().startswith("line ")
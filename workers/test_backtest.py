@@ -0,0 +1,93 @@
+import json
+import os
+
+import numpy as np
+from dateutil import tz
+
+import backtest
+from globird_client import DEFAULT_TARIFF_FILE
+from tariff_table import TariffTable
+import pytest
+
+EXAMPLE_FILE = os.path.join(os.path.dirname(__file__), "examples", "amber_forecast.json")
+SYDNEY = tz.gettz("Australia/Sydney")
+
+
+def make_market(amber_sell: list, start_epoch: int = 1751032800) -> dict:
+    # 2025-06-28 00:00 in Sydney
+    start_epochs = start_epoch + np.arange(len(amber_sell), dtype=np.int64) * 300
+    return backtest.build_market(
+        start_epochs, np.array(amber_sell), TariffTable.load(DEFAULT_TARIFF_FILE), SYDNEY
+    )
+
+
+def test_load_forecast_files_prefers_shorter_intervals(tmp_path):
+    def interval(start_time: str, duration: int, spot_per_kwh: float) -> dict:
+        return {"startTime": start_time, "duration": duration, "spotPerKwh": spot_per_kwh}
+
+    path = tmp_path / "forecast.json"
+    path.write_text(
+        json.dumps(
+            [
+                interval("2025-06-28T00:00:01Z", 30, 10.0),
+                interval("2025-06-28T00:05:01Z", 5, 50.0),
+                interval("2025-06-28T01:00:01Z", 5, 20.0),
+            ]
+        )
+    )
+
+    start_epochs, amber_sell = backtest.load_forecast_files([str(path)])
+
+    assert len(start_epochs) == 13
+    assert start_epochs[1] - start_epochs[0] == 300
+    assert list(amber_sell[:6]) == [0.1, 0.5, 0.1, 0.1, 0.1, 0.1]
+    assert np.isnan(amber_sell[6:12]).all()
+    assert amber_sell[12] == 0.2
+
+
+def test_load_forecast_files_skips_other_channels(tmp_path):
+    def interval(channel_type: str, spot_per_kwh: float) -> dict:
+        return {
+            "startTime": "2025-06-28T00:00:01Z",
+            "duration": 5,
+            "spotPerKwh": spot_per_kwh,
+            "channelType": channel_type,
+        }
+
+    path = tmp_path / "forecast.json"
+    path.write_text(json.dumps([interval("general", 10.0), interval("feedIn", 50.0)]))
+
+    start_epochs, amber_sell = backtest.load_forecast_files([str(path)])
+
+    assert len(start_epochs) == 1
+    assert list(amber_sell) == [0.1]
+
+
+def test_export_is_capped_by_the_battery_per_day():
+    # Two days of 288 slots, each with four spike slots
+    amber_sell = [0.1] * 576
+    for slot in (100, 101, 102, 103, 388, 389, 390, 391):
+        amber_sell[slot] = 2.0
+
+    [result] = backtest.simulate(make_market(amber_sell), np.array([1.5]), 10.0, 2.5)
+
+    # 10kW for 5 minutes is 0.83kWh, so only 3 of the 4 slots fit in 2.5kWh every day
+    assert result["spike_slots"] == 8
+    assert result["exported_kwh"] == pytest.approx(5.0)
+    assert result["revenue"] == pytest.approx(10.0)
+
+
+def test_sweep_runs_the_same_in_worker_processes():
+    start_epochs, amber_sell = backtest.load_forecast_files([EXAMPLE_FILE])
+    market = backtest.build_market(
+        start_epochs, amber_sell, TariffTable.load(DEFAULT_TARIFF_FILE), SYDNEY
+    )
+    thresholds = backtest.parse_thresholds("0.05:0.5:0.05")
+
+    serial_results = backtest.sweep(market, thresholds, 5.0, 13.5, workers=1)
+    parallel_results = backtest.sweep(market, thresholds, 5.0, 13.5, workers=2)
+
+    assert parallel_results == serial_results
+    assert [result["threshold"] for result in serial_results] == list(thresholds)
+    assert all(0.0 <= result["capture"] <= 1.0 for result in serial_results)
+    assert max(result["revenue"] for result in serial_results) > 0
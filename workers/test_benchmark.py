@@ -0,0 +1,47 @@
+import json
+import sys
+
+import benchmark
+import pytest
+
+
+def test_compare_flags_cases_slower_than_the_threshold():
+    baseline = {"fast@5": 1.0, "slow@5": 1.0, "faster@5": 1.0}
+    results = {"fast@5": 1.2, "slow@5": 1.3, "faster@5": 0.5, "new@5": 9.0}
+
+    # 20% slower is within 25%, and cases missing from the baseline are never regressions
+    assert benchmark.compare(results, baseline, 0.25) == ["slow@5"]
+    assert benchmark.compare(results, baseline, 0.1) == ["fast@5", "slow@5"]
+    assert benchmark.compare(results, {}, 0.25) == []
+
+
+def test_machine_tag_does_not_depend_on_the_hostname(monkeypatch):
+    monkeypatch.delenv("BENCHMARK_MACHINE", raising=False)
+    monkeypatch.setattr(benchmark.platform, "node", lambda: "container-a")
+    tag = benchmark.machine_tag()
+    monkeypatch.setattr(benchmark.platform, "node", lambda: "container-b")
+
+    assert benchmark.machine_tag() == tag
+    assert "container" not in tag
+
+    monkeypatch.setenv("BENCHMARK_MACHINE", "NAS")
+    assert benchmark.machine_tag() == f"nas-{tag}"
+
+
+def test_regression_against_the_saved_baseline_fails_the_command(tmp_path, monkeypatch):
+    baseline_path = tmp_path / "baseline.json"
+    # Keeps the quieter log level of the command out of the other tests
+    monkeypatch.setattr(benchmark.logger, "setLevel", lambda level: None)
+    monkeypatch.setattr(sys, "argv", ["benchmark.py", "--save", "--baseline", str(baseline_path)])
+    monkeypatch.setattr(benchmark, "run_benchmarks", lambda repeat: {"case@5": 1.0})
+    benchmark.main()
+    assert json.loads(baseline_path.read_text())["results"] == {"case@5": 1.0}
+
+    monkeypatch.setattr(sys, "argv", ["benchmark.py", "--baseline", str(baseline_path)])
+    monkeypatch.setattr(benchmark, "run_benchmarks", lambda repeat: {"case@5": 1.1})
+    benchmark.main()
+
+    monkeypatch.setattr(benchmark, "run_benchmarks", lambda repeat: {"case@5": 1.5})
+    with pytest.raises(SystemExit) as exit_info:
+        benchmark.main()
+    assert exit_info.value.code == 1
@@ -0,0 +1,80 @@
+import datetime
+import json
+import os
+
+from globird_client import GlobirdClient
+import pytest
+
+
+def legacy_buy_price(time: datetime.time) -> float:
+    if datetime.time(18, 0) <= time < datetime.time(20, 0):
+        return 1.50
+    elif datetime.time(16, 0) <= time < datetime.time(23, 0):
+        return 0.46
+    elif datetime.time(11, 0) <= time < datetime.time(14, 0):
+        return 0.0
+    else:
+        return 0.31
+
+
+def legacy_sell_price(time: datetime.time) -> float:
+    if datetime.time(18, 0) <= time < datetime.time(20, 0):
+        return 0.15
+    elif datetime.time(16, 0) <= time < datetime.time(21, 0):
+        return 0.09
+    elif datetime.time(11, 0) <= time < datetime.time(14, 0):
+        return 0.0
+    elif datetime.time(10, 0) <= time < datetime.time(15, 0):
+        return 0.01
+    else:
+        return 0.05
+
+
+def test_default_tariff_matches_zerohero_schedule(monkeypatch):
+    monkeypatch.delenv("GLOBIRD_TARIFF_FILE", raising=False)
+    monkeypatch.setenv("RESOLUTION", "5")
+
+    prices = GlobirdClient().get_prices()
+
+    for price in prices:
+        time = price.start_time_time()
+        assert price.buy_per_kwh == legacy_buy_price(time)
+        assert price.sell_per_kwh == legacy_sell_price(time)
+
+
+@pytest.mark.parametrize("resolution_minutes", [5, 30])
+def test_get_prices_covers_the_day(monkeypatch, resolution_minutes):
+    monkeypatch.delenv("GLOBIRD_TARIFF_FILE", raising=False)
+    monkeypatch.setenv("RESOLUTION", str(resolution_minutes))
+
+    prices = GlobirdClient().get_prices()
+
+    assert len(prices) == 24 * 60 // resolution_minutes
+    assert prices[0].start_time_time() == datetime.time(0, 0)
+    assert prices[-1].start_time_time() == datetime.time(
+        *divmod(24 * 60 - resolution_minutes, 60)
+    )
+
+
+def test_prices_are_regenerated_when_tariff_file_changes(tmp_path, monkeypatch):
+    tariff_file = tmp_path / "tariff.json"
+    tariff_file.write_text(json.dumps({"buy": {"default": 0.3}, "sell": {"default": 0.05}}))
+    monkeypatch.setenv("GLOBIRD_TARIFF_FILE", str(tariff_file))
+    monkeypatch.setenv("RESOLUTION", "30")
+    client = GlobirdClient()
+
+    first_prices = client.get_prices()
+    assert client.get_prices() is first_prices
+
+    tariff_file.write_text(
+        json.dumps(
+            {
+                "buy": {"default": 0.3, "bands": [{"from": "00:00", "to": "24:00", "price": 0.4}]},
+                "sell": {"default": 0.05},
+            }
+        )
+    )
+    stat = os.stat(tariff_file)
+    os.utime(tariff_file, (stat.st_atime, stat.st_mtime + 10))
+
+    assert {price.buy_per_kwh for price in client.get_prices()} == {0.4}
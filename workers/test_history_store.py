@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+from dateutil import tz
+
+from globird_client import GlobirdClient
+from history_store import AMBER_FORECAST, DECISION, HistoryStore
+from price_updater import PowerwallPriceUpdater
+from simple_price import PriceSeries, PriceType, SimplePrice
+import pytest
+
+START = datetime(2025, 6, 28, 12, 0, tzinfo=tz.tzlocal())
+
+
+def make_prices(start: datetime, sell_prices: list) -> PriceSeries:
+    return PriceSeries.from_prices(
+        SimplePrice(
+            start_time=start + timedelta(minutes=5 * index),
+            period=timedelta(minutes=5),
+            buy_per_kwh=0.3,
+            sell_per_kwh=sell_per_kwh,
+            price_type=PriceType.FORECAST,
+        )
+        for index, sell_per_kwh in enumerate(sell_prices)
+    )
+
+
+@pytest.fixture
+def history_store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"), retention_days=30, compact_after_days=1)
+    yield store
+    store.close()
+
+
+def test_range_query_returns_the_last_revision(history_store):
+    history_store.record_prices(AMBER_FORECAST, "site-1", make_prices(START, [0.1, 0.2, 0.3]), 1)
+    history_store.record_prices(
+        AMBER_FORECAST, "site-1", make_prices(START + timedelta(minutes=5), [0.5, 0.6]), 2
+    )
+    history_store.record_prices(AMBER_FORECAST, "site-2", make_prices(START, [9.0, 9.0, 9.0]), 3)
+
+    prices = history_store.get_prices(
+        AMBER_FORECAST, "site-1", START + timedelta(minutes=5), START + timedelta(hours=1)
+    )
+
+    assert prices.start_time == START + timedelta(minutes=5)
+    assert list(prices.sell) == [0.5, 0.6]
+
+
+def test_tariff_contents_are_stored_once(history_store):
+    history_store.record_tariff("site-1", "hash-1", b"{}", pushed=True, recorded_at=START.timestamp())
+    history_store.record_tariff(
+        "site-1", "hash-1", b"{}", pushed=False, recorded_at=START.timestamp() + 300
+    )
+
+    tariffs = history_store.get_tariffs("site-1", START, START + timedelta(hours=1))
+
+    assert tariffs == [
+        (round(START.timestamp()), "hash-1", True, b"{}"),
+        (round(START.timestamp()) + 300, "hash-1", False, b"{}"),
+    ]
+    assert history_store.get_tariffs(
+        "site-1", START, START + timedelta(hours=1), pushed_only=True
+    ) == tariffs[:1]
+    assert history_store._connection.execute("SELECT COUNT(*) FROM tariff_contents").fetchone() == (1,)
+
+
+def test_compact_keeps_the_last_revision_and_drops_expired_data(history_store):
+    now = START.timestamp()
+    old_start = START - timedelta(days=2)
+    expired_start = START - timedelta(days=31)
+    history_store.record_prices(DECISION, "site-1", make_prices(old_start, [0.1]), now - 3 * 86400)
+    history_store.record_prices(DECISION, "site-1", make_prices(old_start, [0.2]), now - 2 * 86400)
+    history_store.record_prices(DECISION, "site-1", make_prices(expired_start, [0.3]), now - 31 * 86400)
+    history_store.record_prices(DECISION, "site-1", make_prices(START, [0.4]), now - 600)
+    history_store.record_prices(DECISION, "site-1", make_prices(START, [0.5]), now - 300)
+
+    history_store.compact(now=now)
+
+    rows = history_store._connection.execute(
+        "SELECT start_ts, sell FROM prices ORDER BY start_ts, recorded_ts"
+    ).fetchall()
+    assert rows == [
+        (round(old_start.timestamp()), 0.2),
+        (round(START.timestamp()), 0.4),
+        (round(START.timestamp()), 0.5),
+    ]
+
+
+def test_run_records_prices_and_tariff(history_store, monkeypatch, tmp_path):
+    monkeypatch.setenv("METRICS_DIR", str(tmp_path))
+    monkeypatch.setenv("RESOLUTION", "30")
+    monkeypatch.delenv("GLOBIRD_TARIFF_FILE", raising=False)
+    now = datetime.now(tz=tz.tzlocal()).replace(second=0, microsecond=0)
+    tesla_client = Mock()
+    tesla_client.update.return_value = None
+    updater = PowerwallPriceUpdater(
+        globird_client=GlobirdClient(),
+        amber_client=Mock(get_forecast=Mock(return_value=make_prices(now, [0.1] * 12))),
+        tesla_client=tesla_client,
+        history_store=history_store,
+        site="site-1",
+    )
+
+    updater.run()
+
+    day_start = now.replace(hour=0, minute=0)
+    day_end = day_start + timedelta(days=2)
+    assert len(history_store.get_prices(AMBER_FORECAST, "site-1", day_start, day_end)) == 12
+    assert len(history_store.get_prices(DECISION, "site-1", day_start, day_end)) == 48
+    [(_, _, pushed, _)] = history_store.get_tariffs(
+        "site-1", now - timedelta(minutes=1), now + timedelta(days=1)
+    )
+    assert not pushed
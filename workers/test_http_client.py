@@ -0,0 +1,107 @@
+from unittest.mock import Mock
+
+import requests
+
+from http_client import HttpClient, deadline
+import pytest
+
+
+@pytest.fixture
+def http_client(monkeypatch):
+    monkeypatch.setattr("http_client.time.sleep", lambda seconds: None)
+    client = HttpClient(timeouts={"products": (1, 2)}, max_retries=2)
+    client.session.request = Mock()
+    return client
+
+
+def test_idempotent_request_is_retried_on_server_error(http_client):
+    http_client.session.request.side_effect = [
+        Mock(status_code=503),
+        requests.exceptions.ConnectionError("reset"),
+        Mock(status_code=200),
+    ]
+
+    response = http_client.get("products", "https://example.com/products")
+
+    assert response.status_code == 200
+    assert http_client.session.request.call_count == 3
+    assert http_client.session.request.call_args.kwargs["timeout"] == (1, 2)
+    assert len(http_client.latencies["products"]) == 3
+
+
+def test_non_idempotent_request_is_not_retried(http_client):
+    http_client.session.request.side_effect = requests.exceptions.ConnectionError("reset")
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http_client.post("token", "https://example.com/token")
+
+    assert http_client.session.request.call_count == 1
+
+
+def test_retries_are_bounded(http_client):
+    http_client.session.request.return_value = Mock(status_code=502)
+
+    response = http_client.get("products", "https://example.com/products")
+
+    assert response.status_code == 502
+    assert http_client.session.request.call_count == 3
+
+
+def test_rate_limited_request_is_resent_after_retry_after(http_client, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("http_client.time.sleep", sleeps.append)
+    http_client.session.request.side_effect = [
+        Mock(status_code=429, headers={"Retry-After": "7"}),
+        Mock(status_code=200),
+    ]
+
+    response = http_client.get("products", "https://example.com/products")
+
+    assert response.status_code == 200
+    assert sleeps == [7.0]
+
+
+def test_rate_limited_non_idempotent_request_is_not_resent(http_client):
+    http_client.rate_limiter = Mock()
+    http_client.session.request.return_value = Mock(
+        status_code=429, headers={"Retry-After": "5"}
+    )
+
+    # The refresh token may already have been rotated, so the exchange is never replayed
+    response = http_client.post("token", "https://example.com/token")
+
+    assert response.status_code == 429
+    assert http_client.session.request.call_count == 1
+    http_client.rate_limiter.block.assert_called_once_with("token", 5.0)
+
+
+def test_rate_limited_request_blocks_the_endpoint(http_client):
+    http_client.rate_limiter = Mock()
+    http_client.session.request.side_effect = [
+        Mock(status_code=429, headers={"Retry-After": "3"}),
+        Mock(status_code=200),
+    ]
+
+    http_client.get("products", "https://example.com/products")
+
+    http_client.rate_limiter.block.assert_called_once_with("products", 3.0)
+    assert http_client.rate_limiter.acquire.call_count == 2
+
+
+def test_requests_give_up_at_the_deadline(http_client, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("http_client.time.monotonic", lambda: clock[0])
+
+    def time_out(*args, **kwargs):
+        clock[0] += 1.0
+        raise requests.exceptions.ReadTimeout("no answer")
+
+    http_client.session.request.side_effect = time_out
+
+    with deadline(1.5):
+        with pytest.raises(requests.exceptions.Timeout):
+            http_client.get("products", "https://example.com/products")
+
+    # The read timeout is shortened to the time left, and no retry is sent past the deadline
+    timeouts = [call.kwargs["timeout"] for call in http_client.session.request.call_args_list]
+    assert timeouts == [(1, 1.5), (0.5, 0.5)]
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+WORKERS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Cold-start budget of the entry point, overridable for slow machines
+IMPORT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", 350))
+# Heavy dependencies only imported by the code paths using them
+LAZY_MODULES = ("amberelectric", "pydantic", "requests", "dataclasses_json", "marshmallow")
+
+
+def import_time_ms(module: str) -> float:
+    """Returns the cumulative import time of a module in a fresh interpreter, per -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=WORKERS_DIR,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        _, cumulative, name = line.rsplit("|", 2)
+        if name.strip() == module:
+            return int(cumulative) / 1000
+    raise AssertionError(f"{module} not found in the import times")
+
+
+def test_price_updater_imports_within_budget():
+    # The best of a few runs, so that a busy machine does not fail the test
+    best_ms = min(import_time_ms("price_updater") for _ in range(3))
+
+    assert best_ms < IMPORT_BUDGET_MS, f"price_updater took {best_ms:.0f}ms to import"
+
+
+def test_heavy_dependencies_are_not_imported_on_start():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, price_updater; "
+            f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        cwd=WORKERS_DIR,
+        check=True,
+    )
+
+    assert result.stdout.strip() == ""
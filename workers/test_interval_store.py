@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+from dateutil import tz
+
+from interval_store import IntervalStore
+from simple_price import PRICE_TYPE_CODES, PriceType
+import pytest
+
+START = datetime(2025, 6, 28, 12, 0, tzinfo=tz.tzlocal())
+START_EPOCH = int(START.timestamp())
+
+
+def make_interval(
+    minutes: int, sell_per_kwh: float, price_type=PriceType.FORECAST, duration: int = 5
+) -> tuple:
+    return (
+        START_EPOCH + minutes * 60,
+        duration * 60,
+        0.3,
+        sell_per_kwh,
+        PRICE_TYPE_CODES[price_type],
+    )
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "amber_intervals.json")
+
+
+def test_merge_replaces_revised_intervals(store_path):
+    store = IntervalStore(store_path)
+    store.merge("site-1", [make_interval(0, 0.1), make_interval(5, 0.2), make_interval(10, 0.3)])
+
+    store.merge("site-1", [make_interval(0, 0.1, PriceType.CURRENT), make_interval(5, 0.5)])
+
+    prices = store.to_price_series(tz.tzlocal())
+    assert prices.start_time == START
+    assert list(prices.sell) == [0.1, 0.5, 0.3]
+    assert prices[0].price_type == PriceType.CURRENT
+
+
+def test_merge_replaces_overlapped_longer_intervals(store_path):
+    store = IntervalStore(store_path)
+    store.merge("site-1", [make_interval(0, 0.1), make_interval(5, 0.2, duration=30)])
+
+    # The half hour from 12:05 is now forecast as 5 minute intervals, up to 12:15
+    store.merge("site-1", [make_interval(0, 0.1), make_interval(5, 0.4), make_interval(10, 0.5)])
+
+    prices = store.to_price_series(tz.tzlocal())
+    assert list(prices.sell) == [0.1, 0.4, 0.5]
+
+
+def test_prune_drops_ended_intervals(store_path):
+    store = IntervalStore(store_path)
+    store.merge("site-1", [make_interval(0, 0.1), make_interval(5, 0.2), make_interval(10, 0.3)])
+
+    store.prune(START + timedelta(minutes=7))
+
+    prices = store.to_price_series(tz.tzlocal())
+    assert prices.start_time == START + timedelta(minutes=5)
+    assert list(prices.sell) == [0.2, 0.3]
+
+
+def test_intervals_are_persisted(store_path):
+    store = IntervalStore(store_path)
+    store.merge("site-1", [make_interval(0, 0.1), make_interval(5, 0.2)], START.timestamp())
+    store.save()
+
+    reloaded_store = IntervalStore(store_path)
+
+    assert reloaded_store.site_id == "site-1"
+    assert reloaded_store.full_fetch_epoch == START.timestamp()
+    assert reloaded_store.intervals == store.intervals
+
+
+def test_intervals_of_another_site_are_dropped(store_path):
+    store = IntervalStore(store_path)
+    store.merge("site-1", [make_interval(0, 0.1)], START.timestamp())
+
+    store.merge("site-2", [make_interval(5, 0.2)])
+
+    assert list(store.to_price_series(tz.tzlocal()).sell) == [0.2]
+    # The forecast of the new site was never fetched whole
+    assert store.full_fetch_epoch == 0.0
+
+
+def test_unreadable_store_starts_empty(store_path):
+    with open(store_path, "w") as file:
+        file.write("not json")
+
+    assert IntervalStore(store_path).intervals == {}
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from load_test import percentile, write_roster
+from multi_site import load_sites
+
+
+def test_percentile_nearest_rank():
+    values = [float(value) for value in range(1, 101)]
+
+    assert percentile(values, 0.5) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile(values, 1.0) == 100.0
+    assert percentile([3.0], 0.9) == 3.0
+
+
+def test_write_roster_gives_every_site_its_own_accounts(tmp_path):
+    sites = load_sites(write_roster(str(tmp_path), 3))
+
+    assert [site.name for site in sites] == ["site0000", "site0001", "site0002"]
+    assert len({site.amber_api_token for site in sites}) == 3
+    with open(sites[1].tesla_refresh_token_file) as file:
+        assert file.read() == "refresh-site0001"
+
+
+def test_load_test_runs_against_fake_providers():
+    pytest.importorskip("flask")
+    result = subprocess.run(
+        [
+            sys.executable,
+            os.path.join(os.path.dirname(__file__), "load_test.py"),
+            "--sites",
+            "2",
+            "--rounds",
+            "2",
+            "--latency-ms",
+            "0",
+            "--force-push",
+        ],
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert "4 site updates" in result.stdout
+    assert "0 failed" in result.stdout
+    assert "POST /api/1/energy_sites/<int:energy_site_id>/time_of_use_settings 200: 4" in result.stdout
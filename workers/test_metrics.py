@@ -0,0 +1,61 @@
+from unittest.mock import Mock
+
+from globird_client import GlobirdClient
+import metrics
+from price_updater import PowerwallPriceUpdater
+from simple_price import PriceSeries
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_seconds", "Test.", label_names=("stage",), buckets=(0.1, 1))
+
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+
+    assert histogram.render() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="a",le="0.1"} 1',
+        'test_seconds_bucket{stage="a",le="1"} 2',
+        'test_seconds_bucket{stage="a",le="+Inf"} 2',
+        'test_seconds_sum{stage="a"} 0.55',
+        'test_seconds_count{stage="a"} 2',
+    ]
+
+
+def test_counter_counts_per_label():
+    counter = metrics.Counter("test_total", "Test.", label_names=("api",))
+
+    counter.inc(api="tesla")
+    counter.inc(2, api="tesla")
+    counter.inc(api="amber")
+
+    assert counter.value(api="tesla") == 3
+    assert counter.value(api="amber") == 1
+
+
+def test_timed_observes_the_stage():
+    count = metrics.stage_duration_seconds.count(stage="test_stage")
+
+    with metrics.timed("test_stage"):
+        pass
+
+    assert metrics.stage_duration_seconds.count(stage="test_stage") == count + 1
+
+
+def test_run_writes_the_textfile(monkeypatch, tmp_path):
+    monkeypatch.setenv("METRICS_DIR", str(tmp_path))
+    monkeypatch.setenv("RESOLUTION", "30")
+    monkeypatch.delenv("GLOBIRD_TARIFF_FILE", raising=False)
+    updater = PowerwallPriceUpdater(
+        globird_client=GlobirdClient(),
+        amber_client=Mock(get_forecast=Mock(return_value=PriceSeries.empty())),
+        tesla_client=Mock(),
+    )
+
+    updater.run()
+
+    content = (tmp_path / "price_updater.prom").read_text()
+    assert 'price_updater_stage_duration_seconds_count{stage="merge"}' in content
+    assert 'price_updater_stage_duration_seconds_count{stage="tou_build"}' in content
+    assert 'price_updater_runs_total{outcome="success"}' in content
@@ -0,0 +1,77 @@
+import json
+import threading
+from unittest.mock import Mock
+
+from globird_client import GlobirdClient
+from multi_site import MultiSiteUpdater, SiteConfig, load_sites
+import pytest
+
+
+def test_load_sites(tmp_path):
+    path = tmp_path / "sites.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"name": "home", "tesla_refresh_token_file": "home.txt", "sell_threshold": 2.0},
+                {"name": "cabin", "tesla_refresh_token_file": "cabin.txt", "amber_site_id": "01A"},
+            ]
+        )
+    )
+
+    assert load_sites(str(path)) == [
+        SiteConfig(name="home", tesla_refresh_token_file="home.txt", sell_threshold=2.0),
+        SiteConfig(name="cabin", tesla_refresh_token_file="cabin.txt", amber_site_id="01A"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "raw_sites",
+    [
+        [],
+        [{"name": "home"}],
+        [{"name": "home", "tesla_refresh_token_file": "a.txt", "unknown": 1}],
+        [
+            {"name": "home", "tesla_refresh_token_file": "a.txt"},
+            {"name": "home", "tesla_refresh_token_file": "b.txt"},
+        ],
+    ],
+)
+def test_invalid_rosters_are_rejected(tmp_path, raw_sites):
+    path = tmp_path / "sites.json"
+    path.write_text(json.dumps(raw_sites))
+
+    with pytest.raises(ValueError):
+        load_sites(str(path))
+
+
+def test_failing_site_does_not_stop_the_others():
+    updaters = [Mock(site="home"), Mock(site="cabin"), Mock(site="shed")]
+    updaters[1].run.side_effect = RuntimeError("Tesla is down")
+
+    with pytest.raises(RuntimeError, match="cabin"):
+        MultiSiteUpdater(updaters, max_workers=2).run()
+
+    assert all(updater.run.call_count == 1 for updater in updaters)
+
+
+def test_globird_prices_are_generated_once_for_all_sites(monkeypatch):
+    monkeypatch.setenv("RESOLUTION", "5")
+    monkeypatch.delenv("GLOBIRD_TARIFF_FILE", raising=False)
+    globird_client = GlobirdClient()
+    generate_prices = Mock(wraps=globird_client._generate_prices)
+    monkeypatch.setattr(globird_client, "_generate_prices", generate_prices)
+    barrier = threading.Barrier(4)
+    results = []
+
+    def fetch_prices():
+        barrier.wait()
+        results.append(globird_client.get_prices())
+
+    threads = [threading.Thread(target=fetch_prices) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert generate_prices.call_count == 1
+    assert all(prices is results[0] for prices in results)
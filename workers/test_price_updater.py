@@ -1,7 +1,11 @@
 import json
 import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, date, time
 from dateutil import tz
+from threading import Event
+from time import monotonic
 from unittest.mock import Mock
 
 from tesla_tou_settings import (
@@ -14,8 +18,10 @@ from tesla_tou_settings import (
     TimeOfUseSettings,
     DemandChargesSeason,
 )
+from amber_client import AmberClient
 from price_updater import PowerwallPriceUpdater
-from simple_price import PriceType, SimplePrice
+from simple_price import PriceSeries, PriceType, SimplePrice
+from slot_grid import SlotGrid
 import pytest
 
 
@@ -26,11 +32,11 @@ def mock_clients():
     return globird_client_mock, amber_client_mock
 
 
-def test_build_time_of_use_settings_with_example_data(mock_clients):
+def test_build_time_of_use_settings_with_example_data(mock_clients, monkeypatch):
     globird_client_mock, amber_client_mock = mock_clients
 
     # Set the RESOLUTION environment variable for the test
-    os.environ["RESOLUTION"] = "5"
+    monkeypatch.setenv("RESOLUTION", "5")
 
     today = date.today()
     resolution_minutes = int(os.environ.get("RESOLUTION"))
@@ -71,42 +77,57 @@ def test_build_time_of_use_settings_with_example_data(mock_clients):
 
     # Instantiate PowerwallPriceUpdater with mocked clients
     updater = PowerwallPriceUpdater(
-        globird_client=globird_client_mock, amber_client=amber_client_mock
+        globird_client=globird_client_mock,
+        amber_client=amber_client_mock,
+        tesla_client=Mock(),
     )
 
     # Generate combined prices using the updater's internal logic
     combined_prices = updater._generate_prices()
 
     # Manually construct the expected_tou_settings based on _build_time_of_use_settings logic
-    tou_periods_list = []
+    tou_periods = {}
     buy_rates_dict = {}
     sell_rates_dict = {}
+    last_start_time_str = None
 
     for price in combined_prices:  # Use combined_prices here
         start_time_str = price.start_time.strftime("%H%M")
         end_time_period = price.start_time + price.period
 
-        tou_periods_list.append(
-            TouPeriod(
-                fromDayOfWeek=0,
-                toHour=end_time_period.hour,
-                toDayOfWeek=6,
-                fromHour=price.start_time.hour,
-                fromMinute=price.start_time.minute,
-                toMinute=end_time_period.minute,
-            )
+        # Consecutive slots with the same buy and sell prices are merged into one period
+        if (
+            last_start_time_str is not None
+            and buy_rates_dict[last_start_time_str] == price.buy_per_kwh
+            and sell_rates_dict[last_start_time_str] == price.sell_per_kwh
+        ):
+            last_period = tou_periods[last_start_time_str].periods[0]
+            last_period.toHour = end_time_period.hour
+            last_period.toMinute = end_time_period.minute
+            continue
+
+        tou_periods[start_time_str] = TouPeriodContainer(
+            periods=[
+                TouPeriod(
+                    fromDayOfWeek=0,
+                    toHour=end_time_period.hour,
+                    toDayOfWeek=6,
+                    fromHour=price.start_time.hour,
+                    fromMinute=price.start_time.minute,
+                    toMinute=end_time_period.minute,
+                )
+            ]
         )
         buy_rates_dict[start_time_str] = price.buy_per_kwh
         sell_rates_dict[start_time_str] = price.sell_per_kwh
-
-    tou_period_container = TouPeriodContainer(periods=tou_periods_list)
+        last_start_time_str = start_time_str
 
     main_season = Season(
         fromMonth=1,
         fromDay=1,
         toMonth=12,
         toDay=31,
-        tou_periods={"ALL": tou_period_container},
+        tou_periods=tou_periods,
     )
 
     main_energy_charges_season = EnergyChargesSeason(rates=buy_rates_dict)
@@ -175,5 +196,222 @@ def test_build_time_of_use_settings_with_example_data(mock_clients):
     # Compare the actual result with the expected result
     assert actual_tou_settings == expected_tou_settings
 
-    # Clean up the environment variable
-    del os.environ["RESOLUTION"]
+
+def test_generate_prices_degrades_when_a_source_is_slow(mock_clients, monkeypatch):
+    globird_client_mock, amber_client_mock = mock_clients
+    monkeypatch.setenv("RESOLUTION", "30")
+    monkeypatch.setenv("SOURCE_TIMEOUT_SECONDS", "0.2")
+
+    today = date.today()
+    globird_client_mock.get_prices.return_value = [
+        SimplePrice(
+            start_time=datetime.combine(today, time(0, 0), tzinfo=tz.tzlocal())
+            + timedelta(minutes=30 * slot),
+            period=timedelta(minutes=30),
+            buy_per_kwh=0.25,
+            sell_per_kwh=0.10,
+            price_type=PriceType.ACTUAL,
+        )
+        for slot in range(48)
+    ]
+    slow_source_released = Event()
+    amber_client_mock.get_forecast.side_effect = lambda: slow_source_released.wait(5)
+
+    updater = PowerwallPriceUpdater(
+        globird_client=globird_client_mock,
+        amber_client=amber_client_mock,
+        tesla_client=Mock(),
+    )
+    started = monotonic()
+    prices = updater._generate_prices()
+    elapsed = monotonic() - started
+    slow_source_released.set()
+
+    assert elapsed < 2
+    assert len(prices) == 48
+    assert all(price.sell_per_kwh == 0.10 for price in prices)
+
+
+def test_hung_source_frees_its_worker_for_later_runs(mock_clients, monkeypatch, tmp_path):
+    globird_client_mock, _ = mock_clients
+    monkeypatch.setenv("RESOLUTION", "30")
+    monkeypatch.setenv("AMBER_TIMEOUT_SECONDS", "0.3")
+    monkeypatch.setenv("AUTH_DIR", str(tmp_path))
+    monkeypatch.setenv("AMBER_SITE_ID", "site-1")
+    globird_client_mock.get_prices.return_value = PriceSeries(
+        start_epoch=datetime.combine(date.today(), time(0, 0), tzinfo=tz.tzlocal()).timestamp(),
+        period_seconds=1800,
+        buy=[0.25] * 48,
+        sell=[0.10] * 48,
+        price_type_codes=[0] * 48,
+    )
+    # Accepts connections but never answers them
+    hung_server = socket.create_server(("127.0.0.1", 0))
+    monkeypatch.setenv("AMBER_API_BASE_URL", f"http://127.0.0.1:{hung_server.getsockname()[1]}")
+    amber_client = AmberClient(api_token="hung-token")
+    # A single worker, so a source still holding it would starve the next runs
+    executor = ThreadPoolExecutor(max_workers=1)
+    updater = PowerwallPriceUpdater(
+        globird_client=globird_client_mock,
+        amber_client=amber_client,
+        tesla_client=Mock(),
+        executor=executor,
+    )
+    try:
+        for _ in range(3):
+            started = monotonic()
+            prices = updater._fetch_sources()
+
+            assert monotonic() - started < 2
+            assert len(prices["Globird"]) == 48
+            assert not prices["Amber"]
+    finally:
+        executor.shutdown()
+        amber_client.close()
+        hung_server.close()
+
+
+def reference_merge(globird_prices, amber_prices, resolution_minutes, sell_threshold):
+    """The original per-slot merge loop, used to check the vectorized merge."""
+    globird_prices_map = {p.start_time_time().strftime("%H%M"): p for p in globird_prices}
+    amber_prices_map = {p.start_time_time().strftime("%H%M"): p for p in amber_prices}
+    merged = []
+    for slot in range(24 * 60 // resolution_minutes):
+        key = f"{slot * resolution_minutes // 60:02d}{slot * resolution_minutes % 60:02d}"
+        globird_price = globird_prices_map[key]
+        amber_price = amber_prices_map.get(key)
+        if amber_price and amber_price.sell_per_kwh > sell_threshold:
+            merged.append((globird_price.buy_per_kwh + 1, 1, amber_price.price_type))
+        else:
+            merged.append(
+                (globird_price.buy_per_kwh, globird_price.sell_per_kwh, globird_price.price_type)
+            )
+    return merged
+
+
+@pytest.mark.parametrize("resolution_minutes", [5, 30])
+def test_merge_prices_matches_reference_loop(mock_clients, resolution_minutes):
+    globird_client_mock, amber_client_mock = mock_clients
+    start = datetime.combine(date.today(), time(0, 0), tzinfo=tz.tzlocal())
+
+    globird_prices = [
+        SimplePrice(
+            start_time=start + timedelta(minutes=resolution_minutes * slot),
+            period=timedelta(minutes=resolution_minutes),
+            buy_per_kwh=0.31 + slot / 1000,
+            sell_per_kwh=0.05,
+            price_type=PriceType.ACTUAL,
+        )
+        for slot in range(24 * 60 // resolution_minutes)
+    ]
+    # Amber forecasts 5 minute intervals for the next 24 hours from 13:02, with a spike every
+    # 7th interval, so early slots are filled by tomorrow's forecast
+    forecast_start = start + timedelta(hours=13, seconds=1)
+    amber_prices = [
+        SimplePrice(
+            start_time=forecast_start + timedelta(minutes=5 * interval),
+            period=timedelta(minutes=5),
+            buy_per_kwh=0.2,
+            sell_per_kwh=2.0 if interval % 7 == 0 else 0.1,
+            price_type=PriceType.FORECAST,
+        )
+        for interval in range(288)
+    ]
+
+    updater = PowerwallPriceUpdater(
+        globird_client=globird_client_mock,
+        amber_client=amber_client_mock,
+        tesla_client=Mock(),
+    )
+    merged = updater._merge_prices(
+        globird_prices, amber_prices, SlotGrid(resolution_minutes), 1.5
+    )
+
+    assert [
+        (price.buy_per_kwh, price.sell_per_kwh, price.price_type) for price in merged
+    ] == reference_merge(globird_prices, amber_prices, resolution_minutes, 1.5)
+    assert [(price.start_time.hour, price.start_time.minute) for price in merged] == [
+        divmod(slot * resolution_minutes, 60)
+        for slot in range(24 * 60 // resolution_minutes)
+    ]
+
+
+@pytest.mark.parametrize("resolution_minutes", [5, 30])
+def test_time_of_use_settings_merges_equal_consecutive_slots(
+    mock_clients, monkeypatch, resolution_minutes
+):
+    globird_client_mock, amber_client_mock = mock_clients
+    monkeypatch.setenv("RESOLUTION", str(resolution_minutes))
+    minutes_of_day = range(0, 24 * 60, resolution_minutes)
+    prices = PriceSeries(
+        start_epoch=datetime.combine(date.today(), time(0, 0), tzinfo=tz.tzlocal()).timestamp(),
+        period_seconds=resolution_minutes * 60,
+        # A 1.5 spike from 18:00 to 19:00 on top of a flat 0.3 tariff
+        buy=[1.5 if 18 * 60 <= minute < 19 * 60 else 0.3 for minute in minutes_of_day],
+        sell=[0.05] * len(minutes_of_day),
+        price_type_codes=[0] * len(minutes_of_day),
+    )
+    updater = PowerwallPriceUpdater(
+        globird_client=globird_client_mock,
+        amber_client=amber_client_mock,
+        tesla_client=Mock(),
+    )
+
+    settings = updater._build_time_of_use_settings(prices)
+
+    tou_periods = settings.seasons["ALL"].tou_periods
+    assert list(tou_periods) == ["0000", "1800", "1900"]
+    assert tou_periods["1800"].periods[0] == TouPeriod(
+        fromDayOfWeek=0, fromHour=18, fromMinute=0, toDayOfWeek=6, toHour=19, toMinute=0
+    )
+    assert (tou_periods["1900"].periods[0].toHour, tou_periods["1900"].periods[0].toMinute) == (0, 0)
+    assert settings.energy_charges["ALL"].rates == {"0000": 0.3, "1800": 1.5, "1900": 0.3}
+    assert settings.sell_tariff.energy_charges["ALL"].rates == {
+        "0000": 0.05,
+        "1800": 0.05,
+        "1900": 0.05,
+    }
+    expanded_rates = updater._expand_rates(
+        tou_periods, settings.energy_charges["ALL"].rates, SlotGrid(resolution_minutes)
+    )
+    assert expanded_rates == dict(zip(minutes_of_day, prices.buy))
+
+
+def test_spike_slots_match_the_merged_spikes(mock_clients, monkeypatch):
+    globird_client_mock, amber_client_mock = mock_clients
+    monkeypatch.setenv("RESOLUTION", "30")
+    updater = PowerwallPriceUpdater(
+        globird_client_mock, amber_client_mock, Mock(), sell_threshold=1.5
+    )
+    midnight = datetime.combine(date.today(), time(0, 0), tzinfo=tz.tzlocal())
+    amber_prices = PriceSeries.from_prices(
+        [
+            SimplePrice(
+                start_time=midnight + timedelta(minutes=30 * slot),
+                period=timedelta(minutes=30),
+                buy_per_kwh=0.3,
+                sell_per_kwh=sell_per_kwh,
+                price_type=PriceType.FORECAST,
+            )
+            for slot, sell_per_kwh in enumerate([0.1, 1.6, 1.5, 2.0])
+        ]
+    )
+
+    assert updater.spike_slots(amber_prices) == frozenset({1, 3})
+    assert updater.spike_slots(PriceSeries.empty()) == frozenset()
+
+
+def test_time_of_use_settings_require_prices_on_the_slot_grid(mock_clients, monkeypatch):
+    globird_client_mock, amber_client_mock = mock_clients
+    monkeypatch.setenv("RESOLUTION", "30")
+    prices = PriceSeries(
+        start_epoch=datetime.combine(date.today(), time(0, 0), tzinfo=tz.tzlocal()).timestamp(),
+        period_seconds=300,
+        buy=[0.3] * 288,
+        sell=[0.05] * 288,
+        price_type_codes=[0] * 288,
+    )
+    updater = PowerwallPriceUpdater(globird_client_mock, amber_client_mock, Mock())
+
+    with pytest.raises(ValueError):
+        updater._build_time_of_use_settings(prices)
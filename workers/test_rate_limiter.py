@@ -0,0 +1,103 @@
+import threading
+import time
+from email.utils import formatdate
+
+from rate_limiter import (
+    PRIORITY_ROUTINE,
+    PRIORITY_SPIKE,
+    RateLimiter,
+    parse_limits,
+    parse_retry_after,
+    priority,
+    shared_rate_limiter,
+)
+import pytest
+
+
+def test_burst_is_served_then_requests_are_spaced():
+    # 1200 per minute is one token every 50ms
+    limiter = RateLimiter({"products": (1200, 2)})
+
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire("products")
+
+    assert 0.09 <= time.monotonic() - started < 0.5
+
+
+def test_unknown_endpoints_are_not_limited():
+    limiter = RateLimiter({})
+
+    assert limiter.acquire("anything") == 0.0
+
+
+def test_block_holds_requests_back():
+    limiter = RateLimiter({"products": (6000, 5)})
+    limiter.block("products", 0.2)
+
+    assert limiter.acquire("products") >= 0.19
+
+
+def test_acquire_gives_up_after_its_timeout():
+    limiter = RateLimiter({"products": (6000, 5)})
+    limiter.block("products", 5)
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        limiter.acquire("products", timeout=0.1)
+
+    assert time.monotonic() - started < 1
+    # The timed-out request left the queue, so it does not hold back the next one
+    limiter.block("products", 0)
+    assert limiter._waiters["products"] == []
+
+
+def test_higher_priority_requests_are_served_first():
+    limiter = RateLimiter({"time_of_use_settings": (600, 1)})
+    limiter.acquire("time_of_use_settings")
+    served = []
+
+    def request(name: str, request_priority: int):
+        with priority(request_priority):
+            limiter.acquire("time_of_use_settings")
+        served.append(name)
+
+    routine = threading.Thread(target=request, args=("routine", PRIORITY_ROUTINE))
+    routine.start()
+    # Let the routine request queue up before the spike arrives
+    time.sleep(0.02)
+    spike = threading.Thread(target=request, args=("spike", PRIORITY_SPIKE))
+    spike.start()
+    routine.join()
+    spike.join()
+
+    assert served == ["spike", "routine"]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [(None, 5.0), ("12", 12.0), ("-3", 0.0), ("soon", 5.0)],
+)
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value, default=5.0) == expected
+
+
+def test_parse_retry_after_date():
+    value = formatdate(time.time() + 30, usegmt=True)
+
+    assert 28 <= parse_retry_after(value, default=5.0) <= 30
+
+
+def test_parse_limits():
+    assert parse_limits("products=60/10, token=20") == {
+        "products": (60.0, 10.0),
+        "token": (20.0, 1.0),
+    }
+
+
+def test_shared_limiters_are_kept_per_account():
+    limiter = shared_rate_limiter("token-a")
+
+    assert shared_rate_limiter("token-a") is limiter
+    assert shared_rate_limiter("token-b") is not limiter
+    assert shared_rate_limiter() is shared_rate_limiter(None) is not limiter
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from scheduler import AlignedScheduler
+import pytest
+
+
+def test_next_tick_is_aligned_to_interval():
+    scheduler = AlignedScheduler(lambda: None, interval_minutes=5)
+
+    now = datetime(2025, 6, 28, 10, 7, 12).timestamp()
+    next_tick = datetime.fromtimestamp(scheduler.next_tick(now))
+
+    assert next_tick == datetime(2025, 6, 28, 10, 10)
+
+
+def test_next_tick_on_boundary_moves_to_following_tick():
+    scheduler = AlignedScheduler(lambda: None, interval_minutes=5)
+
+    now = datetime(2025, 6, 28, 10, 10).timestamp()
+    next_tick = datetime.fromtimestamp(scheduler.next_tick(now))
+
+    assert next_tick == datetime(2025, 6, 28, 10, 15)
+
+
+def test_invalid_interval_is_rejected():
+    with pytest.raises(ValueError):
+        AlignedScheduler(lambda: None, interval_minutes=7)
+
+
+def test_run_once_survives_job_failure():
+    calls = []
+
+    def failing_job():
+        calls.append(1)
+        raise RuntimeError("boom")
+
+    AlignedScheduler(failing_job).run_once()
+
+    assert calls == [1]
+
+
+def test_overrunning_job_skips_missed_ticks():
+    now = [datetime(2025, 6, 28, 10, 0).timestamp()]
+    runs = []
+
+    scheduler = None
+
+    def slow_job():
+        runs.append(datetime.fromtimestamp(now[0]))
+        # Each run takes 12 minutes, overrunning two 5 minute ticks
+        now[0] += 12 * 60
+        if len(runs) == 3:
+            scheduler.stop()
+
+    scheduler = AlignedScheduler(slow_job, interval_minutes=5, clock=lambda: now[0])
+    # Make waiting instantaneous by advancing the fake clock to the requested tick
+    scheduler._stop_event.wait = lambda timeout: now.__setitem__(0, now[0] + timeout)
+
+    scheduler.run_forever()
+
+    assert runs == [
+        datetime(2025, 6, 28, 10, 0),
+        datetime(2025, 6, 28, 10, 15),
+        datetime(2025, 6, 28, 10, 30),
+    ]
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+import math
+
+from dateutil import tz
+
+from simple_price import PRICE_TYPE_CODES, PriceSeries, PriceType, SimplePrice
+from slot_grid import SlotGrid
+import pytest
+
+
+def make_prices(start: datetime, count: int, minutes: int = 5):
+    return [
+        SimplePrice(
+            start_time=start + timedelta(minutes=minutes * index),
+            period=timedelta(minutes=minutes),
+            buy_per_kwh=0.2 + index,
+            sell_per_kwh=0.1 + index,
+            price_type=PriceType.CURRENT if index == 0 else PriceType.FORECAST,
+        )
+        for index in range(count)
+    ]
+
+
+def test_price_series_round_trips_simple_prices():
+    prices = make_prices(datetime(2025, 6, 28, 10, 0, tzinfo=tz.tzlocal()), 12)
+
+    series = PriceSeries.from_prices(prices)
+
+    assert len(series) == 12
+    assert series.to_prices() == prices
+    assert series[-1] == prices[-1]
+
+
+def test_price_series_slices_are_contiguous_series():
+    prices = make_prices(datetime(2025, 6, 28, 10, 0, tzinfo=tz.tzlocal()), 12)
+    series = PriceSeries.from_prices(prices)
+
+    sliced = series[3:6]
+
+    assert isinstance(sliced, PriceSeries)
+    assert sliced.to_prices() == prices[3:6]
+    with pytest.raises(ValueError):
+        series[::2]
+
+
+def test_price_series_aligns_to_slots_of_the_day():
+    # 5 minute prices from 23:00 to 00:55 the next day
+    series = PriceSeries.from_prices(
+        make_prices(datetime(2025, 6, 28, 23, 0, tzinfo=tz.tzlocal()), 24)
+    )
+
+    buy, sell, price_type_codes = series.align_to_slots(SlotGrid(30))
+
+    assert len(buy) == 48
+    assert buy[46] == 0.2 and buy[47] == 6.2
+    assert buy[0] == 12.2 and buy[1] == 18.2
+    assert math.isnan(buy[2]) and price_type_codes[2] == -1
+
+
+def test_price_series_expands_longer_periods():
+    start = datetime(2025, 6, 28, 16, 50, tzinfo=tz.tzlocal())
+    prices = make_prices(start, 2) + make_prices(start + timedelta(minutes=10), 2, minutes=30)
+
+    series = PriceSeries.from_prices(prices)
+
+    assert series.period_seconds == 300
+    assert len(series) == 14
+    assert list(series.buy) == [0.2, 1.2] + [0.2] * 6 + [1.2] * 6
+    assert series[2].start_time == start + timedelta(minutes=10)
+    assert series[13].price_type == PriceType.FORECAST
+
+
+def test_price_series_leaves_gaps_missing():
+    start = datetime(2025, 6, 28, 10, 0, tzinfo=tz.tzlocal())
+    prices = make_prices(start, 3)
+    del prices[1]
+
+    series = PriceSeries.from_prices(prices)
+
+    assert len(series) == 3
+    assert math.isnan(series.buy[1])
+    assert series[1].price_type is None
+
+
+@pytest.mark.parametrize("day", [5, 6])
+def test_start_epochs_follow_wall_clock_time(day):
+    # Daylight saving time ends in Sydney on 2025-04-06 at 3AM
+    start = datetime(2025, 4, day, 0, 0, tzinfo=tz.gettz("Australia/Sydney"))
+    series = PriceSeries.from_prices(make_prices(start, 48, minutes=30))
+
+    assert series.start_epochs() == [price.start_time.timestamp() for price in series]
+
+
+@pytest.mark.parametrize("day", [5, 6])
+def test_from_intervals_matches_from_prices(day):
+    sydney = tz.gettz("Australia/Sydney")
+    start = datetime(2025, 4, day, 0, 0, tzinfo=sydney)
+    prices = make_prices(start, 6) + make_prices(start + timedelta(minutes=30), 40, minutes=30)
+    # Start times as the wall-clock times of the same instants, as a fetch would give them
+    for price in prices:
+        price.start_time = datetime.fromtimestamp(price.start_time.timestamp(), tz=sydney)
+
+    series = PriceSeries.from_intervals(
+        (
+            (
+                price.start_time.timestamp(),
+                int(price.period.total_seconds()),
+                price.buy_per_kwh,
+                price.sell_per_kwh,
+                PRICE_TYPE_CODES[price.price_type],
+            )
+            for price in prices
+        ),
+        sydney,
+    )
+    expected = PriceSeries.from_prices(prices)
+
+    assert series.start_epoch == expected.start_epoch
+    assert list(series.buy) == list(expected.buy)
+    assert list(series.price_type_codes) == list(expected.price_type_codes)
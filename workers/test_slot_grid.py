@@ -0,0 +1,70 @@
+from datetime import date, datetime, time, timedelta
+
+from dateutil import tz
+
+from slot_grid import SlotGrid
+import pytest
+
+SYDNEY = tz.gettz("Australia/Sydney")
+
+
+def test_invalid_resolution_is_rejected(monkeypatch):
+    with pytest.raises(ValueError):
+        SlotGrid(7)
+    monkeypatch.setenv("RESOLUTION", "15")
+    with pytest.raises(ValueError):
+        SlotGrid.from_env()
+
+
+@pytest.mark.parametrize(
+    "day",
+    [
+        # Daylight saving time ends in Sydney on 2025-04-06 at 3AM and starts on 2025-10-05 at 2AM
+        date(2025, 4, 6),
+        date(2025, 6, 28),
+        date(2025, 10, 5),
+    ],
+)
+def test_slots_follow_wall_clock_time(day):
+    grid = SlotGrid(30, SYDNEY)
+
+    assert grid.minute_of_day(grid.midnight(day).timestamp()) == 0
+    # 6PM is minute 1080 whatever the length of the day
+    six_pm = datetime.combine(day, time(18, 0), tzinfo=SYDNEY)
+    assert grid.minute_of_day(six_pm.timestamp()) == 18 * 60
+    assert grid.minute_of_day((six_pm + timedelta(minutes=29)).timestamp()) == 18 * 60 + 29
+    # Midnight to 6PM is 18 hours of wall-clock time, even when it lasts 17 or 19 hours
+    assert grid.wall_clock_seconds(six_pm.timestamp()) - grid.wall_clock_seconds(
+        grid.midnight(day).timestamp()
+    ) == 18 * 3600
+
+
+def test_repeated_hour_maps_to_the_same_slots():
+    grid = SlotGrid(5, SYDNEY)
+    # 2:30AM happens twice on 2025-04-06, an hour apart
+    first = datetime(2025, 4, 6, 2, 30, tzinfo=SYDNEY, fold=0).timestamp()
+    second = datetime(2025, 4, 6, 2, 30, tzinfo=SYDNEY, fold=1).timestamp()
+
+    assert second - first == 3600
+    assert grid.minute_of_day(first) == grid.minute_of_day(second) == 150
+
+
+def test_entry_minutes_wrap_around_midnight():
+    grid = SlotGrid(30, SYDNEY)
+    start = datetime(2025, 6, 28, 23, 0, tzinfo=SYDNEY).timestamp()
+
+    assert grid.entry_minutes(start, 1800, 4) == [23 * 60, 23 * 60 + 30, 0, 30]
+
+
+def test_period_names_and_times():
+    grid = SlotGrid(30)
+
+    assert grid.slot_count == 48
+    assert grid.period_seconds == 1800
+    assert [SlotGrid.period_name(minute) for minute in grid.start_minutes()][:3] == [
+        "0000",
+        "0030",
+        "0100",
+    ]
+    assert SlotGrid.period_name(23 * 60 + 30) == "2330"
+    assert SlotGrid.to_time(24 * 60) == time(0, 0)
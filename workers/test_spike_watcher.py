@@ -0,0 +1,116 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import DEFAULT, Mock
+
+import pytest
+
+from spike_watcher import SpikeWatcher
+
+
+def make_updater(site, spike_sets):
+    updater = Mock(site=site)
+    updater._fetch_sources.return_value = {"Globird": [0.2], "Amber": [0.1]}
+    updater.spike_slots.side_effect = [frozenset(spikes) for spikes in spike_sets]
+    return updater
+
+
+@pytest.fixture
+def clock():
+    return Mock(return_value=1_700_000_000.0)
+
+
+def make_watcher(updaters, clock, **kwargs):
+    return SpikeWatcher(
+        updaters, debounce_seconds=5, refresh_minutes=60, clock=clock, sleep=Mock(), **kwargs
+    )
+
+
+def test_first_poll_rebuilds_every_site(clock):
+    updaters = [make_updater("home", [{1}]), make_updater("shed", [set()])]
+    watcher = make_watcher(updaters, clock)
+
+    assert watcher.poll_once() == ["home", "shed"]
+    updaters[0].run.assert_called_once_with(
+        fetched_prices=updaters[0]._fetch_sources.return_value
+    )
+    watcher._sleep.assert_not_called()
+
+
+def test_unchanged_spikes_are_not_pushed(clock):
+    updater = make_updater("home", [{1}, {1}, {1}])
+    watcher = make_watcher([updater], clock)
+    watcher.poll_once()
+
+    assert watcher.poll_once() == []
+    assert watcher.poll_once() == []
+    assert updater.run.call_count == 1
+
+
+def test_changed_spikes_are_confirmed_and_coalesced(clock):
+    # The second poll sees a new spike, and another one appears before the confirmation
+    updater = make_updater("home", [set(), {3}, {3, 4}])
+    watcher = make_watcher([updater], clock)
+    watcher.poll_once()
+
+    assert watcher.poll_once() == ["home"]
+    watcher._sleep.assert_called_once_with(5)
+    assert updater.run.call_count == 2
+    assert watcher._pushed_spikes["home"] == frozenset({3, 4})
+
+
+def test_reverted_spikes_are_not_pushed(clock):
+    updater = make_updater("home", [set(), {3}, set()])
+    watcher = make_watcher([updater], clock)
+    watcher.poll_once()
+
+    assert watcher.poll_once() == []
+    assert updater.run.call_count == 1
+
+
+def test_tariff_is_refreshed_after_the_refresh_interval(clock):
+    updater = make_updater("home", [set(), set(), set()])
+    watcher = make_watcher([updater], clock)
+    watcher.poll_once()
+
+    clock.return_value += 30 * 60
+    assert watcher.poll_once() == []
+    clock.return_value += 30 * 60
+    assert watcher.poll_once() == ["home"]
+
+
+def test_missing_forecast_never_triggers_a_push(clock):
+    updater = make_updater("home", [{1}])
+    watcher = make_watcher([updater], clock)
+    watcher.poll_once()
+
+    updater._fetch_sources.return_value = {"Globird": [0.2], "Amber": []}
+    assert watcher.poll_once() == []
+    assert updater.run.call_count == 1
+
+
+def test_failed_rebuild_is_retried_on_the_next_poll(clock):
+    updater = make_updater("home", [{1}, {1}])
+    updater.run.side_effect = [RuntimeError("push failed"), None]
+    watcher = make_watcher([updater], clock)
+
+    assert watcher.poll_once() == []
+    assert watcher.poll_once() == ["home"]
+    assert updater.run.call_count == 2
+
+
+def test_sites_are_polled_in_the_pool(clock):
+    # Each poll waits for the other site's, which only succeeds if they run concurrently
+    both_polling = threading.Barrier(2, timeout=5)
+
+    def wait_for_the_other_site():
+        both_polling.wait()
+        return DEFAULT
+
+    updaters = [make_updater("home", [{1}]), make_updater("shed", [set()])]
+    for updater in updaters:
+        updater._fetch_sources.side_effect = wait_for_the_other_site
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        watcher = make_watcher(updaters, clock, executor=executor)
+
+        assert watcher.poll_once() == ["home", "shed"]
@@ -0,0 +1,222 @@
+from unittest.mock import Mock
+
+from tesla_client import EnergySiteNotFoundError, TeslaClient
+from tesla_tou_settings import (
+    DailyCharge,
+    DemandChargesSeason,
+    EnergyChargesSeason,
+    Season,
+    SellTariff,
+    TimeOfUseSettings,
+    TouPeriod,
+    TouPeriodContainer,
+)
+import pytest
+
+
+@pytest.fixture
+def tesla_client(tmp_path, monkeypatch):
+    monkeypatch.setenv("TESLA_CLIENT_ID", "client-id")
+    monkeypatch.setenv("TESLA_CLIENT_SECRET", "client-secret")
+    monkeypatch.setenv("AUTH_DIR", str(tmp_path))
+    client = TeslaClient()
+    client.get_products = Mock(
+        return_value=[{"device_type": "energy", "energy_site_id": 42}]
+    )
+    client.post_time_of_use_settings = Mock(return_value={"response": {}})
+    return client
+
+
+def make_settings(rates: dict) -> TimeOfUseSettings:
+    daily_charges = [DailyCharge(name="Daily Charge", amount=1.1)]
+    demand_charges = {"ALL": DemandChargesSeason(rates={})}
+    seasons = {
+        "ALL": Season(
+            fromMonth=1,
+            fromDay=1,
+            toMonth=12,
+            toDay=31,
+            tou_periods={
+                name: TouPeriodContainer(
+                    periods=[
+                        TouPeriod(
+                            fromDayOfWeek=0,
+                            fromHour=int(name[:2]),
+                            fromMinute=int(name[2:]),
+                            toDayOfWeek=6,
+                            toHour=0,
+                            toMinute=0,
+                        )
+                    ]
+                )
+                for name in rates
+            },
+        )
+    }
+    return TimeOfUseSettings(
+        version=1,
+        monthly_minimum_bill=0.0,
+        min_applicable_demand=0.0,
+        max_applicable_demand=0.0,
+        monthly_charges=0.0,
+        utility="Globird",
+        code="ZEROHERO",
+        name="Globird ZEROHERO VPP",
+        currency="USD",
+        daily_charges=daily_charges,
+        daily_demand_charges={},
+        demand_charges=demand_charges,
+        energy_charges={"ALL": EnergyChargesSeason(rates=rates)},
+        seasons=seasons,
+        sell_tariff=SellTariff(
+            min_applicable_demand=0.0,
+            monthly_minimum_bill=0.0,
+            monthly_charges=0.0,
+            max_applicable_demand=0.0,
+            utility="Globird",
+            demand_charges=demand_charges,
+            daily_charges=daily_charges,
+            seasons=seasons,
+            code="ZEROHERO",
+            energy_charges={"ALL": EnergyChargesSeason(rates=rates)},
+            daily_demand_charges={},
+            currency="USD",
+            name="Globird ZEROHERO VPP",
+        ),
+    )
+
+
+def test_tariff_hash_is_independent_of_key_order():
+    first = make_settings({"0000": 0.31, "0005": 0.46})
+    second = make_settings({"0005": 0.46, "0000": 0.31})
+
+    assert TeslaClient.tariff_hash(first) == TeslaClient.tariff_hash(second)
+
+
+def test_unchanged_tariff_is_not_pushed_again(tesla_client):
+    tesla_client.update(make_settings({"0000": 0.31}))
+    tesla_client.update(make_settings({"0000": 0.31}))
+
+    assert tesla_client.post_time_of_use_settings.call_count == 1
+    assert tesla_client.get_products.call_count == 1
+
+
+def test_changed_tariff_is_pushed(tesla_client):
+    tesla_client.update(make_settings({"0000": 0.31}))
+    tesla_client.update(make_settings({"0000": 1.31}))
+
+    assert tesla_client.post_time_of_use_settings.call_count == 2
+
+
+def test_failed_push_is_retried_on_next_update(tesla_client):
+    tesla_client.post_time_of_use_settings.return_value = None
+    tesla_client.update(make_settings({"0000": 0.31}))
+    tesla_client.update(make_settings({"0000": 0.31}))
+
+    assert tesla_client.post_time_of_use_settings.call_count == 2
+
+
+def test_unchanged_tariff_is_forced_after_interval(tesla_client, monkeypatch):
+    tesla_client.force_push_minutes = 60
+    now = [1_000_000.0]
+    monkeypatch.setattr("tesla_client.time.time", lambda: now[0])
+
+    tesla_client.update(make_settings({"0000": 0.31}))
+    now[0] += 30 * 60
+    tesla_client.update(make_settings({"0000": 0.31}))
+    now[0] += 31 * 60
+    tesla_client.update(make_settings({"0000": 0.31}))
+
+    assert tesla_client.post_time_of_use_settings.call_count == 2
+
+
+def test_access_token_is_cached_until_expiry(tesla_client, tmp_path, monkeypatch):
+    (tmp_path / "tesla_refresh_token.txt").write_text("refresh-1")
+    now = [1_000_000.0]
+    monkeypatch.setattr("tesla_client.time.time", lambda: now[0])
+    tesla_client.exchange_refresh_token = Mock(
+        side_effect=[("access-1", "refresh-2", 3600), ("access-2", "refresh-3", 3600)]
+    )
+
+    assert tesla_client.exchange_tokens() == "access-1"
+    now[0] += 3000
+    assert tesla_client.exchange_tokens() == "access-1"
+    assert tesla_client.exchange_refresh_token.call_count == 1
+    assert (tmp_path / "tesla_refresh_token.txt").read_text() == "refresh-2"
+
+    # Within the expiry margin the token is refreshed and the refresh token rotated
+    now[0] += 400
+    assert tesla_client.exchange_tokens() == "access-2"
+    tesla_client.exchange_refresh_token.assert_called_with("refresh-2")
+    assert (tmp_path / "tesla_refresh_token.txt").read_text() == "refresh-3"
+
+
+def test_energy_site_id_is_cached_between_updates(tesla_client, tmp_path):
+    tesla_client.update(make_settings({"0000": 0.31}))
+    tesla_client.update(make_settings({"0000": 1.31}))
+
+    assert tesla_client.get_products.call_count == 1
+    assert tesla_client.post_time_of_use_settings.call_args[0][1] == 42
+    assert (tmp_path / "tesla_energy_site.json").exists()
+
+
+def test_rejected_energy_site_is_rediscovered(tesla_client):
+    tesla_client.update(make_settings({"0000": 0.31}))
+    tesla_client.get_products.return_value = [
+        {"device_type": "vehicle", "id": 1},
+        {"device_type": "energy", "energy_site_id": 43},
+    ]
+    tesla_client.post_time_of_use_settings.side_effect = [
+        EnergySiteNotFoundError("Energy site 42 rejected with 404"),
+        {"response": {}},
+    ]
+
+    tesla_client.update(make_settings({"0000": 1.31}))
+
+    assert tesla_client.get_products.call_count == 2
+    assert tesla_client.post_time_of_use_settings.call_args[0][1] == 43
+
+
+def test_sites_keep_separate_state(tesla_client, tmp_path):
+    other_client = TeslaClient(
+        site="cabin",
+        refresh_token_file=str(tmp_path / "cabin_token.txt"),
+        energy_site_id="7",
+    )
+    other_client.get_products = Mock()
+    other_client.post_time_of_use_settings = Mock(return_value={"response": {}})
+    settings = make_settings({"0000": 0.3})
+
+    tesla_client.update(settings)
+    other_client.update(settings)
+
+    # The same tariff is still pushed to the other site, to the configured energy site
+    other_client.post_time_of_use_settings.assert_called_once_with(settings, "7")
+    other_client.get_products.assert_not_called()
+    assert (tmp_path / "tesla_tariff_state_cabin.json").exists()
+    assert other_client.refresh_token_file == str(tmp_path / "cabin_token.txt")
+
+
+def test_rejected_access_token_is_refreshed_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("TESLA_CLIENT_ID", "client-id")
+    monkeypatch.setenv("TESLA_CLIENT_SECRET", "client-secret")
+    monkeypatch.setenv("AUTH_DIR", str(tmp_path))
+    (tmp_path / "tesla_refresh_token.txt").write_text("refresh-1")
+    client = TeslaClient()
+    client.exchange_refresh_token = Mock(
+        side_effect=[("access-1", "refresh-2", 3600), ("access-2", "refresh-3", 3600)]
+    )
+    client._http = Mock()
+    client._http.request.side_effect = [
+        Mock(status_code=401),
+        Mock(status_code=200, json=Mock(return_value={"response": [{"id": 1}]})),
+    ]
+
+    assert client.get_products() == [{"id": 1}]
+
+    # The revoked token is dropped, and the request sent again with a new one
+    authorizations = [
+        call.kwargs["headers"]["Authorization"] for call in client._http.request.call_args_list
+    ]
+    assert authorizations == ["Bearer access-1", "Bearer access-2"]
+    assert client.exchange_tokens() == "access-2"
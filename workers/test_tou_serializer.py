@@ -0,0 +1,48 @@
+import json
+from unittest.mock import Mock
+
+from globird_client import GlobirdClient
+from price_updater import PowerwallPriceUpdater
+from simple_price import PriceSeries
+from tesla_tou_settings import DemandChargesSeason, TimeOfUseSettings
+import tou_serializer
+import pytest
+
+
+@pytest.fixture
+def time_of_use_settings(monkeypatch) -> TimeOfUseSettings:
+    monkeypatch.setenv("RESOLUTION", "5")
+    monkeypatch.delenv("GLOBIRD_TARIFF_FILE", raising=False)
+    updater = PowerwallPriceUpdater(
+        globird_client=GlobirdClient(),
+        amber_client=Mock(get_forecast=Mock(return_value=PriceSeries.empty())),
+        tesla_client=Mock(),
+    )
+    return updater._build_time_of_use_settings(updater._generate_prices())
+
+
+def test_to_dict_matches_dataclasses_json(time_of_use_settings):
+    assert tou_serializer.to_dict(time_of_use_settings) == time_of_use_settings.to_dict()
+
+
+def test_to_json_bytes_matches_dataclasses_json(time_of_use_settings):
+    encoded = tou_serializer.to_json_bytes(time_of_use_settings)
+
+    assert json.loads(encoded) == json.loads(time_of_use_settings.to_json())
+
+
+def test_sorted_encoding_is_canonical(time_of_use_settings):
+    encoded = tou_serializer.to_json_bytes(time_of_use_settings, sort_keys=True)
+
+    assert encoded == json.dumps(
+        time_of_use_settings.to_dict(), sort_keys=True, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def test_untyped_values_are_copied():
+    season = DemandChargesSeason(rates={"ALL": {"nested": [1, 2]}})
+
+    encoded = tou_serializer.to_dict(season)
+    encoded["rates"]["ALL"]["nested"].append(3)
+
+    assert season.rates == {"ALL": {"nested": [1, 2]}}
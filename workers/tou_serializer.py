@@ -0,0 +1,107 @@
+"""
+Fast serialization of the tesla_tou_settings dataclasses.
+
+dataclasses_json's to_dict() introspects every field of every nested object on each call.
+This module instead generates one plain encoder function per dataclass, the first time the
+class is serialized, producing the same dictionaries as to_dict().
+"""
+
+import dataclasses
+import json
+import typing
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library is used without it
+    orjson = None
+
+_encoders: dict[type, Callable[[Any], dict]] = {}
+
+
+def _value_expression(field_type: Any, value: str, namespace: dict) -> str:
+    """
+    Returns a Python expression encoding a value of the given type.
+    :param field_type: Type annotation of the value.
+    :param value: Expression evaluating to the value.
+    :param namespace: Globals of the generated function, where nested encoders are added.
+    """
+    origin = typing.get_origin(field_type)
+    args = typing.get_args(field_type)
+    if dataclasses.is_dataclass(field_type):
+        encoder_name = f"encode_{field_type.__name__}"
+        namespace[encoder_name] = _get_encoder(field_type)
+        return f"{encoder_name}({value})"
+    if origin in (list, typing.List) and args:
+        item = _value_expression(args[0], "item", namespace)
+        return f"[{item} for item in {value}]"
+    if origin in (dict, typing.Dict) and len(args) == 2:
+        item = _value_expression(args[1], "item", namespace)
+        return f"{{key: {item} for key, item in {value}.items()}}"
+    if field_type in (int, float, str, bool):
+        return value
+    # Untyped values (e.g. Dict[str, Any]) are copied as they are
+    namespace["deepcopy"] = _deepcopy_json
+    return f"deepcopy({value})"
+
+
+def _deepcopy_json(value: Any) -> Any:
+    """Copies JSON-like containers, so the encoded output never aliases the object."""
+    if isinstance(value, dict):
+        return {key: _deepcopy_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_deepcopy_json(item) for item in value]
+    return value
+
+
+def _compile_encoder(cls: type) -> Callable[[Any], dict]:
+    """Generates the source of an encoder for a dataclass and compiles it."""
+    type_hints = typing.get_type_hints(cls)
+    namespace: dict = {}
+    items = [
+        f"        {field.name!r}: "
+        f"{_value_expression(type_hints[field.name], f'obj.{field.name}', namespace)},"
+        for field in dataclasses.fields(cls)
+    ]
+    source = "def encode(obj):\n    return {\n" + "\n".join(items) + "\n    }\n"
+    exec(compile(source, f"<tou_serializer {cls.__name__}>", "exec"), namespace)
+    return namespace["encode"]
+
+
+def _get_encoder(cls: type) -> Callable[[Any], dict]:
+    """Returns the encoder of a dataclass, generating it on first use."""
+    encoder = _encoders.get(cls)
+    if encoder is None:
+        encoder = _encoders[cls] = _compile_encoder(cls)
+    return encoder
+
+
+def to_dict(obj: Any) -> dict:
+    """
+    Serializes a tesla_tou_settings dataclass into a dictionary.
+    :param obj: Dataclass instance, e.g. a TimeOfUseSettings.
+    :return: The same dictionary as obj.to_dict().
+    """
+    return _get_encoder(type(obj))(obj)
+
+
+def dumps(value: Any, sort_keys: bool = False) -> bytes:
+    """
+    Encodes a JSON value into compact UTF-8 JSON bytes, using orjson when it is installed.
+    :param value: JSON serializable value.
+    :param sort_keys: Whether to sort object keys, for a canonical encoding.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return json.dumps(
+        value, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
+
+
+def to_json_bytes(obj: Any, sort_keys: bool = False) -> bytes:
+    """
+    Serializes a tesla_tou_settings dataclass directly into compact JSON bytes.
+    :param obj: Dataclass instance, e.g. a TimeOfUseSettings.
+    :param sort_keys: Whether to sort object keys, for a canonical encoding.
+    """
+    return dumps(to_dict(obj), sort_keys=sort_keys)